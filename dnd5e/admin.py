@@ -63,6 +63,7 @@ admin.site.register(models.Trap)
 admin.site.register(models.Knowledge)
 admin.site.register(models.Zone, MarkdownxModelAdmin)
 admin.site.register(models.AdventureMap)
+admin.site.register(models.MapSession)
 admin.site.register(models.Treasure)
 admin.site.register(models.MoneyAmount)
 admin.site.register(models.Stuff)
@@ -89,4 +90,5 @@ admin.site.register(models.WeaponCategory)
 admin.site.register(models.Weapon)
 admin.site.register(models.MultiClassProficiency)
 admin.site.register(models.ClassArmorProficiency)
-admin.site.register(models.CharacterSpellSlot)
\ No newline at end of file
+admin.site.register(models.CharacterSpellSlot)
+admin.site.register(models.Job)
\ No newline at end of file
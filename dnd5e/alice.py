@@ -4,12 +4,19 @@ from functools import reduce
 from random import randint
 
 from django.http import JsonResponse
+from django.utils.text import Truncator
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
+from dnd5e import lookup
+
 DEFAULT_ANSWER = 'Я ничего не понимаю'
 REGULAR_TROW_RE = re.compile(r'^(кинь|брось) (?P<count>[1-9]) д (?P<sides>4|6|8|12|20) ?($|(?P<sign>плюс|минус) (?P<mod>[\d]+))$')
 ATTACT_TROW_RE = re.compile(r'^(кинь|брось) на (попадание|атаку) (|модификатор|с модификатором) ?(?P<sign>плюс|минус) (?P<mod>[\d]+)$')
+DESCRIBE_RE = re.compile(r'^(что такое|кто такой|кто такая|расскажи (про|о|об)|найди) (?P<name>.+)$')
+
+DESCRIBE_KINDS = ('spell', 'monster', 'item', 'maneuver', 'feature')
+ANSWER_LENGTH = 1000
 
 
 def roll_dice(count, sides, mod=0):
@@ -46,6 +53,15 @@ def trow_attact_hit(data):
     return f'Результат броска на попадание {result + mod}'
 
 
+def describe(data):
+    found = lookup.search_objects(DESCRIBE_KINDS, data['name'], limit=1)
+    if not found:
+        return f'Я не знаю, что такое «{data["name"]}»'
+
+    _, obj = found[0]
+    return Truncator(f'{obj}. {obj.description}').chars(ANSWER_LENGTH)
+
+
 @require_POST
 @csrf_exempt
 def alice_api(request):
@@ -69,4 +85,9 @@ def alice_api(request):
         response['response']['text'] = trow_regular_dice(match.groupdict())
         return JsonResponse(response)
 
+    match = DESCRIBE_RE.match(request['request']['command'])
+    if match:
+        response['response']['text'] = describe(match.groupdict())
+        return JsonResponse(response)
+
     return JsonResponse(response)
\ No newline at end of file
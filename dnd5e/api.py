@@ -0,0 +1,392 @@
+import base64
+import functools
+import hashlib
+import json
+
+from django.apps import apps
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.http import Http404, JsonResponse, QueryDict
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition, require_GET, require_POST
+
+from dnd5e import choice_engine, knowledge, lookup, sync
+from dnd5e.batch import CharacterBatch
+from dnd5e.choice_engine import KnownEntities
+from dnd5e.model_fields import Dice
+from dnd5e.models import (
+    Adventure, Background, Character, Class, KnowledgeReveal, Maneuver,
+    Monster, Party, Race, RulesVersion, Spell, Subclass, Subrace, Tool
+)
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+AUTOCOMPLETE_SIZE = 20
+AUTOCOMPLETE_FILTERS = {'tool': ('category', )}  # Integer fields autocomplete can be narrowed by
+
+
+def dice_string(packed):
+    return str(Dice.unpack(packed))
+
+
+class Resource:
+    """ Read-only catalogue resource serialized straight from values() rows """
+
+    def __init__(self, model, fields, many=None, filters=None, convert=None):
+        self.model = model
+        self.fields = fields  # {output name: lookup}
+        self.many = many or {}  # {output name: many-to-many lookup}, serialized as list of ids
+        self.filters = filters or {}
+        self.convert = convert or {}  # {output name: callable}
+
+    @property
+    def field_names(self):
+        return list(self.fields) + list(self.many)
+
+    def select_fields(self, requested):
+        if not requested:
+            return self.field_names
+
+        requested = [name for name in requested.split(',') if name]
+        unknown = set(requested) - set(self.field_names)
+        if unknown:
+            raise ValueError(f'Unknown fields: {", ".join(sorted(unknown))}')
+
+        return ['id'] + [name for name in requested if name != 'id']
+
+    def queryset(self):
+        return self.model.objects.filter(**self.filters).order_by('id')
+
+    def serialize(self, queryset, fields):
+        lookups = {name: self.fields[name] for name in fields if name in self.fields}
+        rows = [
+            {name: row[lookup] for name, lookup in lookups.items()}
+            for row in queryset.values(*set(lookups.values()))
+        ]
+
+        for name, func in self.convert.items():
+            if name in lookups:
+                for row in rows:
+                    row[name] = func(row[name]) if row[name] is not None else None
+
+        many = [name for name in fields if name in self.many]
+        if many and rows:
+            by_id = {row['id']: row for row in rows}
+            for name in many:
+                for row in rows:
+                    row[name] = []
+                pairs = self.model.objects.filter(id__in=by_id).order_by().values_list('id', self.many[name])
+                for obj_id, related_id in pairs:
+                    if related_id is not None:
+                        by_id[obj_id][name].append(related_id)
+
+        return [{name: row[name] for name in fields} for row in rows]
+
+
+CATALOGUE = {
+    'spells': Resource(Spell, {
+        'id': 'id', 'name': 'name', 'orig_name': 'orig_name', 'level': 'level', 'school': 'school__name',
+        'source': 'source__code', 'casting_time': 'casting_time', 'casting_range': 'casting_range',
+        'duration': 'duration', 'components': 'components', 'description': 'description', 'high_levels': 'high_levels',
+    }, many={'classes': 'classes__id'}),
+    'monsters': Resource(Monster, {
+        'id': 'id', 'name': 'name', 'orig_name': 'orig_name', 'slug': 'slug', 'source': 'source__code',
+        'size': 'size', 'type': 'mtype__name', 'subtype': 'subtype', 'alignment': 'alignment',
+        'armor_class': 'armor_class', 'hit_points': 'hit_points', 'hit_dice': 'hit_dice', 'speed': 'speed',
+        'strength': 'strength', 'dexterity': 'dexterity', 'constitution': 'constitution',
+        'intelligence': 'intelligence', 'wisdom': 'wisdom', 'charisma': 'charisma',
+        'passive_perception': 'passive_perception', 'challenge': 'challenge', 'description': 'description',
+    }, many={'languages': 'language__id'}, filters={'adventure_only__isnull': True}, convert={'hit_dice': dice_string}),
+    'classes': Resource(Class, {
+        'id': 'id', 'name': 'name', 'orig_name': 'orig_name', 'codename': 'codename', 'hit_dice': 'hit_dice',
+        'skill_proficiency_limit': 'skill_proficiency_limit', 'spell_ability': 'spell_ability__orig_name',
+    }, many={'saving_trows': 'saving_trows__id', 'skills': 'skills_proficiency__id'}, convert={'hit_dice': dice_string}),
+    'subclasses': Resource(Subclass, {
+        'id': 'id', 'name': 'name', 'codename': 'codename', 'parent': 'parent_id', 'source': 'book__code',
+    }),
+    'races': Resource(Race, {
+        'id': 'id', 'name': 'name', 'speed': 'speed', 'size': 'size', 'source': 'source__code',
+    }, many={'languages': 'languages__id'}),
+    'subraces': Resource(Subrace, {
+        'id': 'id', 'name': 'name', 'aka': 'aka', 'race': 'race_id', 'source': 'source__code',
+    }),
+    'backgrounds': Resource(Background, {
+        'id': 'id', 'name': 'name', 'orig_name': 'orig_name', 'known_languages': 'known_languages',
+        'description': 'description',
+    }, many={'skills': 'skills_proficiency__id', 'tools': 'tools_proficiency__id'}),
+    'tools': Resource(Tool, {
+        'id': 'id', 'name': 'name', 'category': 'category', 'cost': 'cost', 'description': 'description',
+    }, convert={'cost': str}),
+    'maneuvers': Resource(Maneuver, {'id': 'id', 'name': 'name', 'description': 'description'}),
+}
+
+
+def encode_cursor(obj_id):
+    return base64.urlsafe_b64encode(str(obj_id).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def page_size(value):
+    if not value:
+        return PAGE_SIZE
+
+    return max(1, min(int(value), MAX_PAGE_SIZE))
+
+
+def get_page(resource, fields, cursor=None, limit=PAGE_SIZE):
+    """ Keyset pagination by id: one query per page regardless of page depth """
+    queryset = resource.queryset()
+    if cursor:
+        queryset = queryset.filter(id__gt=decode_cursor(cursor))
+
+    results = resource.serialize(queryset[:limit + 1], fields)
+    next_cursor = encode_cursor(results[limit - 1]['id']) if len(results) > limit else None
+
+    return results[:limit], next_cursor
+
+
+def _rules_version(request):
+    if not hasattr(request, '_rules_version'):
+        request._rules_version = RulesVersion.current()
+
+    return request._rules_version
+
+
+def rules_etag(request, *args, **kwargs):
+    """ Representation depends only on rules version and requested url """
+    url_hash = hashlib.sha1(request.get_full_path().encode()).hexdigest()[:16]
+
+    return f'{_rules_version(request).version}-{url_hash}'
+
+
+def rules_last_modified(request, *args, **kwargs):
+    return _rules_version(request).updated
+
+
+def rules_condition(view):
+    """ Conditional GET by rules version. Error responses are not cached, so they are sent without validators """
+    conditional_view = condition(etag_func=rules_etag, last_modified_func=rules_last_modified)(view)
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = conditional_view(request, *args, **kwargs)
+        if response.status_code >= 400:
+            del response['ETag']
+            del response['Last-Modified']
+
+        return response
+
+    return wrapper
+
+
+def _get_resource(name):
+    try:
+        return CATALOGUE[name]
+    except KeyError:
+        raise Http404('Unknown resource')
+
+
+@require_GET
+@rules_condition
+def catalogue_index(request):
+    version = _rules_version(request)
+
+    return JsonResponse({
+        'version': version.version,
+        'updated': version.updated,
+        'resources': {name: resource.field_names for name, resource in CATALOGUE.items()},
+    })
+
+
+@require_GET
+@rules_condition
+def catalogue_list(request, resource):
+    resource = _get_resource(resource)
+
+    try:
+        fields = resource.select_fields(request.GET.get('fields'))
+        results, next_cursor = get_page(resource, fields, request.GET.get('cursor'), page_size(request.GET.get('limit')))
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    return JsonResponse({'results': results, 'next': next_cursor})
+
+
+@require_GET
+@rules_condition
+def catalogue_detail(request, resource, obj_id):
+    resource = _get_resource(resource)
+
+    try:
+        fields = resource.select_fields(request.GET.get('fields'))
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    results = resource.serialize(resource.queryset().filter(id=obj_id), fields)
+    if not results:
+        raise Http404('Object not found')
+
+    return JsonResponse(results[0])
+
+
+@login_required
+@require_POST
+def character_batch(request, adv_id):
+    """ Apply batch of character and monster operations. Nothing is written if any operation is invalid """
+    adventure = get_object_or_404(Adventure, id=adv_id, master=request.user)
+
+    try:
+        batch = CharacterBatch(adventure, json.loads(request.body)['ops'])
+    except (ValueError, TypeError, KeyError) as exc:
+        return JsonResponse({'error': f'Invalid batch: {exc}'}, status=400)
+    except ValidationError as exc:
+        return JsonResponse({'error': exc.messages}, status=400)
+
+    if not batch.validate():
+        return JsonResponse({'ok': False, 'results': batch.results()}, status=400)
+
+    batch.commit()
+
+    return JsonResponse({'ok': True, 'results': batch.results()})
+
+
+@login_required
+@require_GET
+def sync_pull(request, adv_id):
+    """ Changes since client sequence, or full snapshot for new or too old clients """
+    adventure = get_object_or_404(Adventure, id=adv_id, master=request.user)
+
+    since = request.GET.get('since')
+    if since is None:
+        return JsonResponse(sync.snapshot(adventure))
+
+    try:
+        since = int(since)
+    except ValueError:
+        return JsonResponse({'error': 'since must be integer'}, status=400)
+
+    return JsonResponse(sync.changes_since(adventure, since))
+
+
+@login_required
+@require_POST
+def sync_push(request, adv_id):
+    adventure = get_object_or_404(Adventure, id=adv_id, master=request.user)
+
+    try:
+        result = sync.push(adventure, json.loads(request.body)['deltas'])
+    except (ValueError, TypeError, KeyError) as exc:
+        return JsonResponse({'error': f'Invalid deltas: {exc}'}, status=400)
+    except ValidationError as exc:
+        return JsonResponse({'error': exc.messages}, status=400)
+
+    return JsonResponse(result)
+
+
+def _int_param(request, name):
+    value = request.GET.get(name)
+    return None if value is None else int(value)
+
+
+@login_required
+@require_GET
+def party_knowledges(request, adv_id, party_id):
+    """ Knowledges revealed to party, optionally only ones linked to stage, NPC or monster """
+    party_obj = get_object_or_404(Party, id=party_id, adventure_id=adv_id, adventure__master=request.user)
+
+    try:
+        ids = knowledge.visible(
+            party_obj, _int_param(request, 'stage'), _int_param(request, 'npc'), _int_param(request, 'monster')
+        )
+        log = KnowledgeReveal.objects.filter(party=party_obj)[:page_size(request.GET.get('log'))]
+    except ValueError:
+        return JsonResponse({'error': 'stage, npc, monster and log must be integers'}, status=400)
+
+    return JsonResponse({'party': party_obj.id, 'knowledges': sorted(ids), 'log': [entry.as_dict() for entry in log]})
+
+
+@login_required
+@require_POST
+def party_knowledges_reveal(request, adv_id, party_id):
+    """ Reveal or hide many knowledges at once, body is {"knowledges": [ids], "hide": false} """
+    party_obj = get_object_or_404(Party, id=party_id, adventure_id=adv_id, adventure__master=request.user)
+
+    try:
+        body = json.loads(request.body)
+        changed = knowledge.reveal(
+            party_obj, [int(obj_id) for obj_id in body['knowledges']], user=request.user, hide=bool(body.get('hide'))
+        )
+    except (ValueError, TypeError, KeyError) as exc:
+        return JsonResponse({'error': f'Invalid request: {exc}'}, status=400)
+    except ValidationError as exc:
+        return JsonResponse({'error': exc.messages}, status=400)
+
+    return JsonResponse({'party': party_obj.id, 'changed': changed})
+
+
+def _form_data(data):
+    """ JSON object as form data, lists become multiple values """
+    form_data = QueryDict(mutable=True)
+    for key, value in data.items():
+        form_data.setlist(key, [str(item) for item in value] if isinstance(value, list) else [str(value)])
+
+    return form_data
+
+
+@login_required
+@require_POST
+def party_choices_resolve(request, adv_id, party_id):
+    """ Resolve many pending choices of party characters at once, body is {"choices": {"<choice id>": {form data}}} """
+    party_obj = get_object_or_404(Party, id=party_id, adventure_id=adv_id, adventure__master=request.user)
+
+    try:
+        submissions = {int(choice_id): _form_data(data) for choice_id, data in json.loads(request.body)['choices'].items()}
+    except (ValueError, TypeError, KeyError, AttributeError) as exc:
+        return JsonResponse({'error': f'Invalid request: {exc}'}, status=400)
+
+    errors = choice_engine.resolve_party(party_obj, submissions)
+    if errors:
+        return JsonResponse({'ok': False, 'errors': {str(choice_id): messages for choice_id, messages in errors.items()}}, status=400)
+
+    return JsonResponse({'ok': True, 'resolved': sorted(submissions)})
+
+
+@login_required
+@require_GET
+def autocomplete(request, kind):
+    """ Objects with names starting with query words, except known by character. NPCs need adventure parameter """
+    if kind not in lookup.LOOKUP_FIELDS:
+        raise Http404
+
+    filter_names = AUTOCOMPLETE_FILTERS.get(kind, ())
+    try:
+        limit = max(1, min(int(request.GET.get('limit', AUTOCOMPLETE_SIZE)), AUTOCOMPLETE_SIZE))
+        char_id, adv_id = _int_param(request, 'character'), _int_param(request, 'adventure')
+        filters = {name: _int_param(request, name) for name in filter_names if name in request.GET}
+    except ValueError:
+        names = ', '.join(('limit', 'character', 'adventure') + filter_names)
+        return JsonResponse({'error': f'{names} must be integers'}, status=400)
+
+    scope = None
+    if kind in lookup.SCOPE_FIELDS:
+        scope = get_object_or_404(Adventure, id=adv_id, master=request.user).id
+
+    exclude = ()
+    if char_id is not None:
+        character = get_object_or_404(Character, id=char_id, adventure__master=request.user)
+        exclude = KnownEntities.for_character(character)[kind]
+
+    only = None
+    if filters:
+        only = apps.get_model('dnd5e', kind).objects.filter(**filters).values_list('id', flat=True)
+
+    found = lookup.complete(kind, request.GET.get('q', ''), limit, scope, exclude, only)
+
+    return JsonResponse({'results': [{'id': obj_id, 'text': label} for obj_id, label in found]})
\ No newline at end of file
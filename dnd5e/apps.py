@@ -1,7 +1,20 @@
 from django.apps import AppConfig
-from django.db.models.signals import pre_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 
-from .signals import set_monster_hp, update_slug
+from .encounters import BUDGET_MODELS
+from .knowledge import INDEX_MODELS
+from .lookup import LOOKUP_FIELDS
+from .markdown import MARKDOWN_MODELS
+from .npc_graph import GRAPH_MODELS
+from .party import SNAPSHOT_MODELS
+from .signals import (
+    COST_MODELS, bump_rules_version, encounter_traps_changed, invalidate_encounters, invalidate_knowledge_index,
+    invalidate_npc_graph, invalidate_party_member, knowledge_links_changed, process_map_image,
+    record_adventure_change, record_adventure_delete, remove_name_lookup, render_description, set_choice_importance,
+    set_monster_hp, sync_choice_importance, update_cost_copper, update_name_lookup, update_slug
+)
+
+SYNC_MODELS = ('AdventureMonster', 'Character', 'CharacterSpellSlot', 'Knowledge')
 
 
 class Dnd5EConfig(AppConfig):
@@ -10,6 +23,57 @@ class Dnd5EConfig(AppConfig):
     def ready(self):
         monster = self.get_model('Monster')
         adv_monster = self.get_model('AdventureMonster')
+        adv_map = self.get_model('AdventureMap')
+        choice = self.get_model('AdvancmentChoice')
+        char_choice = self.get_model('CharacterAdvancmentChoice')
 
         pre_save.connect(update_slug, monster)
-        pre_save.connect(set_monster_hp, adv_monster)
\ No newline at end of file
+        pre_save.connect(set_monster_hp, adv_monster)
+        post_save.connect(process_map_image, adv_map)
+        pre_save.connect(set_choice_importance, char_choice)
+        post_save.connect(sync_choice_importance, choice)
+
+        for model_name in COST_MODELS:
+            pre_save.connect(update_cost_copper, self.get_model(model_name))
+
+        for model_name in MARKDOWN_MODELS:
+            post_save.connect(render_description, self.get_model(model_name))
+
+        for model_name in SNAPSHOT_MODELS:
+            post_save.connect(invalidate_party_member, self.get_model(model_name))
+            post_delete.connect(invalidate_party_member, self.get_model(model_name))
+
+        for model_name in self.get_model('RulesVersion').MODELS:
+            post_save.connect(bump_rules_version, self.get_model(model_name))
+            post_delete.connect(bump_rules_version, self.get_model(model_name))
+
+        for model_name, field_name in self.get_model('RulesVersion').RELATIONS:
+            m2m_changed.connect(bump_rules_version, getattr(self.get_model(model_name), field_name).through)
+
+        for model_name in SYNC_MODELS:
+            post_save.connect(record_adventure_change, self.get_model(model_name))
+            post_delete.connect(record_adventure_delete, self.get_model(model_name))
+
+        for model_name in INDEX_MODELS:
+            post_save.connect(invalidate_knowledge_index, self.get_model(model_name))
+            post_delete.connect(invalidate_knowledge_index, self.get_model(model_name))
+
+        m2m_changed.connect(knowledge_links_changed, self.get_model('Stage').knowledges.through)
+        m2m_changed.connect(knowledge_links_changed, self.get_model('NPC').knows.through)
+        m2m_changed.connect(knowledge_links_changed, self.get_model('AdventureMonster').knowledges.through)
+
+        for model_name in GRAPH_MODELS:
+            post_save.connect(invalidate_npc_graph, self.get_model(model_name))
+            post_delete.connect(invalidate_npc_graph, self.get_model(model_name))
+
+        # Deleted trap has no links to find its adventures, so budget is invalidated before delete
+        for model_name in BUDGET_MODELS:
+            post_save.connect(invalidate_encounters, self.get_model(model_name))
+            pre_delete.connect(invalidate_encounters, self.get_model(model_name))
+
+        m2m_changed.connect(encounter_traps_changed, self.get_model('Place').traps.through)
+        m2m_changed.connect(encounter_traps_changed, self.get_model('Zone').traps.through)
+
+        for model_name in LOOKUP_FIELDS:
+            post_save.connect(update_name_lookup, self.get_model(model_name))
+            post_delete.connect(remove_name_lookup, self.get_model(model_name))
\ No newline at end of file
@@ -0,0 +1,262 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from dnd5e import party, sync
+from dnd5e.models import AdventureMonster, Character, CharacterAbilities, CharacterDice, CharacterSpellSlot
+
+MAX_OPS = 500
+MIN_ABILITY, MAX_ABILITY = 1, 30
+MONSTER_KILLED = 100
+
+
+def _int(value, name, minimum=None):
+    # int() would silently truncate floats and accept booleans
+    if isinstance(value, (bool, float)):
+        raise ValidationError(f'{name} must be integer')
+
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f'{name} must be integer')
+
+    if minimum is not None and value < minimum:
+        raise ValidationError(f'{name} must be at least {minimum}')
+
+    return value
+
+
+def _str(value, name):
+    if not isinstance(value, str):
+        raise ValidationError(f'{name} must be string')
+
+    return value
+
+
+def _target(value):
+    """ Targets are '<model>:<id>' strings, same as map tokens """
+    try:
+        model_name, obj_id = _str(value, 'target').split(':')
+        obj_id = int(obj_id)
+    except ValueError:
+        raise ValidationError(f'Invalid target {value}')
+
+    if model_name not in ('character', 'adventuremonster'):
+        raise ValidationError(f'Invalid target {value}')
+
+    return model_name, obj_id
+
+
+class CharacterBatch:
+    """ Validate all operations against preloaded state in one pass, then write everything in one transaction """
+
+    def __init__(self, adventure, ops):
+        if not isinstance(ops, list):
+            raise ValidationError('ops must be a list')
+        if len(ops) > MAX_OPS:
+            raise ValidationError(f'Too many operations, maximum is {MAX_OPS}')
+
+        self.adventure = adventure
+        self.ops = ops
+        self.errors = {}
+
+        self.dirty_characters = {}
+        self.dirty_monsters = {}
+        self.dirty_abilities = {}
+        self.dirty_dices = {}
+        self.spent_slots = set()
+        self.restored_slots = set()
+
+    def _referenced_ids(self):
+        char_ids, monster_ids = set(), set()
+
+        for op in self.ops:
+            if not isinstance(op, dict):
+                continue
+            try:
+                if 'character' in op:
+                    char_ids.add(int(op['character']))
+                if 'target' in op:
+                    model_name, obj_id = _target(op['target'])
+                    (char_ids if model_name == 'character' else monster_ids).add(obj_id)
+            except (ValidationError, TypeError, ValueError):
+                continue  # Reported by validation
+
+        return char_ids, monster_ids
+
+    def load(self):
+        char_ids, monster_ids = self._referenced_ids()
+
+        self.characters = Character.objects.filter(adventure=self.adventure, id__in=char_ids).only(
+            'id', 'hit_points', 'current_hp'
+        ).in_bulk()
+        self.monsters = AdventureMonster.objects.filter(adventure=self.adventure, id__in=monster_ids).select_related(
+            'monster'
+        ).only('id', 'current_hp', 'status', 'monster__hit_points').in_bulk()
+
+        self.abilities = {
+            (obj.character_id, obj.ability.orig_name.lower()): obj
+            for obj in CharacterAbilities.objects.filter(character_id__in=self.characters).select_related('ability')
+        }
+
+        self.dices = {}
+        for obj in CharacterDice.objects.filter(character_id__in=self.characters).order_by('id'):
+            self.dices.setdefault((obj.character_id, obj.dtype), []).append(obj)
+
+        self.slots = {}
+        for slot_id, char_id, level, spent in CharacterSpellSlot.objects.filter(
+            character_id__in=self.characters
+        ).values_list('id', 'character_id', 'level', 'spent'):
+            self.slots.setdefault(char_id, {}).setdefault(level, {})[slot_id] = spent
+
+    def _character(self, op):
+        char_id = _int(op.get('character'), 'character')
+        if char_id not in self.characters:
+            raise ValidationError(f'Character {char_id} not found in adventure')
+
+        return self.characters[char_id]
+
+    def _hp_target(self, op):
+        model_name, obj_id = _target(op.get('target'))
+
+        if model_name == 'character':
+            char = self.characters.get(obj_id)
+            if char is None:
+                raise ValidationError(f'Character {obj_id} not found in adventure')
+            if char.current_hp is None:
+                char.current_hp = char.hit_points
+            return char, char.hit_points, self.dirty_characters
+
+        monster = self.monsters.get(obj_id)
+        if monster is None:
+            raise ValidationError(f'Monster {obj_id} not found in adventure')
+        if monster.current_hp is None:
+            monster.current_hp = monster.monster.hit_points
+        return monster, monster.monster.hit_points, self.dirty_monsters
+
+    def op_set_abilities(self, op):
+        char = self._character(op)
+        abilities = op.get('abilities')
+        if not isinstance(abilities, dict) or not abilities:
+            raise ValidationError('abilities must be a non empty object')
+
+        for name, value in abilities.items():
+            ability = self.abilities.get((char.id, name.lower()))
+            if ability is None:
+                raise ValidationError(f'Unknown ability {name}')
+
+            value = _int(value, name, MIN_ABILITY)
+            if value > MAX_ABILITY:
+                raise ValidationError(f'{name} must be at most {MAX_ABILITY}')
+
+            ability.value = value
+            self.dirty_abilities[ability.id] = ability
+
+    def op_damage(self, op):
+        obj, _, dirty = self._hp_target(op)
+        obj.current_hp = max(obj.current_hp - _int(op.get('amount'), 'amount', 0), 0)
+
+        if obj.current_hp == 0 and isinstance(obj, AdventureMonster):
+            obj.status = MONSTER_KILLED
+
+        dirty[obj.id] = obj
+
+    def op_heal(self, op):
+        obj, maximum, dirty = self._hp_target(op)
+        amount = _int(op.get('amount'), 'amount', 0)
+
+        # Zero maximum means hit points were never computed, healing can't be capped
+        if maximum == 0:
+            raise ValidationError('Maximum hit points are unknown')
+        if isinstance(obj, AdventureMonster) and obj.status == MONSTER_KILLED:
+            raise ValidationError(f'Monster {obj.id} is killed')
+
+        obj.current_hp = min(obj.current_hp + amount, maximum)
+
+        dirty[obj.id] = obj
+
+    def op_spend_slot(self, op):
+        char = self._character(op)
+        level = _int(op.get('level'), 'level', 1)
+
+        slots = self.slots.get(char.id, {}).get(level, {})
+        available = [slot_id for slot_id, spent in slots.items() if not spent]
+        if not available:
+            raise ValidationError(f'No available spell slots of level {level}')
+
+        slots[available[0]] = True
+        self.spent_slots.add(available[0])
+        self.restored_slots.discard(available[0])
+
+    def op_restore_slots(self, op):
+        char = self._character(op)
+
+        for level_slots in self.slots.get(char.id, {}).values():
+            for slot_id, spent in level_slots.items():
+                if spent:
+                    level_slots[slot_id] = False
+                    self.restored_slots.add(slot_id)
+                    self.spent_slots.discard(slot_id)
+
+    def op_spend_dice(self, op):
+        char = self._character(op)
+        dtype = _str(op.get('dtype', 'hit'), 'dtype')
+        count = _int(op.get('count', 1), 'count', 1)
+
+        dices = [dice for dice in self.dices.get((char.id, dtype), []) if dice.count]
+        if sum(dice.count for dice in dices) < count:
+            raise ValidationError(f'Not enough {dtype} dices')
+
+        for dice in dices:
+            spent = min(dice.count, count)
+            dice.count -= spent
+            count -= spent
+            self.dirty_dices[dice.id] = dice
+            if not count:
+                break
+
+    def validate(self):
+        self.load()
+
+        for index, op in enumerate(self.ops):
+            handler = getattr(self, f'op_{op.get("op")}', None) if isinstance(op, dict) else None
+
+            try:
+                if handler is None:
+                    raise ValidationError('Unknown operation')
+                handler(op)
+            except ValidationError as exc:
+                self.errors[index] = exc.messages
+
+        return not self.errors
+
+    def results(self):
+        return [
+            {'index': index, 'ok': index not in self.errors, 'errors': self.errors.get(index, [])}
+            for index in range(len(self.ops))
+        ]
+
+    def commit(self):
+        with transaction.atomic():
+            CharacterAbilities.objects.bulk_update(self.dirty_abilities.values(), ['value'])
+            # Maximum hit points depend on constitution
+            for ability in self.dirty_abilities.values():
+                if ability.ability.orig_name == 'Constitution':
+                    self.characters[ability.character_id].update_hit_points()
+            Character.objects.bulk_update(self.dirty_characters.values(), ['current_hp'])
+            AdventureMonster.objects.bulk_update(self.dirty_monsters.values(), ['current_hp', 'status'])
+            CharacterDice.objects.bulk_update(self.dirty_dices.values(), ['count'])
+
+            if self.spent_slots:
+                CharacterSpellSlot.objects.filter(id__in=self.spent_slots).update(spent=True)
+            if self.restored_slots:
+                CharacterSpellSlot.objects.filter(id__in=self.restored_slots).update(spent=False)
+
+            # Bulk writes don't send signals
+            party.invalidate(self.characters)
+
+            sync.record(self.adventure.id, 'character', self.dirty_characters.values(), ['current_hp'])
+            sync.record(self.adventure.id, 'adventuremonster', self.dirty_monsters.values(), ['current_hp', 'status'])
+            sync.record(
+                self.adventure.id, 'characterspellslot',
+                CharacterSpellSlot.objects.filter(id__in=self.spent_slots | self.restored_slots), ['spent']
+            )
\ No newline at end of file
@@ -0,0 +1,278 @@
+from collections import defaultdict
+
+from django.apps import apps
+from django.db import models, transaction
+
+from dnd5e import party
+
+dnd5e_app = apps.app_configs['dnd5e']
+get_model = dnd5e_app.get_model
+
+
+class KnownEntities:
+    """ Ids of everything character already has, loaded for many characters with a single query """
+
+    def __init__(self):
+        self.ids = defaultdict(set)
+        self.spells_by_level = defaultdict(set)
+
+    def __getitem__(self, kind):
+        return self.ids[kind]
+
+    def spells_count(self, cantrips=False):
+        if cantrips:
+            return len(self.spells_by_level[0])
+
+        return sum(len(ids) for level, ids in self.spells_by_level.items() if level > 0)
+
+    @staticmethod
+    def _rows(queryset, kind, obj_field, extra=models.Value(0)):
+        return queryset.order_by().annotate(
+            kind=models.Value(kind, output_field=models.CharField()),
+            obj_id=models.F(obj_field),
+            extra=extra,
+        ).values_list('character_id', 'kind', 'obj_id', 'extra')
+
+    @classmethod
+    def for_characters(cls, character_ids):
+        character = get_model('character')
+        character_ids = list(character_ids)
+        filters = {'character_id__in': character_ids}
+
+        rows = cls._rows(character.languages.through.objects.filter(**filters), 'language', 'language_id').union(
+            cls._rows(get_model('charactertoolproficiency').objects.filter(**filters), 'tool', 'tool_id'),
+            cls._rows(get_model('characterfeature').objects.filter(**filters), 'feature', 'feature_id'),
+            cls._rows(character.known_maneuvers.through.objects.filter(**filters), 'maneuver', 'maneuver_id'),
+            cls._rows(
+                character.known_spells.through.objects.filter(**filters), 'spell', 'spell_id', models.F('spell__level')
+            ),
+            all=True
+        )
+
+        known = {char_id: cls() for char_id in character_ids}
+        for char_id, kind, obj_id, extra in rows:
+            known[char_id].ids[kind].add(obj_id)
+            if kind == 'spell':
+                known[char_id].spells_by_level[extra].add(obj_id)
+
+        return known
+
+    @classmethod
+    def for_character(cls, character):
+        """ Known entities are cached on character instance and shared by all its choices """
+        if getattr(character, '_known_entities', None) is None:
+            character._known_entities = cls.for_characters([character.id])[character.id]
+
+        return character._known_entities
+
+
+class Candidates:
+    """ Declares objects character can choose from: model objects matching filters, except known ones """
+
+    def __init__(self, model, known=None, **filters):
+        self.model = model
+        self.known = known
+        self.filters = filters
+
+    def queryset(self, known, **extra_filters):
+        queryset = get_model(self.model).objects.filter(**self.filters, **extra_filters)
+
+        if self.known:
+            queryset = queryset.exclude(id__in=known[self.known])
+
+        return queryset
+
+
+def _as_list(value):
+    if value is None:
+        return []
+
+    if isinstance(value, (models.QuerySet, list, tuple, set)):
+        return list(value)
+
+    return [value]
+
+
+class Effect:
+    """ Declares how cleaned form data of a choice changes character """
+
+    def __init__(self, field):
+        self.field = field
+
+    def collect(self, batch, character, data):
+        raise NotImplementedError
+
+
+class AddRelated(Effect):
+    """ Add objects to character many-to-many relation """
+    relation = None
+
+    def __init__(self, field, relation=None):
+        super().__init__(field)
+        self.relation = relation or self.relation
+
+    def collect(self, batch, character, data):
+        batch.m2m_add[self.relation].update((character.id, obj.id) for obj in _as_list(data.get(self.field)))
+
+
+class RemoveRelated(AddRelated):
+    def collect(self, batch, character, data):
+        batch.m2m_remove[self.relation].update((character.id, obj.id) for obj in _as_list(data.get(self.field)))
+
+
+class AddLanguages(AddRelated):
+    relation = 'languages'
+
+
+class AddSpells(AddRelated):
+    relation = 'known_spells'
+
+
+class RemoveSpells(RemoveRelated):
+    relation = 'known_spells'
+
+
+class CreateRows(Effect):
+    """ Create character rows (e.g. tool proficiency) pointing to every chosen object """
+
+    def __init__(self, field, model, target):
+        super().__init__(field)
+        self.model = model
+        self.target = target
+
+    def collect(self, batch, character, data):
+        model = get_model(self.model)
+        batch.create[model].extend(
+            model(character_id=character.id, **{self.target: obj}) for obj in _as_list(data.get(self.field))
+        )
+
+
+class AddTools(CreateRows):
+    def __init__(self, field):
+        super().__init__(field, 'charactertoolproficiency', 'tool')
+
+
+class AddFeatures(CreateRows):
+    def __init__(self, field):
+        super().__init__(field, 'characterfeature', 'feature')
+
+
+class SetValues(Effect):
+    """ Set field values on chosen character rows (e.g. skill proficiency) """
+
+    def __init__(self, field, **values):
+        super().__init__(field)
+        self.values = tuple(sorted(values.items()))
+
+    def collect(self, batch, character, data):
+        for obj in _as_list(data.get(self.field)):
+            batch.update[(type(obj), self.values)].add(obj.id)
+
+
+class EffectBatch:
+    """ Effects of many choices grouped by target table and written with one query per table """
+
+    def __init__(self):
+        self.m2m_add = defaultdict(set)
+        self.m2m_remove = defaultdict(set)
+        self.create = defaultdict(list)
+        self.update = defaultdict(set)
+
+    @staticmethod
+    def _through(relation):
+        field = get_model('character')._meta.get_field(relation)
+        return field.remote_field.through, f'{field.m2m_field_name()}_id', f'{field.m2m_reverse_field_name()}_id'
+
+    def commit(self):
+        for relation, pairs in self.m2m_remove.items():
+            through, source, target = self._through(relation)
+            query = models.Q()
+            for char_id, obj_id in pairs:
+                query |= models.Q(**{source: char_id, target: obj_id})
+            through.objects.filter(query).delete()
+
+        for relation, pairs in self.m2m_add.items():
+            through, source, target = self._through(relation)
+            through.objects.bulk_create(
+                [through(**{source: char_id, target: obj_id}) for char_id, obj_id in pairs], ignore_conflicts=True
+            )
+
+        for model, objs in self.create.items():
+            model.objects.bulk_create(objs)
+
+        for (model, values), ids in self.update.items():
+            model.objects.filter(id__in=ids).update(**dict(values))
+
+
+def resolve_batch(resolutions):
+    """ Apply many (CharacterAdvancmentChoice, cleaned data) pairs in one transaction """
+    from dnd5e.choices import ALL_CHOICES
+
+    batch = EffectBatch()
+    known = KnownEntities.for_characters({char_choice.character_id for char_choice, _ in resolutions})
+
+    with transaction.atomic():
+        for char_choice, data in resolutions:
+            char_choice.character._known_entities = known[char_choice.character_id]
+            selector = ALL_CHOICES.get(char_choice.choice.code, char_choice.character, choice=char_choice)
+
+            if selector.effects:
+                selector.collect_effects(batch, data)
+            else:
+                selector.apply_data(data)
+
+        batch.commit()
+
+        get_model('characteradvancmentchoice').objects.filter(
+            id__in=[char_choice.id for char_choice, _ in resolutions]
+        ).delete()
+
+        # Bulk updates don't send signals
+        party.invalidate({char_choice.character_id for char_choice, _ in resolutions})
+
+    for char_choice, _ in resolutions:
+        char_choice.character._known_entities = None
+
+
+def resolve_party(party_obj, submissions):
+    """
+    Validate forms of many party choices ({choice id: form data}) and resolve them all in one resolve_batch call.
+    Returns {choice id: errors}, nothing is resolved if any choice is invalid
+    """
+    from dnd5e.choices import ALL_CHOICES
+
+    queue = {
+        choice.id: choice for choice in get_model('characteradvancmentchoice').objects.filter(
+            character__party=party_obj
+        ).pending().select_related('character')
+    }
+    known = KnownEntities.for_characters({choice.character_id for choice in queue.values()})
+    # Important choices resolved in the same batch don't block the rest of character choices
+    unresolved_important = {
+        choice.character_id for choice in queue.values() if choice.important and choice.id not in submissions
+    }
+
+    errors, resolutions = {}, []
+    for choice_id, data in submissions.items():
+        choice = queue.get(choice_id)
+        if choice is None:
+            errors[choice_id] = ['Choice not found']
+            continue
+
+        if choice.blocked and choice.character_id in unresolved_important:
+            errors[choice_id] = ['Character has more important choice']
+            continue
+
+        choice.character._known_entities = known[choice.character_id]
+        form = ALL_CHOICES.get(choice.choice.code, choice.character, choice=choice).get_form(data)
+        if not form.is_valid():
+            errors[choice_id] = [f'{field}: {message}' for field, messages in form.errors.items() for message in messages]
+            continue
+
+        resolutions.append((choice, form.cleaned_data))
+
+    if not errors and resolutions:
+        # Resolve in queue order, so important choices are applied first
+        resolve_batch(sorted(resolutions, key=lambda resolution: (resolution[0].character_id, resolution[0].position)))
+
+    return errors
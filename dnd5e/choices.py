@@ -1,5 +1,9 @@
 from django.apps import apps
 
+from . import spell_index
+from .choice_engine import (
+    AddFeatures, AddLanguages, AddSpells, AddTools, Candidates, EffectBatch, KnownEntities, RemoveSpells, SetValues
+)
 from .forms import (
     AddCharLanguageFromBackground, AddCharSkillProficiency, CharacterBackgroundForm,
     ManeuversSelectForm, ManeuversUpgradeForm, MasterMindIntrigueSelect, SelectAbilityAdvanceForm,
@@ -13,6 +17,8 @@ get_model = dnd5e_app.get_model
 class CharacterChoice:
     form_class = None
     queryset = None
+    candidates = None  # Candidates declaration, used instead of queryset
+    effects = ()  # Effects applied to character with form cleaned data
     selection_limit = None
     pass_char = False  # Pass character to form_class
 
@@ -20,14 +26,25 @@ class CharacterChoice:
         self.character = character
         self.extra = kwargs
 
-    def get_form(self, request):
+    @property
+    def known(self):
+        return KnownEntities.for_character(self.character)
+
+    def get_queryset(self):
+        if self.candidates is not None:
+            return self.candidates.queryset(self.known)
+
+        return self.queryset
+
+    def get_form(self, data=None):
         if self.form_class is None:
             raise AssertionError('Choice formclass is not set')
 
-        form_args = {'data': request.POST or None, 'files': None}
+        form_args = {'data': data or None, 'files': None}
 
-        if self.queryset:
-            form_args['queryset'] = self.queryset
+        queryset = self.get_queryset()
+        if queryset is not None:
+            form_args['queryset'] = queryset
 
         if self.selection_limit:
             form_args['limit'] = self.selection_limit
@@ -37,47 +54,48 @@ class CharacterChoice:
 
         return self.form_class(**form_args)
 
+    def collect_effects(self, batch, data):
+        for effect in self.effects:
+            effect.collect(batch, self.character, data)
+
     def apply_data(self, data):
-        raise AssertionError('apply_data is not defined')
+        if not self.effects:
+            raise AssertionError('apply_data is not defined')
+
+        batch = EffectBatch()
+        self.collect_effects(batch, data)
+        batch.commit()
 
 
 class PROF_TOOLS_001(CharacterChoice):
     """ Владение одним игровым набором """
     form_class = SelectToolProficiency
-    queryset = get_model('tool').objects.filter(category=15)  # Gamble
+    candidates = Candidates('tool', known='tool', category=15)  # Gamble
+    effects = (AddTools('tools'), )
     selection_limit = 1
 
-    def apply_data(self, data):
-        CharToolsModel = get_model('charactertoolproficiency')
-        CharToolsModel.objects.bulk_create(
-            CharToolsModel(character=self.character, tool=tool) for tool in data['tools']
+    def get_form(self, data=None):
+        return self.form_class(
+            data=data or None, files=None, queryset=self.get_queryset(), limit=self.selection_limit,
+            character=self.character, category=self.candidates.filters['category']
         )
 
 
 class PROF_TOOLS_002(PROF_TOOLS_001):
     """ Владение одним музыкальным инструментом """
-    queryset = get_model('tool').objects.filter(category=10)  # Musical
+    candidates = Candidates('tool', known='tool', category=10)  # Musical
 
 
 class PROF_TOOLS_003(PROF_TOOLS_001):
     """ Владение одним ремесленным инструментом """
-    queryset = get_model('tool').objects.filter(category=5)  # Artisian
+    candidates = Candidates('tool', known='tool', category=5)  # Artisian
 
 
 class CLASS_WAR_001(CharacterChoice):
     """ Боевой стиль воина """
     form_class = SelectFeatureForm
-    queryset = get_model('feature').objects.filter(group='fight_style')
-
-    def get_form(self, request):
-        self.queryset = get_model('feature').objects.filter(group='fight_style').exclude(
-            id__in=self.character.features.filter(feature__group='fight_style').values_list('feature_id')
-        )
-
-        return super().get_form(request)
-
-    def apply_data(self, data):
-        get_model('characterfeature').objects.create(character=self.character, feature=data['feature'])
+    candidates = Candidates('feature', known='feature', group='fight_style')
+    effects = (AddFeatures('feature'), )
 
 
 class CHAR_CLASS_SUBTYPE(CharacterChoice):
@@ -128,26 +146,19 @@ class CLASS_COMPETENCE(CharacterChoice):
     form_class = CompetenceForm
     selection_limit = 2
 
-    def get_form(self, request):
-        self.queryset = self.character.skills.filter(competence=False, proficiency=True)
+    effects = (SetValues('skills', competence=True), )
 
-        return super().get_form(request)
+    def get_form(self, data=None):
+        self.queryset = self.character.skills.filter(competence=False, proficiency=True)
 
-    def apply_data(self, data):
-        data['skills'].update(competence=True)
+        return super().get_form(data)
 
 
 class CLASS_ROG_002(CLASS_COMPETENCE):
     """ Компетентность Плут """
     form_class = RogueCompetenceForm
     pass_char = True
-
-    def apply_data(self, data):
-        super().apply_data(data)
-
-        if data['tool']:
-            data['tool'].competence = True
-            data['tool'].save(update_fields=['competence'])
+    effects = (SetValues('skills', competence=True), SetValues('tool', competence=True))
 
 
 class CombatSuperiorityChoice(CharacterChoice):
@@ -208,16 +219,15 @@ class CLASS_BATTLE_003(CombatSuperiorityChoice):
 class CLASS_ROG_003(CharacterChoice):
     """ Выбор для интригана """
     form_class = MasterMindIntrigueSelect
+    tools = Candidates('tool', known='tool', category=15)  # Gamble
+    languages = Candidates('language', known='language')
+    effects = (AddTools('tool'), AddLanguages('languages'))
 
-    def get_form(self, request):
-        return self.form_class(request.POST or None, character=self.character)
-
-    def apply_data(self, data):
-        _ = get_model('charactertoolproficiency').objects.create(
-            character=self.character, tool=data['tool']
+    def get_form(self, data=None):
+        return self.form_class(
+            data or None, tools=self.tools.queryset(self.known), tool_category=self.tools.filters['category'],
+            languages=self.languages.queryset(self.known), character=self.character
         )
-        for lang in data['languages']:
-            self.character.languages.add(lang)
 
 
 class CHAR_ADVANCE_001(CharacterChoice):
@@ -225,10 +235,10 @@ class CHAR_ADVANCE_001(CharacterChoice):
     template = 'dnd5e/adventures/include/choices/advance_001.html'
     form_class = SelectAbilityAdvanceForm
 
-    def get_form(self, request):
+    def get_form(self, data=None):
         self.queryset = get_model('characterabilities').objects.filter(character=self.character)
 
-        return super().get_form(request)
+        return super().get_form(data)
 
     def apply_data(self, data):
         abilities = data['abilities']
@@ -238,37 +248,33 @@ class CHAR_ADVANCE_001(CharacterChoice):
         elif len(abilities) == 1:
             abilities.increase_value(2)
 
+        self.character.update_hit_points()
+
 
 class CHAR_ADVANCE_002(CharacterChoice):
     ''' Выбор мастерства классовых навыков на первом уровне'''
     form_class = AddCharSkillProficiency
+    effects = (SetValues('skills', proficiency=True), )
 
-    def get_form(self, request):
+    def get_form(self, data=None):
         return self.form_class(
-            data=request.POST or None, files=None,
+            data=data or None, files=None,
             limit=self.character.classes.first().klass.skill_proficiency_limit,
             skills=self.character.skills.exclude(proficiency=True)
         )
 
-    def apply_data(self, data):
-        data['skills'].update(proficiency=True)
-
 
 class CHAR_ADVANCE_003(CharacterChoice):
     ''' Выбор языков из предыстории '''
     form_class = AddCharLanguageFromBackground
+    candidates = Candidates('language', known='language')
+    effects = (AddLanguages('langs'), )
+    pass_char = True
 
-    def get_form(self, request):
+    def get_form(self, data=None):
         self.selection_limit = self.character.background.known_languages
-        self.queryset = get_model('language').objects.exclude(
-            id__in=self.character.languages.all().values_list('id')
-        )
-
-        return super().get_form(request)
 
-    def apply_data(self, data):
-        for lang in data['langs']:
-            self.character.languages.add(lang)
+        return super().get_form(data)
 
 
 class CHAR_ADVANCE_004(CharacterChoice):
@@ -276,9 +282,9 @@ class CHAR_ADVANCE_004(CharacterChoice):
     form_class = CharacterBackgroundForm
     template = 'dnd5e/adventures/include/choices/advance_004.html'
 
-    def get_form(self, request):
+    def get_form(self, data=None):
         return self.form_class(
-            data=request.POST or None, files=None,
+            data=data or None, files=None,
             background=self.character.background
         )
 
@@ -291,92 +297,92 @@ class CHAR_ADVANCE_004(CharacterChoice):
 class CHAR_ADVANCE_005(CharacterChoice):
     ''' Выбор мастерства в одном классовом навыке'''
     form_class = AddCharSkillProficiency
+    effects = (SetValues('skills', proficiency=True), )
     selection_limit = 1
 
-    def get_form(self, request):
+    def get_form(self, data=None):
         return self.form_class(
-            data=request.POST or None, files=None,
+            data=data or None, files=None,
             limit=self.selection_limit,
             skills=self.character.skills.exclude(proficiency=True)
         )
 
-    def apply_data(self, data):
-        data['skills'].update(proficiency=True)
 
-
-class CHAR_SPELLS_BARD(CharacterChoice):
-    form_class = KnownSpellsForm
+class CHAR_CLASS_SPELLS(CharacterChoice):
+    """ ABS for spells choices: spells of reason class offered from spell index """
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        char_class = self.extra['choice'].reason
-        self.queryset = get_model('spell').objects.filter(classes=char_class.klass_id)
-        self.spellcasting = char_class.spellcasting[char_class.level]
+        self.char_class = self.extra['choice'].reason
+        self.spellcasting = self.char_class.current_spellcasting
+
+    def spell_levels(self):
+        return range(1, len(self.spellcasting['slots']) + 1)
 
-    def get_form(self, request):
-        form_args = {'data': request.POST or None, 'files': None}
-        form_args['queryset'] = self.queryset
-        form_args['spellcasting'] = self.spellcasting
-        form_args['character'] = self.character
+    def get_form(self, data=None):
+        index = spell_index.get_index()
+        form_args = {'data': data or None, 'files': None, 'index': index}
+        form_args.update(self.get_form_kwargs(index, self.char_class.klass_id))
 
         return self.form_class(**form_args)
 
-    def apply_data(self, data):
-        self.character.known_spells.set(list(data['known_cantrips']) + list(data['known_spells']))
+    def get_form_kwargs(self, index, class_id):
+        raise NotImplementedError
 
 
-class CHAR_SPELLS_REPLACE(CharacterChoice):
-    form_class = ReplaceKnownSpellsForm
+class CHAR_SPELLS_BARD(CHAR_CLASS_SPELLS):
+    form_class = KnownSpellsForm
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def get_form_kwargs(self, index, class_id):
+        return {
+            'spellcasting': self.spellcasting,
+            'cantrips': index.available(class_id, [0]),
+            'spells': index.available(class_id, self.spell_levels()),
+        }
 
-        char_class = self.extra['choice'].reason
-        self.spellcasting = char_class.spellcasting
+    def apply_data(self, data):
+        self.character.known_spells.set(data['spells'])
 
-    def get_form(self, request):
-        form_args = {'data': request.POST or None, 'files': None}
-        form_args['spellcasting'] = self.spellcasting
-        form_args['character'] = self.character
 
-        return self.form_class(**form_args)
+class CHAR_SPELLS_REPLACE(CHAR_CLASS_SPELLS):
+    form_class = ReplaceKnownSpellsForm
+    effects = (RemoveSpells('to_replace'), AddSpells('by_replace'))
 
-    def apply_data(self, data):
-        self.character.known_spells.remove(*data['to_replace'])
-        self.character.known_spells.add(*data['by_replace'])
+    def get_form_kwargs(self, index, class_id):
+        known = self.known
 
+        return {
+            'spellcasting': self.char_class.spellcasting,
+            'known': index.ordered(known['spell'] - known.spells_by_level[0]),
+            'available': index.available(class_id, self.spell_levels(), exclude=known['spell']),
+        }
 
-class CHAR_SPELLS_APPEND(CharacterChoice):
+
+class CHAR_SPELLS_APPEND(CHAR_CLASS_SPELLS):
     ''' Add new known spells after level up'''
     form_class = AddKnownSpellsForm
+    effects = (AddSpells('spells'), )
+    cantrips = False
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        char_class = self.extra['choice'].reason
-        spellcasting = char_class.current_spellcasting
-
-        self.queryset = get_model('spell').objects.filter(classes=char_class.klass_id)
-        self.queryset = self.queryset.filter(level__lte=len(spellcasting['slots'])).exclude(level=0)
-        self.selection_limit = spellcasting['spells'] - self.character.known_spells.exclude(level=0).count()
+        if self.cantrips:
+            self.selection_limit = self.spellcasting['cantrips'] - self.known.spells_count(cantrips=True)
+        else:
+            self.selection_limit = self.spellcasting['spells'] - self.known.spells_count()
         # TODO Check selection limit 0 or less
 
-    def apply_data(self, data):
-        self.character.known_spells.add(*data['spells'])
+    def get_form_kwargs(self, index, class_id):
+        levels = [0] if self.cantrips else self.spell_levels()
+
+        return {'spells': index.available(class_id, levels, exclude=self.known['spell']), 'limit': self.selection_limit}
 
 
 class CHAR_CANTRIPS_APPEND(CHAR_SPELLS_APPEND):
     ''' Add new known cantrips after level up'''
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
-        char_class = self.extra['choice'].reason
-        spellcasting = char_class.current_spellcasting
-
-        self.queryset = get_model('spell').objects.filter(classes=char_class.klass_id).filter(level=0)
-        self.selection_limit = spellcasting['cantrips'] - self.character.known_spells.filter(level=0).count()
-        # TODO Check selection limit 0 or less
+    cantrips = True
 
 
 class POST_FEAT_001:
@@ -115,6 +115,14 @@ MULTICLASS_SLOTS = {
     20: (4, 3, 3, 3, 3, 2, 2, 1, 1),
 }
 
+# How levels of spellcasting class count to multiclass caster level, pact magic slots don't add up with others
+CASTER_PROGRESSION = {
+    'bard': 'full', 'cleric': 'full', 'druid': 'full', 'sorcerer': 'full', 'wizard': 'full',
+    'paladin': 'half', 'ranger': 'half',
+    'fighter.eldritch_knight': 'third', 'rogue.arcane_trickster': 'third',
+    'warlock': 'pact',
+}
+
 
 class CharacterAbilitiesLimit(dict):
     def _check(self, ability):
@@ -143,6 +151,59 @@ ROGUE_SNEAK_ATTACK = {
     11: '6d6', 12: '6d6', 13: '7d6', 14: '7d6', 15: '8d6', 16: '8d6', 17: '9d6', 18: '9d6', 19: '10d6', 20: '10d6'
 }
 
+# Character XP thresholds by level: easy, medium, hard, deadly
+XP_THRESHOLDS = {
+    1: (25, 50, 75, 100), 2: (50, 100, 150, 200), 3: (75, 150, 225, 400), 4: (125, 250, 375, 500),
+    5: (250, 500, 750, 1100), 6: (300, 600, 900, 1400), 7: (350, 750, 1100, 1700), 8: (450, 900, 1400, 2100),
+    9: (550, 1100, 1600, 2400), 10: (600, 1200, 1900, 2800), 11: (800, 1600, 2400, 3600),
+    12: (1000, 2000, 3000, 4500), 13: (1100, 2200, 3400, 5100), 14: (1250, 2500, 3800, 5700),
+    15: (1400, 2800, 4300, 6400), 16: (1600, 3200, 4800, 7200), 17: (2000, 3900, 5900, 8800),
+    18: (2100, 4200, 6300, 9500), 19: (2400, 4900, 7300, 10900), 20: (2800, 5700, 8500, 12700)
+}
+
+ENCOUNTER_DIFFICULTY = ('Лёгкое', 'Среднее', 'Сложное', 'Смертельное')
+
+# Encounter XP multipliers, first and last are used only for small and large parties
+ENCOUNTER_MULTIPLIERS = (0.5, 1, 1.5, 2, 2.5, 3, 4, 5)
+
+
+def encounter_multiplier(monsters, party_size=4):
+    if monsters == 0:
+        return 0
+
+    index = 1 + sum(monsters >= count for count in (2, 3, 7, 11, 15))
+    if party_size < 3:
+        index += 1
+    elif party_size >= 6:
+        index -= 1
+
+    return ENCOUNTER_MULTIPLIERS[index]
+
+
+# Monster statistics by challenge XP: proficiency bonus, armor class, hit points range
+MONSTER_STATS = {
+    10: (2, 13, 1, 6), 25: (2, 13, 7, 35), 50: (2, 13, 36, 49), 100: (2, 13, 50, 70), 200: (2, 13, 71, 85),
+    450: (2, 13, 86, 100), 700: (2, 13, 101, 115), 1100: (2, 14, 116, 130), 1800: (3, 15, 131, 145),
+    2300: (3, 15, 146, 160), 2900: (3, 15, 161, 175), 3900: (3, 16, 176, 190), 5000: (4, 16, 191, 205),
+    5900: (4, 17, 206, 220),
+}
+
+# Monster hit dice sides by size
+HIT_DICE_BY_SIZE = {'t': 4, 's': 6, 'm': 8, 'l': 10, 'h': 12, 'g': 20}
+
+
+def max_hit_points(class_dice, constitution):
+    """ Hit points of [(hit dice sides, class level)]: die maximum for the very first level, fixed average after """
+    mod = dnd_mod(constitution)
+    hit_points = 0
+
+    for num, (dice, level) in enumerate(class_dice):
+        for lvl in range(level):
+            gain = dice if num == 0 and lvl == 0 else dice // 2 + 1
+            hit_points += max(gain + mod, 1)
+
+    return hit_points
+
 
 ALL_TABLES = {
     'ROGUE_SNEAK_ATTACK': ROGUE_SNEAK_ATTACK,
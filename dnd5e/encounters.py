@@ -0,0 +1,298 @@
+import bisect
+import math
+import random
+from array import array
+from collections import defaultdict, namedtuple
+
+from django.core.cache import cache
+from django.db import models, transaction
+
+from dnd5e import dnd
+
+CACHE_PREFIX = 'dnd5e:encounters'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+# Changes of these models invalidate adventure budget
+BUDGET_MODELS = ('AdventureMonster', 'Character', 'Party', 'Place', 'Trap', 'Zone')
+
+MONSTER_KILLED = 100
+
+POOL_KEY = f'{CACHE_PREFIX}:pool'
+
+# Generated groups: up to this many monsters, deadly encounter is up to this share above its threshold
+MAX_GROUP_SIZE = 12
+DEADLY_MARGIN = 1.5
+GENERATED_GROUPS = 10
+
+DIFFICULTY_BADGES = ('secondary', 'success', 'info', 'warning', 'danger')
+
+Encounter = namedtuple('Encounter', ['xp', 'monsters', 'traps_xp'])
+Budget = namedtuple('Budget', ['xp', 'monsters', 'traps_xp', 'parties'])
+
+EMPTY = Encounter(0, 0, 0)
+
+MonsterGroup = namedtuple('MonsterGroup', ['monsters', 'xp', 'adjusted'])  # Monsters as ((monster id, count), )
+
+
+class PartyDifficulty(namedtuple('PartyDifficulty', ['party', 'adjusted', 'level', 'reward'])):
+    """ Level is number of party thresholds reached by adjusted XP, reward is XP per party member """
+
+    @property
+    def label(self):
+        return dnd.ENCOUNTER_DIFFICULTY[self.level - 1] if self.level else 'Тривиальное'
+
+    @property
+    def badge(self):
+        return DIFFICULTY_BADGES[self.level]
+
+
+def _key(adventure_id):
+    return f'{CACHE_PREFIX}:{adventure_id}'
+
+
+class EncounterBudget:
+    """ Monster and trap XP of every adventure location and party levels, built with a fixed number of queries """
+
+    def __init__(self, locations, places, zones, parties):
+        self.locations = locations  # {(model name, location id): Encounter}
+        self.places = places  # {place id: stage id}
+        self.zones = zones  # {zone id: place id}
+        self.parties = parties  # {party name: [alive members levels]}
+
+    @classmethod
+    def build(cls, adventure_id):
+        from dnd5e.models import AdventureMonster, Character, Place, Zone
+
+        places = dict(Place.objects.filter(stage__adventure_id=adventure_id).values_list('id', 'stage_id'))
+        zones = dict(Zone.objects.filter(place__stage__adventure_id=adventure_id).values_list('id', 'place_id'))
+
+        locations = defaultdict(lambda: [0, 0, 0])
+        monsters = AdventureMonster.objects.filter(adventure_id=adventure_id).exclude(
+            status=MONSTER_KILLED
+        ).order_by().values('location_ct__model', 'location_id').annotate(
+            xp=models.Sum('monster__challenge'), count=models.Count('id')
+        )
+        for row in monsters:
+            location = locations[(row['location_ct__model'], row['location_id'])]
+            location[0], location[1] = row['xp'], row['count']
+
+        for model, ids in ((Place, places), (Zone, zones)):
+            field = model._meta.model_name
+            traps = model.traps.through.objects.filter(**{f'{field}_id__in': ids}).order_by().values(
+                f'{field}_id'
+            ).annotate(xp=models.Sum('trap__exp_reward'))
+            for row in traps:
+                locations[(field, row[f'{field}_id'])][2] = row['xp'] or 0
+
+        parties = defaultdict(list)
+        members = Character.objects.filter(party__adventure_id=adventure_id, dead=False).order_by(
+            'party__name'
+        ).values_list('party__name', 'level')
+        for name, level in members:
+            parties[name].append(level)
+
+        return cls(
+            {location: Encounter(*values) for location, values in locations.items()}, places, zones, dict(parties)
+        )
+
+    def _difficulty(self, encounter, levels):
+        adjusted = int(encounter.xp * dnd.encounter_multiplier(encounter.monsters, len(levels)))
+        thresholds = [sum(column) for column in zip(*(dnd.XP_THRESHOLDS[level] for level in levels))]
+
+        return adjusted, sum(adjusted >= threshold for threshold in thresholds)
+
+    def _budget(self, encounters):
+        encounters = [encounter for encounter in encounters if encounter != EMPTY]
+        parties = []
+
+        for name, levels in self.parties.items():
+            difficulties = [self._difficulty(encounter, levels) for encounter in encounters if encounter.monsters]
+            parties.append(PartyDifficulty(
+                name,
+                sum(adjusted for adjusted, _ in difficulties),
+                max((level for _, level in difficulties), default=0),
+                sum(encounter.xp + encounter.traps_xp for encounter in encounters) // len(levels),
+            ))
+
+        return Budget(
+            sum(encounter.xp for encounter in encounters), sum(encounter.monsters for encounter in encounters),
+            sum(encounter.traps_xp for encounter in encounters), parties,
+        )
+
+    def location(self, model_name, location_id):
+        return self._budget([self.locations.get((model_name, location_id), EMPTY)])
+
+    def place(self, place_id, with_zones=False):
+        locations = [('place', place_id)]
+        if with_zones:
+            locations += [('zone', zone_id) for zone_id, zone_place in self.zones.items() if zone_place == place_id]
+
+        return self._budget([self.locations.get(location, EMPTY) for location in locations])
+
+    def stage(self, stage_id):
+        place_ids = {place_id for place_id, place_stage in self.places.items() if place_stage == stage_id}
+        locations = [('place', place_id) for place_id in place_ids]
+        locations += [('zone', zone_id) for zone_id, place_id in self.zones.items() if place_id in place_ids]
+
+        return self._budget([self.locations.get(location, EMPTY) for location in locations])
+
+    def adventure(self):
+        return self._budget(self.locations.values())
+
+
+class MonsterPool:
+    """ Monsters bucketed by challenge XP, XP values are sorted so group members are found with bisect """
+
+    def __init__(self, buckets, owners, hit_points):
+        self.levels = sorted(buckets)  # Distinct XP values
+        self.buckets = {xp: array('I', sorted(ids)) for xp, ids in buckets.items()}  # {xp: monster ids}
+        self.owners = owners  # {monster id: adventure id} of adventure only monsters
+        self.hit_points = hit_points  # {monster id: hit points}
+
+    @classmethod
+    def build(cls):
+        from dnd5e.models import Monster
+
+        buckets = defaultdict(list)
+        owners = {}
+        hit_points = {}
+        for monster_id, xp, owner, hp in Monster.objects.values_list('id', 'challenge', 'adventure_only', 'hit_points'):
+            buckets[xp].append(monster_id)
+            hit_points[monster_id] = hp
+            if owner is not None:
+                owners[monster_id] = owner
+
+        return cls(buckets, owners, hit_points)
+
+    def available(self, adventure_id, allowed=None):
+        """ {xp: [monster ids]} of catalogue and adventure own monsters, allowed is set of ids or None for any """
+        available = {}
+        for xp in self.levels:
+            ids = [monster_id for monster_id in self.buckets[xp] if allowed is None or monster_id in allowed]
+            ids = [monster_id for monster_id in ids if self.owners.get(monster_id, adventure_id) == adventure_id]
+            if ids:
+                available[xp] = ids
+
+        return available
+
+    @staticmethod
+    def _between(levels, low, high):
+        """ XP values in [low, high) """
+        return levels[bisect.bisect_left(levels, low):bisect.bisect_left(levels, high)]
+
+    def combinations(self, levels, low, high, party_size):
+        """ Pairs (leader xp, minion xp, group size) with adjusted XP in [low, high), leader xp is None for one kind """
+        for size in range(1, MAX_GROUP_SIZE + 1):
+            multiplier = dnd.encounter_multiplier(size, party_size)
+            raw_low, raw_high = math.ceil(low / multiplier), math.ceil(high / multiplier)
+
+            for xp in self._between(levels, math.ceil(raw_low / size), math.ceil(raw_high / size)):
+                yield None, xp, size
+
+            if size < 2:
+                continue
+
+            # One stronger leader with the rest of group of weaker monsters
+            for minion_xp in levels:
+                rest = minion_xp * (size - 1)
+                if rest >= raw_high:
+                    break
+                for leader_xp in self._between(levels, max(raw_low - rest, minion_xp + 1), raw_high - rest):
+                    yield leader_xp, minion_xp, size
+
+    def generate(self, party_levels, difficulty, adventure_id, allowed=None, count=GENERATED_GROUPS, rng=random):
+        """ Random monster groups of given difficulty (index of dnd.ENCOUNTER_DIFFICULTY) for party """
+        if not party_levels:
+            return []
+
+        thresholds = [sum(column) for column in zip(*(dnd.XP_THRESHOLDS[level] for level in party_levels))]
+        low = thresholds[difficulty]
+        high = thresholds[difficulty + 1] if difficulty + 1 < len(thresholds) else int(low * DEADLY_MARGIN)
+
+        available = self.available(adventure_id, allowed)
+        combinations = list(self.combinations(sorted(available), low, high, len(party_levels)))
+
+        groups = []
+        for leader_xp, minion_xp, size in rng.sample(combinations, min(count, len(combinations))):
+            monsters = ((rng.choice(available[minion_xp]), size - (leader_xp is not None)), )
+            if leader_xp is not None:
+                monsters = ((rng.choice(available[leader_xp]), 1), ) + monsters
+
+            xp = minion_xp * (size - (leader_xp is not None)) + (leader_xp or 0)
+            groups.append(MonsterGroup(monsters, xp, int(xp * dnd.encounter_multiplier(size, len(party_levels)))))
+
+        return sorted(groups, key=lambda group: group.adjusted)
+
+
+def get_pool():
+    pool = cache.get(POOL_KEY)
+
+    if pool is None:
+        pool = MonsterPool.build()
+        cache.set(POOL_KEY, pool, CACHE_TIMEOUT)
+
+    return pool
+
+
+def invalidate_pool():
+    transaction.on_commit(lambda: cache.delete(POOL_KEY))
+
+
+def place_monsters(adventure_id, location, monsters):
+    """ Create adventure monsters from [(monster id, count)] in location with bulk queries """
+    from django.contrib.contenttypes.models import ContentType
+
+    from dnd5e import knowledge, sync
+    from dnd5e.models import AdventureMonster
+
+    pool = get_pool()
+    location_ct = ContentType.objects.get_for_model(location)
+
+    with transaction.atomic():
+        created = AdventureMonster.objects.bulk_create([
+            AdventureMonster(
+                adventure_id=adventure_id, monster_id=monster_id, current_hp=pool.hit_points[monster_id],
+                location_ct=location_ct, location_id=location.id
+            )
+            for monster_id, count in monsters for _ in range(count)
+        ])
+
+        # Bulk create doesn't send signals
+        invalidate(adventure_id)
+        knowledge.invalidate_index(adventure_id)
+        sync.record(adventure_id, 'adventuremonster', created)
+
+    return created
+
+
+def get_budget(adventure_id):
+    key = _key(adventure_id)
+    budget = cache.get(key)
+
+    if budget is None:
+        budget = EncounterBudget.build(adventure_id)
+        cache.set(key, budget, CACHE_TIMEOUT)
+
+    return budget
+
+
+def invalidate(adventure_id):
+    key = _key(adventure_id)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def adventure_ids(instance):
+    from dnd5e.models import Place, Stage, Zone
+
+    model_name = instance._meta.model_name
+
+    if model_name == 'place':
+        return set(Stage.objects.filter(id=instance.stage_id).values_list('adventure_id', flat=True))
+    if model_name == 'zone':
+        return set(Place.objects.filter(id=instance.place_id).values_list('stage__adventure_id', flat=True))
+    if model_name == 'trap':
+        return set(Place.objects.filter(traps=instance).values_list('stage__adventure_id', flat=True)) | set(
+            Zone.objects.filter(traps=instance).values_list('place__stage__adventure_id', flat=True)
+        )
+
+    return {instance.adventure_id}
\ No newline at end of file
@@ -0,0 +1,130 @@
+import operator
+from collections import defaultdict
+from functools import reduce
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import transaction
+
+CACHE_PREFIX = 'dnd5e:facets'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+VALUE = 'value'
+MANY = 'many'  # Many-to-many field
+FLAGS = 'flags'  # Bitmask field, objects must have all selected flags
+
+# Facet fields of catalogue models: {model name: {facet name: (field lookup, kind)}}
+FACETS = {
+    'spell': {'level': ('level', VALUE), 'school': ('school_id', VALUE), 'classes': ('classes', MANY)},
+    'monster': {
+        'size': ('size', VALUE), 'mtype': ('mtype_id', VALUE), 'source': ('source_id', VALUE),
+        'damage_immunity': ('damage_immunity', FLAGS), 'damage_vuln': ('damage_vuln', FLAGS),
+        'condition_immunity': ('condition_immunity', FLAGS),
+    },
+}
+
+
+def _key(kind):
+    return f'{CACHE_PREFIX}:{kind}'
+
+
+def popcount(bits):
+    return bin(bits).count('1')
+
+
+class FacetIndex:
+    """ Bitset of objects per facet value, bit number is position of object id in sorted ids """
+
+    def __init__(self, ids, bitsets, conjoined=()):
+        self.ids = ids  # Sorted object ids
+        self.bitsets = bitsets  # {facet name: {value as string: bits}}
+        self.conjoined = frozenset(conjoined)  # Facets matching all selected values instead of any
+        self.positions = {obj_id: num for num, obj_id in enumerate(ids)}
+        self.all = (1 << len(ids)) - 1
+
+    @classmethod
+    def build(cls, kind):
+        model = apps.get_model('dnd5e', kind)
+        facets = FACETS[kind]
+        bitsets = {facet: defaultdict(int) for facet in facets}
+
+        scalar = [(facet, lookup, kind) for facet, (lookup, kind) in facets.items() if kind != MANY]
+        rows = model.objects.order_by('id').values_list('id', *(lookup for _, lookup, _ in scalar))
+        ids = []
+        for num, (obj_id, *values) in enumerate(rows):
+            ids.append(obj_id)
+            for (facet, _, kind), value in zip(scalar, values):
+                for flag in (value if kind == FLAGS else [value]):
+                    bitsets[facet][str(flag)] |= 1 << num
+
+        positions = {obj_id: num for num, obj_id in enumerate(ids)}
+        for facet, (lookup, kind) in facets.items():
+            if kind != MANY:
+                continue
+            field = model._meta.get_field(lookup)
+            through = getattr(model, lookup).through
+            for obj_id, value in through.objects.values_list(field.m2m_column_name(), field.m2m_reverse_name()):
+                bitsets[facet][str(value)] |= 1 << positions[obj_id]
+
+        return cls(
+            ids, {facet: dict(values) for facet, values in bitsets.items()},
+            [facet for facet, (_, kind) in facets.items() if kind == FLAGS]
+        )
+
+    def mask(self, ids):
+        bits = 0
+        for obj_id in ids:
+            if obj_id in self.positions:
+                bits |= 1 << self.positions[obj_id]
+
+        return bits
+
+    def select(self, selection, skip=None):
+        """ Objects matching any (or all for conjoined facets) selected value of every facet except skipped one """
+        bits = self.all
+        for facet, values in selection.items():
+            if facet == skip or not values:
+                continue
+
+            facet_bits = [self.bitsets[facet].get(str(value), 0) for value in values]
+            if facet in self.conjoined:
+                bits = reduce(operator.and_, facet_bits, bits)
+            else:
+                bits &= reduce(operator.or_, facet_bits)
+
+        return bits
+
+    def members(self, bits):
+        """ Set of object ids of bitset """
+        return {obj_id for obj_id, bit in zip(self.ids, reversed(bin(bits)[2:])) if bit == '1'}
+
+    def counts(self, selection, base=None):
+        """ {facet: {value: count}}, value count is number of objects matched if it were added to selection """
+        base = self.all if base is None else base
+        counts = {}
+
+        for facet, values in self.bitsets.items():
+            # Selecting one more value narrows conjoined facet, so its own selection is counted too
+            bits = base & self.select(selection, skip=None if facet in self.conjoined else facet)
+            counts[facet] = {value: popcount(value_bits & bits) for value, value_bits in values.items()}
+
+        return counts
+
+    def total(self, selection, base=None):
+        return popcount((self.all if base is None else base) & self.select(selection))
+
+
+def get_index(kind):
+    key = _key(kind)
+    index = cache.get(key)
+
+    if index is None:
+        index = FacetIndex.build(kind)
+        cache.set(key, index, CACHE_TIMEOUT)
+
+    return index
+
+
+def invalidate():
+    keys = [_key(kind) for kind in FACETS]
+    transaction.on_commit(lambda: cache.delete_many(keys))
\ No newline at end of file
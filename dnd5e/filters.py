@@ -3,14 +3,16 @@ from django.db import models
 
 import django_filters
 
-from .models import SIZE_CHOICES, Class, Monster, MonsterType, RuleBook, Spell, SpellSchool
+from . import facets, lookup
+from .model_fields import Coins
+from .models import CONDITIONS, DAMAGE_TYPES, SIZE_CHOICES, Class, Monster, MonsterType, RuleBook, Spell, SpellSchool
 
-LEVEL_CHOICES = (
-    (0, 'Заговор'),
-    (1, 1),
-    (2, 2),
-    (3, 3),
-)
+LEVEL_CHOICES = ((0, 'Заговор'), ) + tuple((level, level) for level in range(1, 10))
+
+TERM_MATCHES = 20
+
+PRICE_ORDERING = (('price', 'сначала дешевле'), ('-price', 'сначала дороже'), ('name', 'по названию'))
+DAMAGE_ORDERING = (('-damage', 'сначала сильнее'), ('damage', 'сначала слабее'))
 
 
 class TermMixin(django_filters.FilterSet):
@@ -20,7 +22,66 @@ class TermMixin(django_filters.FilterSet):
     )
 
     def filter_name(self, queryset, name, value):
-        return queryset.filter(models.Q(name__icontains=value) | models.Q(orig_name__icontains=value))
+        """ Substring match or fuzzy match by name index, typos and translit are allowed """
+        return queryset.filter(id__in=lookup.matching(queryset.model._meta.model_name, value, limit=TERM_MATCHES))
+
+
+class FacetMixin(django_filters.FilterSet):
+    """ Choices of facet filters show number of objects, counted in memory with facet index bitsets """
+
+    @property
+    def facet_kind(self):
+        return self._meta.model._meta.model_name
+
+    @property
+    def facet_index(self):
+        return facets.get_index(self.facet_kind)
+
+    def facet_selection(self):
+        getlist = getattr(self.data, 'getlist', lambda name: [])
+        return {facet: [value for value in getlist(facet) if value] for facet in facets.FACETS[self.facet_kind]}
+
+    def facet_base(self):
+        term = self.data.get('term')
+        if not term:
+            return None
+
+        return self.facet_index.mask(lookup.matching(self.facet_kind, term, limit=TERM_MATCHES))
+
+    @property
+    def facet_total(self):
+        return self.facet_index.total(self.facet_selection(), self.facet_base())
+
+    @property
+    def form(self):
+        if not hasattr(self, '_form'):
+            index = self.facet_index
+            counts = index.counts(self.facet_selection(), self.facet_base())
+            form = super().form
+
+            for facet, values in counts.items():
+                field = form.fields[facet]
+                if hasattr(field, 'queryset'):
+                    field.queryset = field.queryset.filter(pk__in=[int(value) for value in index.bitsets[facet]])
+                    field.label_from_instance = lambda obj, values=values: f'{obj} ({values.get(str(obj.pk), 0)})'
+                else:
+                    field.choices = [(value, f'{label} ({values.get(str(value), 0)})') for value, label in field.choices]
+
+        return self._form
+
+
+class BitmaskFilter(django_filters.MultipleChoiceFilter):
+    """ Objects having all selected flags of bitmask field """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('lookup_expr', 'has_all')
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+
+        return qs.filter(**{f'{self.field_name}__{self.lookup_expr}': value})
 
 
 class BaseEmptyInitFilter(django_filters.FilterSet):
@@ -31,7 +92,7 @@ class BaseEmptyInitFilter(django_filters.FilterSet):
             self.queryset = self.queryset.none()
 
 
-class SpellFilter(BaseEmptyInitFilter, TermMixin):
+class SpellFilter(BaseEmptyInitFilter, FacetMixin, TermMixin):
     school = django_filters.ModelChoiceFilter(
         empty_label='школа магии', label='Shcool', field_name='school', queryset=SpellSchool.objects.all(),
         widget=forms.Select(attrs={'class': 'form-control'})
@@ -50,7 +111,7 @@ class SpellFilter(BaseEmptyInitFilter, TermMixin):
         fields = []
 
 
-class MonsterFilter(BaseEmptyInitFilter, TermMixin):
+class MonsterFilter(BaseEmptyInitFilter, FacetMixin, TermMixin):
     size = django_filters.MultipleChoiceFilter(
         choices=SIZE_CHOICES, field_name='size', lookup_expr='in',
         widget=forms.SelectMultiple(attrs={'class': 'selectpicker'})
@@ -61,9 +122,69 @@ class MonsterFilter(BaseEmptyInitFilter, TermMixin):
     )
     source = django_filters.ModelMultipleChoiceFilter(
         field_name='source', widget=forms.SelectMultiple(attrs={'class': 'selectpicker'}),
-        queryset=RuleBook.objects.annotate(models.Count('monster')).exclude(monster__count=0)
+        queryset=RuleBook.objects.all()
+    )
+    damage_immunity = BitmaskFilter(
+        choices=DAMAGE_TYPES, field_name='damage_immunity', widget=forms.SelectMultiple(
+            attrs={'class': 'selectpicker', 'title': 'иммунитет к урону'}
+        )
+    )
+    damage_vuln = BitmaskFilter(
+        choices=DAMAGE_TYPES, field_name='damage_vuln', widget=forms.SelectMultiple(
+            attrs={'class': 'selectpicker', 'title': 'уязвимость к урону'}
+        )
+    )
+    condition_immunity = BitmaskFilter(
+        choices=CONDITIONS, field_name='condition_immunity', widget=forms.SelectMultiple(
+            attrs={'class': 'selectpicker', 'title': 'иммунитет к состоянию'}
+        )
     )
 
     class Meta:
         model = Monster
-        fields = ['source', 'size']
\ No newline at end of file
+        fields = ['source', 'size']
+
+
+class EquipmentFilter(django_filters.FilterSet):
+    """ Prices are given in gold and compared with indexed cost in copper """
+    name = django_filters.CharFilter(
+        field_name='name', lookup_expr='icontains',
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'название'}),
+    )
+    min_price = django_filters.NumberFilter(
+        method='filter_price', min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'от, ЗМ', 'step': 'any'}),
+    )
+    max_price = django_filters.NumberFilter(
+        method='filter_price', min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'до, ЗМ', 'step': 'any'}),
+    )
+    order = django_filters.ChoiceFilter(
+        choices=PRICE_ORDERING, method='filter_order', empty_label='порядок',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+
+    def filter_price(self, queryset, name, value):
+        copper = int(value * Coins.RATES['gold'])
+        return queryset.price_between(**{'minimum' if name == 'min_price' else 'maximum': copper})
+
+    def filter_order(self, queryset, name, value):
+        if value == 'name':
+            return queryset.order_by('name')
+
+        return queryset.by_price(descending=value.startswith('-'))
+
+
+class WeaponFilter(EquipmentFilter):
+    """ Damage is ordered by average of damage dice, computed in database """
+    order = django_filters.ChoiceFilter(
+        choices=PRICE_ORDERING + DAMAGE_ORDERING, method='filter_order', empty_label='порядок',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+
+    def filter_order(self, queryset, name, value):
+        if value.endswith('damage'):
+            average = models.F('dmg_dice__average')
+            return queryset.order_by(average.desc() if value.startswith('-') else average.asc(), 'name')
+
+        return super().filter_order(queryset, name, value)
\ No newline at end of file
@@ -1,10 +1,11 @@
 from django import forms
 
+from . import dnd
 from .models import (
-    Character, CharacterAbilities, CharacterBackground, CharacterSkill,
-    CharacterToolProficiency, Class, Feature, Language, Maneuver, Subclass, Tool, Spell
+    SIZE_CHOICES, Character, CharacterAbilities, CharacterBackground, CharacterSkill, CharacterToolProficiency, Class,
+    Feature, Language, Maneuver, MonsterType, Party, RuleBook, Subclass, Tool
 )
-from .widgets import AbilityListBoxSelect
+from .widgets import AbilityListBoxSelect, AutocompleteSelect, AutocompleteSelectMultiple
 
 
 class CharacterForm(forms.ModelForm):
@@ -42,6 +43,12 @@ class CharStatsForm(forms.ModelForm):
 CharacterStatsFormset = forms.modelformset_factory(CharacterAbilities, extra=0, form=CharStatsForm)
 
 
+class CharacterArmorClassForm(forms.ModelForm):
+    class Meta:
+        model = Character
+        fields = ['armor_class']
+
+
 class CharacterBackgroundForm(forms.ModelForm):
     class Meta:
         model = CharacterBackground
@@ -86,15 +93,19 @@ class AddCharSkillProficiency(forms.Form):
 
 
 class AddCharLanguageFromBackground(forms.Form):
-    langs = forms.ModelMultipleChoiceField(queryset=Language.objects.none())
+    langs = forms.ModelMultipleChoiceField(
+        queryset=Language.objects.none(), widget=AutocompleteSelectMultiple('language')
+    )
 
-    def __init__(self, *args, queryset, limit, **kwargs):
+    def __init__(self, *args, queryset, limit, character, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.langs_limit = limit
 
         self.fields['langs'].queryset = queryset
-        self.fields['langs'].widget.attrs = {'class': 'selectpicker', 'data-max-options': limit}
+        self.fields['langs'].widget.attrs.update({
+            'class': 'selectpicker', 'data-max-options': limit, 'data-autocomplete-character': character.id
+        })
 
     def clean_langs(self):
         langs = self.cleaned_data['langs']
@@ -106,15 +117,18 @@ class AddCharLanguageFromBackground(forms.Form):
 
 
 class SelectToolProficiency(forms.Form):
-    tools = forms.ModelMultipleChoiceField(queryset=Tool.objects.none())
+    tools = forms.ModelMultipleChoiceField(queryset=Tool.objects.none(), widget=AutocompleteSelectMultiple('tool'))
 
-    def __init__(self, *args, queryset, limit, **kwargs):
+    def __init__(self, *args, queryset, limit, character, category, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.limit = limit
 
         self.fields['tools'].queryset = queryset
-        self.fields['tools'].widget.attrs = {'class': 'selectpicker', 'data-max-options': limit}
+        self.fields['tools'].widget.attrs.update({
+            'class': 'selectpicker', 'data-max-options': limit, 'data-autocomplete-character': character.id,
+            'data-autocomplete-category': category
+        })
 
     def clean_tools(self):
         tools = self.cleaned_data['tools']
@@ -205,31 +219,36 @@ class RogueCompetenceForm(CompetenceForm):
 
 
 class MasterMindIntrigueSelect(forms.Form):
-    tool = forms.ModelChoiceField(queryset=Tool.objects.none())
-    languages = forms.ModelMultipleChoiceField(queryset=Language.objects.all())
+    tool = forms.ModelChoiceField(queryset=Tool.objects.none(), widget=AutocompleteSelect('tool'))
+    languages = forms.ModelMultipleChoiceField(
+        queryset=Language.objects.all(), widget=AutocompleteSelectMultiple('language')
+    )
 
-    def __init__(self, *args, character, **kwargs):
+    def __init__(self, *args, tools, tool_category, languages, character, **kwargs):
         super().__init__(*args, **kwargs)
 
-        # self.character = character  # MB we don't need this
-
-        self.fields['tool'].queryset = Tool.objects.filter(category=Tool.CAT_GAMBLE).exclude(
-            id__in=character.tools_proficiency.values_list('tool_id')
-        )
-        self.fields['tool'].widget.attrs = {'class': 'selectpicker'}
+        self.fields['tool'].queryset = tools
+        self.fields['tool'].widget.attrs.update({
+            'class': 'selectpicker', 'data-autocomplete-character': character.id,
+            'data-autocomplete-category': tool_category
+        })
 
-        self.fields['languages'].widget.attrs = {'class': 'selectpicker'}
-        self.fields['languages'].queryset = Language.objects.exclude(id__in=character.languages.values_list('id'))
+        self.fields['languages'].widget.attrs.update({
+            'class': 'selectpicker', 'data-autocomplete-character': character.id
+        })
+        self.fields['languages'].queryset = languages
 
 
 class ManeuversSelectForm(forms.Form):
-    maneuvers = forms.ModelMultipleChoiceField(queryset=Maneuver.objects.all())
+    maneuvers = forms.ModelMultipleChoiceField(
+        queryset=Maneuver.objects.all(), widget=AutocompleteSelectMultiple('maneuver')
+    )
 
     def __init__(self, *args, limit, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.limit = limit
-        self.fields['maneuvers'].widget.attrs = {'class': 'selectpicker', 'data-max-options': limit}
+        self.fields['maneuvers'].widget.attrs.update({'class': 'selectpicker', 'data-max-options': limit})
 
     def clean_maneuvers(self):
         if self.cleaned_data['maneuvers'].count() != self.limit:
@@ -240,8 +259,12 @@ class ManeuversSelectForm(forms.Form):
 
 class ManeuversUpgradeForm(forms.Form):
     replace_src = forms.ModelChoiceField(required=False, queryset=Maneuver.objects.none())
-    replace_dst = forms.ModelChoiceField(required=False, queryset=Maneuver.objects.none())
-    append = forms.ModelMultipleChoiceField(queryset=Maneuver.objects.none())
+    replace_dst = forms.ModelChoiceField(
+        required=False, queryset=Maneuver.objects.none(), widget=AutocompleteSelect('maneuver')
+    )
+    append = forms.ModelMultipleChoiceField(
+        queryset=Maneuver.objects.none(), widget=AutocompleteSelectMultiple('maneuver')
+    )
 
     def __init__(self, *args, character, limit, **kwargs):
         super().__init__(*args, **kwargs)
@@ -256,10 +279,14 @@ class ManeuversUpgradeForm(forms.Form):
         self.fields['replace_src'].widget.attrs = {'class': 'selecticker'}
 
         self.fields['replace_dst'].queryset = unknown_maneuvers
-        self.fields['replace_dst'].widget.attrs = {'class': 'selectpcker'}
+        self.fields['replace_dst'].widget.attrs.update({
+            'class': 'selectpcker', 'data-autocomplete-character': character.id
+        })
 
         self.fields['append'].queryset = unknown_maneuvers
-        self.fields['append'].widget.attrs = {'class': 'selectpicker', 'data-max-options': limit}
+        self.fields['append'].widget.attrs.update({
+            'class': 'selectpicker', 'data-max-options': limit, 'data-autocomplete-character': character.id
+        })
 
     def clean(self):
         src = self.cleaned_data.get('replace_src')
@@ -288,80 +315,127 @@ class ManeuversUpgradeForm(forms.Form):
         return append
 
 
+class IndexedSpellsField(forms.TypedMultipleChoiceField):
+    """ Spells offered by ids from spell index, rendered and validated without queries """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, coerce=int, **kwargs)
+        self.index = None
+
+    def set_spells(self, index, spell_ids):
+        self.index = index
+        self.choices = [(spell_id, index.label(spell_id)) for spell_id in spell_ids]
+
+    def clean(self, value):
+        return [self.index.spell(spell_id) for spell_id in super().clean(value)]
+
+
 class ReplaceKnownSpellsForm(forms.Form):
-    to_replace = forms.ModelMultipleChoiceField(queryset=Spell.objects.none())
-    by_replace = forms.ModelMultipleChoiceField(queryset=Spell.objects.none())
+    to_replace = IndexedSpellsField()
+    by_replace = IndexedSpellsField()
 
-    def __init__(self, *args, character, spellcasting, **kwargs):
+    def __init__(self, *args, index, known, available, spellcasting, **kwargs):
         super().__init__(*args, **kwargs)
 
-        current = character.known_spells.exclude(level=0)
-
         self.max_replaces = spellcasting['replace']['count']
 
-        self.fields['to_replace'].queryset = current
-        # TODO FOR CHARACTER
-        self.fields['by_replace'].queryset = Spell.objects.exclude(level=0).exclude(id__in=current)
+        self.fields['to_replace'].set_spells(index, known)
+        self.fields['by_replace'].set_spells(index, available)
 
     def clean_to_replace(self):
-        if self.cleaned_data['to_replace'].count() != self.max_replaces:
+        spells = self.cleaned_data['to_replace']
+        if len(spells) != self.max_replaces:
             raise forms.ValidationError(f'Необходимо выбрать ровно {self.max_replaces} заклинаний')
 
-        return self.cleaned_data['to_replace']
+        return spells
 
     def clean_by_replace(self):
-        if self.cleaned_data['by_replace'].count() != self.max_replaces:
+        spells = self.cleaned_data['by_replace']
+        if len(spells) != self.max_replaces:
             raise forms.ValidationError(f'Необходимо выбрать ровно {self.max_replaces} заклинаний')
 
-        return self.cleaned_data['by_replace']
+        return spells
 
 
 class KnownSpellsForm(forms.Form):
-    known_cantrips = forms.ModelMultipleChoiceField(queryset=Spell.objects.none())
-    known_spells = forms.ModelMultipleChoiceField(queryset=Spell.objects.none())
+    known_cantrips = IndexedSpellsField()
+    known_spells = IndexedSpellsField()
 
-    def __init__(self, *args, character, spellcasting, queryset, **kwargs):
+    def __init__(self, *args, index, cantrips, spells, spellcasting, **kwargs):
         super().__init__(*args, **kwargs)
-        self.character = character
 
         self.max_cantrips = spellcasting['cantrips']
         self.max_spells = spellcasting['spells']
 
-        self.fields['known_cantrips'].queryset = queryset.filter(level=0)
-        self.fields['known_spells'].queryset = queryset.filter(level__gt=0, level__lte=len(spellcasting['slots']))
+        self.fields['known_cantrips'].set_spells(index, cantrips)
+        self.fields['known_spells'].set_spells(index, spells)
 
     def clean_known_cantrips(self):
-        known = self.cleaned_data['known_cantrips']
-        if known.count() != self.max_cantrips:
+        spells = self.cleaned_data['known_cantrips']
+        if len(spells) != self.max_cantrips:
             raise forms.ValidationError(f'Необходимо выбрать ровно {self.max_cantrips} заговора')
 
-        return known
+        return spells
 
     def clean_known_spells(self):
-        known = self.cleaned_data['known_spells']
-        if known.count() != self.max_spells:
+        spells = self.cleaned_data['known_spells']
+        if len(spells) != self.max_spells:
             raise forms.ValidationError(f'Необходимо выбрать ровно {self.max_spells} заклинания')
 
-        return known
+        return spells
 
     def clean(self):
-        print(self.cleaned_data)
-        self.cleaned_data['spells'] = self.cleaned_data['known_cantrips'].order_by().union(
-            self.cleaned_data['known_spells'].order_by()
-        )
+        cleaned_data = super().clean()
+        cleaned_data['spells'] = cleaned_data.get('known_cantrips', []) + cleaned_data.get('known_spells', [])
+
+        return cleaned_data
 
 
 class AddKnownSpellsForm(forms.Form):
-    spells = forms.ModelMultipleChoiceField(queryset=Spell.objects.none())
+    spells = IndexedSpellsField()
 
-    def __init__(self, *args, queryset, limit, **kwargs):
+    def __init__(self, *args, index, spells, limit, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['spells'].queryset = queryset
+        self.fields['spells'].set_spells(index, spells)
         self.limit = limit
 
     def clean_spells(self):
         spells = self.cleaned_data['spells']
-        if spells.count() != self.limit:
+        if len(spells) != self.limit:
             raise forms.ValidationError(f'Необходимо выбрать ровно {self.limit} заклинаний')
 
-        return spells
\ No newline at end of file
+        return spells
+
+
+class EncounterGeneratorForm(forms.Form):
+    party = forms.ModelChoiceField(
+        label='Отряд', queryset=Party.objects.none(), empty_label=None,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    difficulty = forms.TypedChoiceField(
+        label='Сложность', coerce=int, initial=1, choices=tuple(enumerate(dnd.ENCOUNTER_DIFFICULTY)),
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    mtype = forms.ModelMultipleChoiceField(
+        label='Тип', queryset=MonsterType.objects.all(), required=False,
+        widget=forms.SelectMultiple(attrs={'class': 'selectpicker', 'title': 'тип монстра'})
+    )
+    size = forms.MultipleChoiceField(
+        label='Размер', choices=SIZE_CHOICES, required=False,
+        widget=forms.SelectMultiple(attrs={'class': 'selectpicker', 'title': 'размер'})
+    )
+    source = forms.ModelMultipleChoiceField(
+        label='Источник', queryset=RuleBook.objects.all(), required=False,
+        widget=forms.SelectMultiple(attrs={'class': 'selectpicker', 'title': 'источник'})
+    )
+
+    def __init__(self, *args, adventure, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['party'].queryset = adventure.parties.all()
+
+    def facet_selection(self):
+        """ Monster filters in facets.FACETS format """
+        return {
+            'mtype': [obj.id for obj in self.cleaned_data['mtype']], 'size': self.cleaned_data['size'],
+            'source': [obj.id for obj in self.cleaned_data['source']],
+        }
\ No newline at end of file
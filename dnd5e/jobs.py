@@ -0,0 +1,118 @@
+import importlib
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from dnd5e.models import Job
+
+logger = logging.getLogger(__name__)
+
+RETRY_DELAY = 10  # Seconds, doubled on every next attempt
+STALE_TIMEOUT = 60 * 30  # Running jobs of dead workers are requeued after this many seconds
+CLAIM_BATCH = 10
+
+TASKS = {}
+TASK_MODULES = ('dnd5e.tasks', )
+
+
+def task(name, queue=Job.QUEUE_INTERACTIVE, max_attempts=3):
+    """ Register function as background task. Function gets JobContext as first argument """
+    def decorator(func):
+        TASKS[name] = (func, queue, max_attempts)
+        return func
+
+    return decorator
+
+
+def get_task(name):
+    if not TASKS:
+        for module in TASK_MODULES:
+            importlib.import_module(module)
+
+    return TASKS[name]
+
+
+def enqueue(name, owner=None, **kwargs):
+    _, queue, max_attempts = get_task(name)
+    job = Job.objects.create(name=name, kwargs=kwargs, queue=queue, max_attempts=max_attempts, owner=owner)
+
+    if getattr(settings, 'JOBS_RUN_INLINE', False):
+        transaction.on_commit(lambda: run_inline(job.id))
+
+    return job
+
+
+class JobContext:
+    def __init__(self, job):
+        self.job = job
+
+    def set_progress(self, done, total=None):
+        fields = {'progress': done}
+        if total is not None:
+            fields['progress_total'] = total
+
+        Job.objects.filter(id=self.job.id).update(**fields)
+
+
+def claim(queues, worker):
+    """ Take next due job from queues. Status update is conditional, so concurrent workers never share a job """
+    now = timezone.now()
+    candidates = Job.objects.filter(
+        status=Job.STATUS_QUEUED, queue__in=queues, run_after__lte=now
+    ).order_by('run_after', 'id').values_list('id', flat=True)[:CLAIM_BATCH]
+
+    for job_id in candidates:
+        claimed = Job.objects.filter(id=job_id, status=Job.STATUS_QUEUED).update(
+            status=Job.STATUS_RUNNING, worker=worker, started=now, attempts=models.F('attempts') + 1
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+
+
+def run(job):
+    func, _, _ = get_task(job.name)
+
+    try:
+        result = func(JobContext(job), **job.kwargs)
+    except Exception:
+        logger.exception('Job %s failed', job)
+        _fail(job, traceback.format_exc())
+        return
+
+    Job.objects.filter(id=job.id).update(status=Job.STATUS_DONE, result=result, finished=timezone.now(), error='')
+
+
+def run_inline(job_id):
+    """ Run job in current process right away, for setups without run_jobs workers """
+    claimed = Job.objects.filter(id=job_id, status=Job.STATUS_QUEUED).update(
+        status=Job.STATUS_RUNNING, worker='inline', started=timezone.now(), attempts=models.F('attempts') + 1
+    )
+    if claimed:
+        run(Job.objects.get(id=job_id))
+
+
+def _fail(job, error):
+    if job.attempts < job.max_attempts:
+        delay = RETRY_DELAY * 2 ** (job.attempts - 1)
+        Job.objects.filter(id=job.id).update(
+            status=Job.STATUS_QUEUED, error=error, run_after=timezone.now() + timedelta(seconds=delay)
+        )
+    else:
+        Job.objects.filter(id=job.id).update(status=Job.STATUS_FAILED, error=error, finished=timezone.now())
+
+
+def requeue_stale(timeout=STALE_TIMEOUT):
+    """ Requeue running jobs of dead workers, jobs without attempts left are failed """
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.STATUS_RUNNING, started__lt=now - timedelta(seconds=timeout))
+
+    failed = stale.filter(attempts__gte=models.F('max_attempts')).update(
+        status=Job.STATUS_FAILED, error='Worker died while running the job', finished=now
+    )
+    requeued = stale.update(status=Job.STATUS_QUEUED, run_after=now)
+
+    return requeued + failed
\ No newline at end of file
@@ -0,0 +1,163 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+CACHE_PREFIX = 'dnd5e:knowledge'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+# Deleting these models drops knowledge links without m2m_changed signal
+INDEX_MODELS = ('Knowledge', 'Stage', 'NPC', 'AdventureMonster')
+
+
+def _index_key(adventure_id):
+    return f'{CACHE_PREFIX}:index:{adventure_id}'
+
+
+def _party_key(party_id):
+    return f'{CACHE_PREFIX}:party:{party_id}'
+
+
+def _group(pairs):
+    groups = defaultdict(set)
+    for obj_id, knowledge_id in pairs:
+        groups[obj_id].add(knowledge_id)
+
+    return {obj_id: frozenset(ids) for obj_id, ids in groups.items()}
+
+
+class KnowledgeIndex:
+    """ Knowledge ids of adventure grouped by stage, NPC and monster """
+
+    def __init__(self, ids, by_stage, by_npc, by_monster):
+        self.ids = ids
+        self.by_stage = by_stage
+        self.by_npc = by_npc
+        self.by_monster = by_monster
+
+    @classmethod
+    def build(cls, adventure_id):
+        from dnd5e.models import NPC, AdventureMonster, Knowledge, Stage
+
+        return cls(
+            frozenset(Knowledge.objects.filter(adventure_id=adventure_id).values_list('id', flat=True)),
+            _group(Stage.knowledges.through.objects.filter(stage__adventure_id=adventure_id).values_list(
+                'stage_id', 'knowledge_id'
+            )),
+            _group(NPC.knows.through.objects.filter(npc__adventure_id=adventure_id).values_list(
+                'npc_id', 'knowledge_id'
+            )),
+            _group(AdventureMonster.knowledges.through.objects.filter(
+                adventuremonster__adventure_id=adventure_id
+            ).values_list('adventuremonster_id', 'knowledge_id')),
+        )
+
+    def lookup(self, stage=None, npc=None, monster=None):
+        """ Knowledge ids linked to all of given objects, or all adventure knowledges """
+        ids = self.ids
+        for groups, obj_id in ((self.by_stage, stage), (self.by_npc, npc), (self.by_monster, monster)):
+            if obj_id is not None:
+                ids = ids & groups.get(obj_id, frozenset())
+
+        return ids
+
+
+def get_index(adventure_id):
+    key = _index_key(adventure_id)
+    index = cache.get(key)
+
+    if index is None:
+        index = KnowledgeIndex.build(adventure_id)
+        cache.set(key, index, CACHE_TIMEOUT)
+
+    return index
+
+
+def invalidate_index(adventure_id):
+    key = _index_key(adventure_id)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def revealed(party_ids):
+    """ Set of knowledge ids revealed to every party, cached per party """
+    from dnd5e.models import PartyKnowledge
+
+    party_ids = list(party_ids)
+    cached = cache.get_many([_party_key(party_id) for party_id in party_ids])
+    result = {party_id: cached[_party_key(party_id)] for party_id in party_ids if _party_key(party_id) in cached}
+
+    missing = [party_id for party_id in party_ids if party_id not in result]
+    if missing:
+        built = _group(PartyKnowledge.objects.filter(party_id__in=missing).values_list('party_id', 'knowledge_id'))
+        built = {party_id: built.get(party_id, frozenset()) for party_id in missing}
+        cache.set_many({_party_key(party_id): ids for party_id, ids in built.items()}, CACHE_TIMEOUT)
+        result.update(built)
+
+    return result
+
+
+def visible(party, stage=None, npc=None, monster=None):
+    """ Knowledge ids party knows, optionally only ones linked to stage, NPC or monster """
+    return get_index(party.adventure_id).lookup(stage, npc, monster) & revealed([party.id])[party.id]
+
+
+def reveal(party, knowledge_ids, user=None, hide=False):
+    """ Reveal (or hide back) many knowledges to party at once, returns ids actually changed """
+    from dnd5e import sync
+    from dnd5e.models import Knowledge, KnowledgeReveal, PartyKnowledge
+
+    knowledge_ids = set(knowledge_ids)
+    unknown = knowledge_ids - set(Knowledge.objects.filter(
+        adventure_id=party.adventure_id, id__in=knowledge_ids
+    ).values_list('id', flat=True))
+    if unknown:
+        raise ValidationError(f'Unknown knowledges: {", ".join(str(obj_id) for obj_id in sorted(unknown))}')
+
+    with transaction.atomic():
+        current = set(PartyKnowledge.objects.select_for_update().filter(
+            party=party, knowledge_id__in=knowledge_ids
+        ).values_list('knowledge_id', flat=True))
+        changed = sorted(current if hide else knowledge_ids - current)
+        if not changed:
+            return []
+
+        if hide:
+            PartyKnowledge.objects.filter(party=party, knowledge_id__in=changed).delete()
+        else:
+            PartyKnowledge.objects.bulk_create(
+                [PartyKnowledge(party=party, knowledge_id=obj_id) for obj_id in changed], ignore_conflicts=True
+            )
+
+        KnowledgeReveal.objects.bulk_create(
+            [KnowledgeReveal(party=party, knowledge_id=obj_id, revealed=not hide, user=user) for obj_id in changed]
+        )
+
+        # Knowledge.known stays as "known to any party" flag, it's what sync clients see
+        knowledges = Knowledge.objects.filter(id__in=changed)
+        if hide:
+            knowledges = knowledges.exclude(id__in=PartyKnowledge.objects.values('knowledge_id'))
+        knowledges = list(knowledges.exclude(known=not hide))
+
+        if knowledges:
+            for obj in knowledges:
+                obj.known = not hide
+            Knowledge.objects.bulk_update(knowledges, ['known'])
+            sync.record(party.adventure_id, 'knowledge', knowledges, ['known'])
+
+        key = _party_key(party.id)
+        transaction.on_commit(lambda: cache.delete(key))
+
+    return changed
+
+
+def with_parties(knowledges, parties):
+    """ Mark knowledge objects with parties that know them """
+    knowledges = list(knowledges)
+    parties = list(parties)
+    sets = revealed(party.id for party in parties)
+
+    for obj in knowledges:
+        obj.revealed_to = [party for party in parties if obj.id in sets[party.id]]
+
+    return knowledges
\ No newline at end of file
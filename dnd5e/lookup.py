@@ -0,0 +1,231 @@
+import bisect
+import heapq
+import re
+import time
+from collections import Counter, defaultdict
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import transaction
+
+CACHE_PREFIX = 'dnd5e:lookup:version'
+
+# Indexed name fields of every model, NPC names are indexed per adventure
+LOOKUP_FIELDS = {
+    'spell': ('name', 'orig_name'),
+    'monster': ('name', 'orig_name'),
+    'feature': ('name', ),
+    'item': ('name', 'orig_name'),
+    'tool': ('name', ),
+    'maneuver': ('name', ),
+    'npc': ('name', 'aka'),
+    'language': ('name', ),
+}
+SCOPE_FIELDS = {'npc': 'adventure_id'}
+
+MIN_SCORE = 0.3
+WORD_WEIGHT = 0.8  # Query matching a part of long name scores lower than whole name match
+
+TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'i',
+    'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f',
+    'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+})
+# Latin spellings of the same sounds, so "ognenniy" and "ognennyi" give the same trigrams
+LATIN_VARIANTS = (('kh', 'h'), ('yo', 'e'), ('iy', 'i'), ('yi', 'i'), ('y', 'i'), ('w', 'v'), ('x', 'ks'), ('c', 'k'))
+
+WORD_RE = re.compile(r'\w+')
+
+_INDEXES = {}
+
+
+def normalize(name):
+    """ Lowercased latin transliteration, both russian names and translit typed by players end up in it """
+    name = name.lower().translate(TRANSLIT)
+    for src, dst in LATIN_VARIANTS:
+        name = name.replace(src, dst)
+
+    return ' '.join(WORD_RE.findall(name))
+
+
+def trigrams(name):
+    result = set()
+    for word in name.split():
+        word = f'  {word} '
+        result.update(word[num:num + 3] for num in range(len(word) - 2))
+
+    return result
+
+
+class NameIndex:
+    """ Trigram postings and sorted words of normalized names of one model (and scope), updated in place on changes """
+
+    def __init__(self, version=None):
+        self.version = version
+        self.labels = {}  # {object id: display name}
+        self.names = {}  # {object id: [normalized names]}
+        self.words = []  # Sorted [(word, object id)] for prefix search
+        self.sizes = {}  # {(object id, name number): number of trigrams}
+        self.postings = defaultdict(set)  # {trigram: {(object id, name number)}}
+
+    @classmethod
+    def build(cls, kind, scope=None, version=None):
+        index = cls(version)
+        queryset = apps.get_model('dnd5e', kind).objects.all()
+        if kind in SCOPE_FIELDS:
+            queryset = queryset.filter(**{SCOPE_FIELDS[kind]: scope})
+
+        for obj_id, *names in queryset.order_by().values_list('id', *LOOKUP_FIELDS[kind]):
+            index.add(obj_id, names)
+
+        return index
+
+    def add(self, obj_id, names):
+        self.remove(obj_id)
+        names = [name for name in names if name]
+        if not names:
+            return
+
+        self.labels[obj_id] = f'{names[0]} ({names[1]})' if len(names) > 1 else names[0]
+        self.names[obj_id] = [normalize(name) for name in names]
+
+        for word in {word for name in self.names[obj_id] for word in name.split()}:
+            bisect.insort(self.words, (word, obj_id))
+
+        for num, name in enumerate(self.names[obj_id]):
+            grams = trigrams(name)
+            self.sizes[(obj_id, num)] = len(grams)
+            for gram in grams:
+                self.postings[gram].add((obj_id, num))
+
+    def remove(self, obj_id):
+        self.labels.pop(obj_id, None)
+        names = self.names.pop(obj_id, ())
+
+        for word in {word for name in names for word in name.split()}:
+            del self.words[bisect.bisect_left(self.words, (word, obj_id))]
+
+        for num, name in enumerate(names):
+            del self.sizes[(obj_id, num)]
+            for gram in trigrams(name):
+                self.postings[gram].discard((obj_id, num))
+
+    def search(self, query, limit=10, min_score=MIN_SCORE):
+        """ Best matching objects as [(score, object id)], score is trigram similarity from 0 to 1 """
+        grams = trigrams(normalize(query))
+        if not grams:
+            return []
+
+        shared = Counter(key for gram in grams for key in self.postings.get(gram, ()))
+
+        scores = {}
+        for (obj_id, num), count in shared.items():
+            similarity = count / (len(grams) + self.sizes[(obj_id, num)] - count)
+            score = max(similarity, WORD_WEIGHT * count / len(grams))
+            if score >= min_score and score > scores.get(obj_id, 0):
+                scores[obj_id] = score
+
+        return heapq.nlargest(limit, ((round(score, 3), obj_id) for obj_id, score in scores.items()))
+
+    def _prefixed(self, prefix):
+        ids = set()
+        for word, obj_id in self.words[bisect.bisect_left(self.words, (prefix, )):]:
+            if not word.startswith(prefix):
+                break
+            ids.add(obj_id)
+
+        return ids
+
+    def complete(self, query, limit=20, exclude=(), only=None):
+        """ Objects having words starting with every query word as [(object id, display name)], ordered by name """
+        words = normalize(query).split()
+        ids = set(self.labels) if not words else set.intersection(*(self._prefixed(word) for word in words))
+        if only is not None:
+            ids &= set(only)
+
+        return heapq.nsmallest(
+            limit, ((obj_id, self.labels[obj_id]) for obj_id in ids - set(exclude)), key=lambda item: item[1]
+        )
+
+
+def _version_key(kind, scope):
+    return f'{CACHE_PREFIX}:{kind}:{scope}'
+
+
+def get_index(kind, scope=None):
+    """ Process local index, rebuilt when other process changed indexed names """
+    version = cache.get(_version_key(kind, scope), 0)
+    index = _INDEXES.get((kind, scope))
+
+    if index is None or index.version != version:
+        index = _INDEXES[(kind, scope)] = NameIndex.build(kind, scope, version)
+
+    return index
+
+
+def search(kind, query, limit=10, scope=None):
+    return get_index(kind, scope).search(query, limit)
+
+
+def matching(kind, query, limit=10, scope=None):
+    """ Ids of objects having query in name, or fuzzy matching it """
+    index = get_index(kind, scope)
+    query = query.lower()
+
+    ids = {obj_id for obj_id, label in index.labels.items() if query in label.lower()}
+    ids.update(obj_id for _, obj_id in index.search(query, limit))
+
+    return ids
+
+
+def complete(kind, query, limit=20, scope=None, exclude=(), only=None):
+    return get_index(kind, scope).complete(query, limit, exclude, only)
+
+
+def search_objects(kinds, query, limit=10, scope=None):
+    """ Best matches among several models as [(score, object)], objects loaded with a query per model """
+    found = heapq.nlargest(limit, (
+        (score, kind, obj_id) for kind in kinds for score, obj_id in search(kind, query, limit, scope)
+    ))
+
+    objects = {}
+    for kind in {kind for _, kind, _ in found}:
+        model = apps.get_model('dnd5e', kind)
+        ids = [obj_id for _, obj_kind, obj_id in found if obj_kind == kind]
+        objects.update({(kind, obj.id): obj for obj in model.objects.filter(id__in=ids)})
+
+    return [(score, objects[(kind, obj_id)]) for score, kind, obj_id in found if (kind, obj_id) in objects]
+
+
+def _bump(kind, scope):
+    key = _version_key(kind, scope)
+    # Counter evicted from cache starts over from current time, never from a version some process may still hold
+    cache.add(key, time.time_ns() // 1000, None)
+
+    return cache.incr(key)
+
+
+def _apply(kind, scope, obj_id, names):
+    version = _bump(kind, scope)
+
+    index = _INDEXES.get((kind, scope))
+    if index is not None and index.version == version - 1:
+        # No other process changed names meanwhile, local index is kept up to date without rebuild
+        if names is None:
+            index.remove(obj_id)
+        else:
+            index.add(obj_id, names)
+        index.version = version
+
+
+def update(instance, deleted=False):
+    kind, obj_id = instance._meta.model_name, instance.id
+    scope = getattr(instance, SCOPE_FIELDS[kind]) if kind in SCOPE_FIELDS else None
+    names = None if deleted else [getattr(instance, field) for field in LOOKUP_FIELDS[kind]]
+
+    transaction.on_commit(lambda: _apply(kind, scope, obj_id, names))
+
+
+def invalidate(kind, scope=None):
+    """ Rebuild index in every process, e.g. after bulk changes which don't send signals """
+    transaction.on_commit(lambda: _bump(kind, scope))
\ No newline at end of file
@@ -0,0 +1,165 @@
+import random
+from collections import Counter, defaultdict, namedtuple
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import models, transaction
+
+from dnd5e.model_fields import Coins, Dice
+from dnd5e.models import Item, MoneyAmount, Quest, Treasure, Zone
+
+LootLine = namedtuple('LootLine', ['treasure', 'value'])
+
+Hoard = namedtuple('Hoard', ['coins', 'items', 'rarities'])
+
+# Treasure hoard tables by challenge rating tier: coins as (dice, multiplier), number of items and their rarity
+HOARD_TABLES = {
+    0: Hoard({'copper': ('6d6', 100), 'silver': ('3d6', 100), 'gold': ('2d6', 10)}, '1d4 - 1', (1, 2)),
+    1: Hoard(
+        {'copper': ('2d6', 100), 'silver': ('2d6', 1000), 'gold': ('6d6', 100), 'platinum': ('3d6', 10)},
+        '1d4', (1, 2, 3)
+    ),
+    2: Hoard({'gold': ('4d6', 1000), 'platinum': ('5d6', 100)}, '1d4', (2, 3, 4)),
+    3: Hoard({'gold': ('12d6', 1000), 'platinum': ('8d6', 1000)}, '1d6', (3, 4, 5)),
+}
+
+
+def challenge_tier(challenge):
+    if challenge <= 4:
+        return 0
+    if challenge <= 10:
+        return 1
+    if challenge <= 16:
+        return 2
+    return 3
+
+
+class Loot:
+    """ Treasures of one source with money and total value """
+
+    def __init__(self):
+        self.lines = []
+        self.coins = Coins()
+        self.value = Coins()
+        self.unvalued = 0  # Treasures without known cost
+
+    def add(self, treasure):
+        obj = treasure.what
+
+        if obj is None:
+            value = None
+        elif treasure.is_money:
+            value = obj.amount * treasure.quantity
+            self.coins += value
+        else:
+            cost = getattr(obj, 'cost', None)
+            value = cost * treasure.quantity if cost else None
+
+        if value is None:
+            self.unvalued += 1
+        else:
+            self.value += value
+
+        self.lines.append(LootLine(treasure, value))
+
+    def __add__(self, other):
+        total = Loot()
+        total.lines = self.lines + other.lines
+        total.coins = self.coins + other.coins
+        total.value = self.value + other.value
+        total.unvalued = self.unvalued + other.unvalued
+
+        return total
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def as_dict(self):
+        return {
+            'treasures': [
+                {'id': line.treasure.id, 'name': str(line.treasure), 'value': line.value and line.value.in_copper}
+                for line in self.lines
+            ],
+            'coins': self.coins.in_copper,
+            'value': self.value.in_copper,
+            'unvalued': self.unvalued,
+        }
+
+
+def _collect(links, source):
+    """ Group treasures by source, generic relations resolved with one query per content type """
+    links = list(links.select_related('treasure').order_by(source, 'treasure_id'))
+    models.prefetch_related_objects([link.treasure for link in links], 'what')
+
+    loot = defaultdict(Loot)
+    for link in links:
+        loot[getattr(link, source)].add(link.treasure)
+
+    return loot
+
+
+def for_zones(zone_ids):
+    return _collect(Zone.treasures.through.objects.filter(zone_id__in=zone_ids), 'zone_id')
+
+
+def for_quests(quest_ids):
+    return _collect(Quest.reward.through.objects.filter(quest_id__in=quest_ids), 'quest_id')
+
+
+def for_places(place_ids):
+    return _collect(
+        Zone.treasures.through.objects.filter(zone__place_id__in=place_ids).annotate(
+            place_id=models.F('zone__place_id')
+        ),
+        'place_id'
+    )
+
+
+def for_stages(stage_ids):
+    return _collect(
+        Zone.treasures.through.objects.filter(zone__place__stage_id__in=stage_ids).annotate(
+            stage_id=models.F('zone__place__stage_id')
+        ),
+        'stage_id'
+    )
+
+
+def roll_coins(tier, rng=random):
+    return Coins(**{
+        name: Dice(dice).roll(rng) * multiplier for name, (dice, multiplier) in HOARD_TABLES[tier].coins.items()
+    })
+
+
+def generate_hoards(zones, tier, adventure=None, rng=random):
+    """ Roll hoard for every zone and store all treasures with a few bulk queries """
+    table = HOARD_TABLES[tier]
+    items = Item.objects.filter(rarity__in=table.rarities).filter(
+        models.Q(adventure__isnull=True) | models.Q(adventure=adventure)
+    )
+    item_ids = list(items.values_list('id', flat=True))
+    money_ct = ContentType.objects.get_for_model(MoneyAmount)
+    item_ct = ContentType.objects.get_for_model(Item)
+
+    with transaction.atomic():
+        amounts = MoneyAmount.objects.bulk_create([MoneyAmount(amount=roll_coins(tier, rng)) for _ in zones])
+
+        hoards = []
+        for zone, amount in zip(zones, amounts):
+            treasures = [Treasure(what_ct=money_ct, what_id=amount.id)]
+            if item_ids:
+                count = max(Dice(table.items).roll(rng), 0)
+                treasures.extend(
+                    Treasure(what_ct=item_ct, what_id=item_id, quantity=quantity)
+                    for item_id, quantity in Counter(rng.choices(item_ids, k=count)).items()
+                )
+            hoards.append((zone, treasures))
+
+        Treasure.objects.bulk_create([treasure for _, treasures in hoards for treasure in treasures])
+        Zone.treasures.through.objects.bulk_create([
+            Zone.treasures.through(zone_id=zone.id, treasure_id=treasure.id)
+            for zone, treasures in hoards for treasure in treasures
+        ])
+
+    return {zone.id: treasures for zone, treasures in hoards}
\ No newline at end of file
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from dnd5e.model_fields import Dice
+from dnd5e.models import Monster
+
+
+class Command(BaseCommand):
+    help = 'List monsters with hit points not equal to average of their hit dice'
+
+    def handle(self, *args, **options):
+        monsters = Monster.objects.wrong_hit_points().values_list('name', 'hit_points', 'hit_dice')
+
+        for name, hit_points, hit_dice in monsters:
+            self.stdout.write(f'{name}: {hit_points} ({Dice.unpack(hit_dice)})')
+
+        self.stdout.write(f'{len(monsters)} monsters with wrong hit points')
\ No newline at end of file
@@ -0,0 +1,33 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dnd5e import loot
+from dnd5e.models import Zone
+
+
+class Command(BaseCommand):
+    help = 'Roll random treasure hoards for zones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('zones', type=int, nargs='+', help='Zone ids')
+        parser.add_argument('--tier', type=int, choices=sorted(loot.HOARD_TABLES), help='Hoard table tier')
+        parser.add_argument('--challenge', type=int, help='Pick tier by challenge rating instead')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed to reproduce hoards')
+
+    def handle(self, *args, **options):
+        if options['tier'] is None and options['challenge'] is None:
+            raise CommandError('Either --tier or --challenge is required')
+
+        tier = options['tier'] if options['tier'] is not None else loot.challenge_tier(options['challenge'])
+        zones = list(Zone.objects.filter(id__in=options['zones']).select_related('place__stage'))
+        if len(zones) != len(set(options['zones'])):
+            raise CommandError('Some zones not found')
+
+        adventures = {zone.place.stage.adventure_id for zone in zones}
+        adventure = adventures.pop() if len(adventures) == 1 else None
+
+        hoards = loot.generate_hoards(zones, tier, adventure, random.Random(options['seed']))
+
+        for zone in zones:
+            self.stdout.write(f'{zone}: {", ".join(str(treasure) for treasure in hoards[zone.id])}')
\ No newline at end of file
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand, CommandError
 
+from dnd5e import stats
 from dnd5e.models import Character
 
 CHECK_SYM = '\u2713'
@@ -34,18 +35,22 @@ class Command(BaseCommand):
                 self.stdout.write(str(char_dice), ending=' ')
             self.stdout.write()
 
+        char_stats = stats.for_character(char)
+
         self.stdout.write('\nХарактеристики:')
-        for ability in char.abilities.all():
-            self.stdout.write(f'    {str(ability):18} ->  {ability.mod:+2d} [{ability.value:2d}]')
+        for ability in char_stats.abilities:
+            self.stdout.write(f'    {ability.name:18} ->  {ability.mod:+2d} [{ability.value:2d}]')
 
         self.stdout.write('\nСпасброски:')
-        for ability in char.abilities.all():
+        for ability in char_stats.abilities:
             prof = ability.saving_trow_proficiency
-            self.stdout.write(f' {CHECK_SYM if prof else " "}  {str(ability):18} ->  {ability.saving_trow_mod:+2d}')
+            self.stdout.write(f' {CHECK_SYM if prof else " "}  {ability.name:18} ->  {ability.saving_trow_mod:+2d}')
 
         self.stdout.write('\nНавыки:')
-        for skill in char.skills.all().annotate_mod():
-            self.stdout.write(f' {CHECK_SYM if skill.proficiency else " "}  {str(skill):18} ->  {skill.mod:+2d}')
+        for skill in char_stats.skills:
+            self.stdout.write(f' {CHECK_SYM if skill.proficiency else " "}  {skill.name:18} ->  {skill.mod:+2d}')
+
+        self.stdout.write(f'\nПассивная внимательность: {char_stats.passive("Perception")}')
 
     def handle(self, *args, **options):
         char_id = options['char_id'].pop()
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from dnd5e import maps
+from dnd5e.models import AdventureMap
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnails and deep zoom tiles for adventure maps'
+
+    def add_arguments(self, parser):
+        parser.add_argument('map_ids', nargs='*', type=int, help='Map IDs (all unprocessed maps by default)')
+        parser.add_argument('--force', action='store_true', help='Process maps with up to date tiles too')
+
+    def handle(self, *args, **options):
+        adv_maps = AdventureMap.objects.all()
+        if options['map_ids']:
+            adv_maps = adv_maps.filter(id__in=options['map_ids'])
+
+        for adv_map in adv_maps:
+            if options['force']:
+                AdventureMap.objects.filter(id=adv_map.id).update(tiles_version='')
+            elif adv_map.tiles_version == maps.map_version(adv_map):
+                continue
+
+            maps.process_map(adv_map.id)
+            self.stdout.write(f'{adv_map.id} {adv_map.name}: processed')
\ No newline at end of file
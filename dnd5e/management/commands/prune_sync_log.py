@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from dnd5e import sync
+
+
+class Command(BaseCommand):
+    help = 'Delete old adventure changes. Clients behind pruned changes get full snapshot on next sync'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=sync.RETENTION.days, help='Keep changes for this many days')
+
+    def handle(self, *args, **options):
+        deleted = sync.prune(timedelta(days=options['days']))
+
+        self.stdout.write(f'{deleted} changes deleted')
\ No newline at end of file
@@ -0,0 +1,42 @@
+from django.apps import apps
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+
+from dnd5e import markdown
+
+
+class Command(BaseCommand):
+    help = 'Render markdown descriptions into cache (run after markdown extensions change), cache must be shared'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', help='Model names to render (all by default)')
+        parser.add_argument('--force', action='store_true', help='Re-render already cached descriptions')
+        parser.add_argument('--chunk', type=int, default=500, help='Descriptions rendered per cache round trip')
+
+    def render_model(self, model, force, chunk):
+        texts = model.objects.exclude(description='').values_list('description', flat=True).iterator(chunk_size=chunk)
+
+        rendered = 0
+        batch = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) >= chunk:
+                rendered += markdown.render_many(batch, force=force)
+                batch = []
+        rendered += markdown.render_many(batch, force=force)
+
+        self.stdout.write(f'{model.__name__}: {rendered} rendered')
+
+    def handle(self, *args, **options):
+        backend = caches[DEFAULT_CACHE_ALIAS]
+        if isinstance(backend, (LocMemCache, DummyCache)):
+            raise CommandError(
+                f'{type(backend).__name__} is local to this process, configure shared cache backend in CACHES'
+            )
+
+        dnd5e = apps.get_app_config('dnd5e')
+
+        for model_name in options['models'] or markdown.MARKDOWN_MODELS:
+            self.render_model(dnd5e.get_model(model_name), options['force'], options['chunk'])
\ No newline at end of file
@@ -0,0 +1,58 @@
+import multiprocessing
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from dnd5e import jobs
+from dnd5e.models import Job
+
+
+def work(queues, sleep, once):
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+
+    while True:
+        close_old_connections()
+        job = jobs.claim(queues, worker)
+
+        if job is None:
+            if once:
+                return
+
+            jobs.requeue_stale()
+            time.sleep(sleep)
+            continue
+
+        jobs.run(job)
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queue', action='append', dest='queues', choices=[queue for queue, _ in Job.QUEUE_CHOICES],
+            help='Queue to take jobs from (all queues by default, can be repeated)'
+        )
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker processes')
+        parser.add_argument('--sleep', type=float, default=1, help='Seconds to wait when queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit when there are no due jobs')
+
+    def handle(self, *args, **options):
+        queues = options['queues'] or [queue for queue, _ in Job.QUEUE_CHOICES]
+        work_args = (queues, options['sleep'], options['once'])
+
+        if options['workers'] == 1:
+            work(*work_args)
+            return
+
+        # Forked workers must open their own DB connections
+        connections.close_all()
+
+        processes = [multiprocessing.Process(target=work, args=work_args) for _ in range(options['workers'])]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
\ No newline at end of file
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dnd5e import monster_variants
+from dnd5e.models import Adventure
+
+
+class Command(BaseCommand):
+    help = 'Create adventure only variants of monsters with higher or lower challenge'
+
+    def add_arguments(self, parser):
+        parser.add_argument('monsters', type=int, nargs='+', help='Monster ids')
+        parser.add_argument('--adventure', type=int, required=True, help='Adventure id')
+        parser.add_argument(
+            '--steps', type=int, nargs='+', default=[1], help='Challenge rows to move, negative for weaker variants'
+        )
+
+    def handle(self, *args, **options):
+        adventure = Adventure.objects.filter(id=options['adventure']).first()
+        if adventure is None:
+            raise CommandError('Adventure not found')
+
+        variants = monster_variants.create_variants(options['monsters'], adventure, options['steps'])
+
+        for variant in variants:
+            self.stdout.write(f'{variant}: {variant.hit_points} ({variant.hit_dice}), КБ {variant.armor_class}')
+
+        self.stdout.write(f'{len(variants)} variants created')
\ No newline at end of file
@@ -0,0 +1,205 @@
+import base64
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from dnd5e.models import AdventureMonster, Character, MapSession, MapToken, Stage
+
+# Cache only saves reading state from DB, every delta is written to DB
+CACHE_PREFIX = 'dnd5e:mapsession'
+CACHE_TIMEOUT = 60 * 60 * 12
+
+# Concurrent deltas of one session are retried on fresh state this many times
+SAVE_ATTEMPTS = 5
+
+TOKEN_MODELS = {'adventuremonster': AdventureMonster, 'character': Character}
+
+
+class FogMask:
+    """ Fog of war as bitset over map grid cells, set bit means revealed cell """
+
+    def __init__(self, cols, rows, data=b''):
+        self.cols = cols
+        self.rows = rows
+        self.bits = bytearray((cols * rows + 7) // 8)
+        self.bits[:len(data)] = data[:len(self.bits)]
+
+    def _rect_cells(self, rect):
+        x0, y0, x1, y1 = rect
+        x0, x1 = max(min(x0, x1), 0), min(max(x0, x1), self.cols - 1)
+        y0, y1 = max(min(y0, y1), 0), min(max(y0, y1), self.rows - 1)
+
+        for y in range(y0, y1 + 1):
+            for x in range(x0, x1 + 1):
+                yield y * self.cols + x
+
+    def reveal(self, rect):
+        for cell in self._rect_cells(rect):
+            self.bits[cell >> 3] |= 1 << (cell & 7)
+
+    def conceal(self, rect):
+        for cell in self._rect_cells(rect):
+            self.bits[cell >> 3] &= ~(1 << (cell & 7))
+
+    def is_revealed(self, x, y):
+        cell = y * self.cols + x
+        return bool(self.bits[cell >> 3] & (1 << (cell & 7)))
+
+    def to_bytes(self):
+        return bytes(self.bits)
+
+
+class MapSessionState:
+    def __init__(self, session_id, adventure_id, cols, rows, fog, tokens, version):
+        self.session_id = session_id
+        self.adventure_id = adventure_id
+        self.fog = FogMask(cols, rows, fog)
+        self.tokens = tokens  # {'<model>:<id>': (x, y)}
+        self.version = version
+
+    @classmethod
+    def from_db(cls, session):
+        session = MapSession.objects.select_related('adv_map').get(id=session.id)
+        tokens = {
+            f'{model}:{object_id}': (x, y)
+            for model, object_id, x, y in session.tokens.values_list('content_type__model', 'object_id', 'x', 'y')
+        }
+        location = session.adv_map.location
+        adventure_id = location.adventure_id if isinstance(location, Stage) else location.stage.adventure_id
+
+        return cls(session.id, adventure_id, session.cols, session.rows, bytes(session.fog), tokens, session.version)
+
+    @classmethod
+    def from_cache(cls, data):
+        return cls(**data)
+
+    def to_cache(self):
+        return {
+            'session_id': self.session_id, 'adventure_id': self.adventure_id,
+            'cols': self.fog.cols, 'rows': self.fog.rows, 'fog': self.fog.to_bytes(), 'tokens': self.tokens,
+            'version': self.version,
+        }
+
+    def as_dict(self):
+        return {
+            'version': self.version,
+            'cols': self.fog.cols,
+            'rows': self.fog.rows,
+            'fog': base64.b64encode(self.fog.to_bytes()).decode(),
+            'tokens': [{'token': key, 'x': x, 'y': y} for key, (x, y) in self.tokens.items()],
+        }
+
+
+def _state_key(session_id):
+    return f'{CACHE_PREFIX}:{session_id}'
+
+
+def load_state(session, fresh=False):
+    data = None if fresh else cache.get(_state_key(session.id))
+    if data is not None:
+        return MapSessionState.from_cache(data)
+
+    state = MapSessionState.from_db(session)
+    cache.set(_state_key(session.id), state.to_cache(), CACHE_TIMEOUT)
+
+    return state
+
+
+def _check_new_token(state, key):
+    try:
+        model_name, object_id = key.split(':')
+        model = TOKEN_MODELS[model_name]
+        object_id = int(object_id)
+    except (KeyError, ValueError):
+        raise ValidationError(f'Invalid token {key}')
+
+    if not model.objects.filter(id=object_id, adventure_id=state.adventure_id).exists():
+        raise ValidationError(f'Token {key} does not belong to adventure')
+
+
+def _apply_op(state, op):
+    if not isinstance(op, dict):
+        raise ValidationError('Operation must be an object')
+
+    action = op.get('op')
+
+    if action in ('reveal', 'conceal'):
+        rect = op.get('rect')
+        if not isinstance(rect, (list, tuple)) or len(rect) != 4:
+            raise ValidationError('Rect must be [x0, y0, x1, y1]')
+        getattr(state.fog, action)([int(num) for num in rect])
+
+    elif action == 'move':
+        key, x, y = op.get('token'), int(op.get('x', -1)), int(op.get('y', -1))
+        if not isinstance(key, str):
+            raise ValidationError('Token must be "<model>:<id>" string')
+        if not (0 <= x < state.fog.cols and 0 <= y < state.fog.rows):
+            raise ValidationError(f'Token {key} is out of map')
+        if key not in state.tokens:
+            _check_new_token(state, key)
+        state.tokens[key] = (x, y)
+
+    elif action == 'remove':
+        state.tokens.pop(op.get('token'), None)
+
+    else:
+        raise ValidationError(f'Unknown operation {action}')
+
+
+def _save(state, tokens_before):
+    """ Write state as next version, only if nobody else saved the session since it was read """
+    content_types = ContentType.objects.get_for_models(*TOKEN_MODELS.values())
+    ct_ids = {model._meta.model_name: ct.id for model, ct in content_types.items()}
+
+    def token_key(key):
+        model_name, object_id = key.split(':')
+        return ct_ids[model_name], int(object_id)
+
+    with transaction.atomic():
+        saved = MapSession.objects.filter(id=state.session_id, version=state.version).update(
+            fog=state.fog.to_bytes(), version=state.version + 1
+        )
+        if not saved:
+            return False
+
+        for key in tokens_before.keys() - state.tokens.keys():
+            content_type_id, object_id = token_key(key)
+            MapToken.objects.filter(
+                session_id=state.session_id, content_type_id=content_type_id, object_id=object_id
+            ).delete()
+
+        moved = []
+        for key, (x, y) in state.tokens.items():
+            if tokens_before.get(key) != (x, y):
+                content_type_id, object_id = token_key(key)
+                moved.append(MapToken(
+                    session_id=state.session_id, content_type_id=content_type_id, object_id=object_id, x=x, y=y
+                ))
+        MapToken.objects.bulk_create(
+            moved, update_conflicts=True, unique_fields=['session', 'content_type', 'object_id'],
+            update_fields=['x', 'y']
+        )
+
+    state.version += 1
+    return True
+
+
+def apply_delta(session, ops):
+    """ Apply delta operations and save them. Conflicting deltas of other workers are retried on fresh state """
+    fresh = False
+    for _ in range(SAVE_ATTEMPTS):
+        state = load_state(session, fresh)
+        tokens_before = dict(state.tokens)
+
+        for op in ops:
+            _apply_op(state, op)
+
+        if _save(state, tokens_before):
+            cache.set(_state_key(session.id), state.to_cache(), CACHE_TIMEOUT)
+            return state
+
+        fresh = True
+
+    raise ValidationError('Map session is changed by others too often, retry')
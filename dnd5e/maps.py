@@ -0,0 +1,154 @@
+import hashlib
+import io
+import math
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from PIL import Image
+
+TILE_SIZE = 256
+TILE_OVERLAP = 1
+TILE_FORMAT = 'jpg'
+TILE_QUALITY = 85
+THUMBNAIL_SIZE = (400, 400)
+TILES_MAX_AGE = 60 * 60 * 24 * 365  # Tile urls contain map version, so tiles never change
+
+TILES_ROOT = 'adventures/maps/tiles'
+THUMBNAILS_ROOT = 'adventures/maps/thumbs'
+
+
+def map_version(adv_map):
+    """ Version of processed map data. Changes every time a new image is uploaded """
+    source = f'{adv_map.image.name}:{adv_map.width}x{adv_map.height}'
+    return hashlib.sha1(source.encode()).hexdigest()[:12]
+
+
+def max_level(width, height):
+    return math.ceil(math.log2(max(width, height, 1)))
+
+
+def level_size(width, height, level, top_level):
+    scale = 2 ** (top_level - level)
+    return max(math.ceil(width / scale), 1), max(math.ceil(height / scale), 1)
+
+
+def tiles_dir(map_id, version):
+    return f'{TILES_ROOT}/{map_id}/{version}'
+
+
+def tile_path(map_id, version, level, col, row):
+    return f'{tiles_dir(map_id, version)}/{level}/{col}_{row}.{TILE_FORMAT}'
+
+
+def dzi_descriptor(adv_map):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" '
+        f'Format="{TILE_FORMAT}" Overlap="{TILE_OVERLAP}" TileSize="{TILE_SIZE}">'
+        f'<Size Width="{adv_map.width}" Height="{adv_map.height}"/>'
+        '</Image>'
+    )
+
+
+def _save_image(image, path):
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=TILE_QUALITY)
+
+    if default_storage.exists(path):
+        default_storage.delete(path)
+
+    return default_storage.save(path, ContentFile(buffer.getvalue()))
+
+
+def _delete_dir(path):
+    try:
+        dirs, files = default_storage.listdir(path)
+    except (FileNotFoundError, NotImplementedError):
+        return
+
+    for name in files:
+        default_storage.delete(f'{path}/{name}')
+    for name in dirs:
+        _delete_dir(f'{path}/{name}')
+
+    # Storages without directories (S3 and such) have no local path, empty prefixes vanish there by themselves
+    try:
+        os.rmdir(default_storage.path(path))
+    except (NotImplementedError, OSError):
+        pass
+
+
+def _level_tiles(image):
+    """ Split one pyramid level into (col, row, tile) triples """
+    width, height = image.size
+
+    for col in range(math.ceil(width / TILE_SIZE)):
+        for row in range(math.ceil(height / TILE_SIZE)):
+            left = max(col * TILE_SIZE - TILE_OVERLAP, 0)
+            upper = max(row * TILE_SIZE - TILE_OVERLAP, 0)
+            right = min((col + 1) * TILE_SIZE + TILE_OVERLAP, width)
+            lower = min((row + 1) * TILE_SIZE + TILE_OVERLAP, height)
+
+            yield col, row, image.crop((left, upper, right, lower))
+
+
+def generate_thumbnail(adv_map, image, version):
+    thumbnail = image.copy()
+    thumbnail.thumbnail(THUMBNAIL_SIZE)
+
+    return _save_image(thumbnail, f'{THUMBNAILS_ROOT}/{adv_map.id}_{version}.jpg')
+
+
+def generate_tiles(adv_map, image, version):
+    """ Build deep zoom pyramid from the full resolution level down to 1x1 pixel """
+    top_level = max_level(*image.size)
+    level_image = image
+
+    for level in range(top_level, -1, -1):
+        size = level_size(image.width, image.height, level, top_level)
+        if level_image.size != size:
+            level_image = level_image.resize(size, Image.LANCZOS)
+
+        for col, row, tile in _level_tiles(level_image):
+            _save_image(tile, tile_path(adv_map.id, version, level, col, row))
+
+    return top_level
+
+
+def process_map(map_id):
+    from dnd5e.models import AdventureMap
+
+    try:
+        adv_map = AdventureMap.objects.get(id=map_id)
+    except AdventureMap.DoesNotExist:
+        return
+
+    version = map_version(adv_map)
+    if adv_map.tiles_version == version:
+        return
+
+    with adv_map.image.open('rb') as image_file:
+        image = Image.open(image_file)
+        image.load()
+
+    image = image.convert('RGB')
+
+    thumbnail = generate_thumbnail(adv_map, image, version)
+    generate_tiles(adv_map, image, version)
+
+    if adv_map.tiles_version:
+        _delete_dir(tiles_dir(adv_map.id, adv_map.tiles_version))
+    # Reprocessing the same version (process_maps --force) overwrites thumbnail in place
+    if adv_map.thumbnail and adv_map.thumbnail.name != thumbnail:
+        adv_map.thumbnail.delete(save=False)
+
+    AdventureMap.objects.filter(id=adv_map.id).update(thumbnail=thumbnail, tiles_version=version)
+
+
+def schedule_processing(adv_map):
+    from dnd5e import jobs
+
+    transaction.on_commit(lambda: jobs.enqueue('process_map', map_id=adv_map.id))
\ No newline at end of file
@@ -0,0 +1,56 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+from markdownx.utils import markdownify
+
+# Models with markdown ``description`` rendered through ``get_description``
+MARKDOWN_MODELS = ('Stage', 'Place', 'Zone', 'NPC', 'Quest', 'Item')
+
+CACHE_PREFIX = 'dnd5e:markdown'
+CACHE_TIMEOUT = 60 * 60 * 24 * 30  # Keys are content hashes, so entries of edited texts just expire
+
+
+def _extensions_hash():
+    extensions = {
+        'extensions': getattr(settings, 'MARKDOWNX_MARKDOWN_EXTENSIONS', []),
+        'configs': getattr(settings, 'MARKDOWNX_MARKDOWN_EXTENSION_CONFIGS', {}),
+    }
+    return hashlib.md5(json.dumps(extensions, sort_keys=True, default=str).encode()).hexdigest()[:8]
+
+
+EXTENSIONS_HASH = _extensions_hash()
+
+
+def cache_key(text):
+    content_hash = hashlib.sha1(text.encode()).hexdigest()
+    return f'{CACHE_PREFIX}:{EXTENSIONS_HASH}:{content_hash}'
+
+
+def render(text, force=False):
+    if not text:
+        return mark_safe('')
+
+    key = cache_key(text)
+    html = None if force else cache.get(key)
+
+    if html is None:
+        html = markdownify(text)
+        cache.set(key, html, CACHE_TIMEOUT)
+
+    return mark_safe(html)
+
+
+def render_many(texts, force=False):
+    """ Render missing texts and store them in cache with a single cache round trip """
+    keys = {cache_key(text): text for text in texts if text}
+    cached = {} if force else cache.get_many(keys.keys())
+
+    rendered = {key: markdownify(text) for key, text in keys.items() if key not in cached}
+    if rendered:
+        cache.set_many(rendered, CACHE_TIMEOUT)
+
+    return len(rendered)
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dnd5e', '0079_alter_feature_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adventuremap',
+            name='thumbnail',
+            field=models.ImageField(blank=True, default=None, editable=False, null=True, upload_to='adventures/maps/thumbs/', verbose_name='Миниатюра'),
+        ),
+        migrations.AddField(
+            model_name='adventuremap',
+            name='tiles_version',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12),
+        ),
+    ]
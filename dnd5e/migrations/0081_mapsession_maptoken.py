@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('dnd5e', '0080_adventuremap_thumbnail_tiles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapSession',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grid_size', models.PositiveSmallIntegerField(default=70, verbose_name='Размер клетки (px)')),
+                ('fog', models.BinaryField(default=b'')),
+                ('version', models.PositiveIntegerField(default=0, editable=False)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('adv_map', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='session', to='dnd5e.adventuremap', verbose_name='Карта')),
+            ],
+            options={
+                'verbose_name': 'Игровая сессия карты',
+                'verbose_name_plural': 'Игровые сессии карт',
+                'default_permissions': (),
+            },
+        ),
+        migrations.CreateModel(
+            name='MapToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('x', models.PositiveSmallIntegerField()),
+                ('y', models.PositiveSmallIntegerField()),
+                ('content_type', models.ForeignKey(limit_choices_to={'app_label': 'dnd5e', 'model__in': ['adventuremonster', 'character']}, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='contenttypes.contenttype')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens', related_query_name='token', to='dnd5e.mapsession')),
+            ],
+            options={
+                'verbose_name': 'Фишка на карте',
+                'verbose_name_plural': 'Фишки на карте',
+                'default_permissions': (),
+                'unique_together': {('session', 'content_type', 'object_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:19
+
+from django.db import migrations, models
+
+
+def fill_important(apps, schema_editor):
+    CharacterAdvancmentChoice = apps.get_model('dnd5e', 'CharacterAdvancmentChoice')
+    CharacterAdvancmentChoice.objects.filter(choice__important=True).update(important=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dnd5e', '0082_job'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='characteradvancmentchoice',
+            options={'default_permissions': (), 'ordering': ['character', '-important', 'choice__name'], 'verbose_name': 'Выбор персонажа', 'verbose_name_plural': 'Выборы персонажа'},
+        ),
+        migrations.AddField(
+            model_name='characteradvancmentchoice',
+            name='important',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(fill_important, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='characteradvancmentchoice',
+            index=models.Index(fields=['character', 'important'], name='dnd5e_charchoice_important'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dnd5e', '0083_characteradvancmentchoice_important'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='character',
+            name='armor_class',
+            field=models.PositiveSmallIntegerField(default=10, verbose_name='Класс доспеха'),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='current_hp',
+            field=models.SmallIntegerField(blank=True, default=None, null=True, verbose_name='Текущие хиты'),
+        ),
+        migrations.AddField(
+            model_name='character',
+            name='hit_points',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Максимум хитов'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dnd5e', '0084_character_armor_class_hit_points'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RulesVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Версия правил',
+                'verbose_name_plural': 'Версии правил',
+                'default_permissions': (),
+            },
+        ),
+    ]
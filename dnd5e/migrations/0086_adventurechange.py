@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dnd5e', '0085_rulesversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='adventure',
+            name='change_seq',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='AdventureChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveBigIntegerField()),
+                ('entity', models.CharField(max_length=32)),
+                ('object_id', models.PositiveIntegerField()),
+                ('fields', models.JSONField(default=list)),
+                ('data', models.JSONField(default=None, null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('adventure', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dnd5e.adventure')),
+            ],
+            options={
+                'verbose_name': 'Изменение приключения',
+                'verbose_name_plural': 'Изменения приключений',
+                'ordering': ['adventure', 'seq'],
+                'default_permissions': (),
+                'indexes': [models.Index(fields=['adventure', 'entity', 'object_id', 'seq'], name='dnd5e_advchange_object')],
+                'unique_together': {('adventure', 'seq')},
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('dnd5e', '0086_adventurechange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartyKnowledge',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revealed', models.DateTimeField(auto_now_add=True)),
+                ('knowledge', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dnd5e.knowledge')),
+                ('party', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dnd5e.party')),
+            ],
+            options={
+                'verbose_name': 'Известное отряду знание',
+                'verbose_name_plural': 'Известные отрядам знания',
+                'ordering': ['party', 'knowledge'],
+                'default_permissions': (),
+                'unique_together': {('party', 'knowledge')},
+            },
+        ),
+        migrations.CreateModel(
+            name='KnowledgeReveal',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revealed', models.BooleanField(default=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('knowledge', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dnd5e.knowledge')),
+                ('party', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dnd5e.party')),
+                ('user', models.ForeignKey(default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Раскрытие знания',
+                'verbose_name_plural': 'Раскрытия знаний',
+                'ordering': ['party', '-created'],
+                'default_permissions': (),
+                'indexes': [models.Index(fields=['party', '-created'], name='dnd5e_knowreveal_party')],
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:44
+
+from django.db import migrations, models
+
+import dnd5e.model_fields
+
+CONDITIONS = (
+    ('Poison', 'Отравление'), ('Exhaust', 'Истощение'), ('Deafened', 'Глухота'), ('Blinded', 'Ослепление'),
+    ('Paralyzed', 'Паралич'), ('Charmed', 'Очарование'), ('Petrified', 'Окаменение'), ('Frightened', 'Испруг'),
+)
+DAMAGE_TYPES = (
+    ('Piercing', 'Колющий'), ('Slashing', 'Рубящий'), ('Bludgeoning', 'Дробящий'), ('Acid', 'Кислотный'),
+    ('Cold', 'Холод'), ('Fire', 'Огонь'), ('Force', 'Сила'), ('Lightning', 'Молния'), ('Necrotic', 'Некротический'),
+    ('Poison', 'Яд'), ('Psychic', 'Психический'), ('Radiant', 'Свет'), ('Thunder', 'Гром'),
+)
+FIELDS = {'damage_immunity': DAMAGE_TYPES, 'damage_vuln': DAMAGE_TYPES, 'condition_immunity': CONDITIONS}
+
+
+def _flags(value):
+    if not value:
+        return []
+
+    return value.split(',') if isinstance(value, str) else list(value)
+
+
+def to_bitmask(apps, schema_editor):
+    Monster = apps.get_model('dnd5e', 'Monster')
+
+    for monster in Monster.objects.all():
+        for field, flags in FIELDS.items():
+            bits = {value: 1 << num for num, (value, _) in enumerate(flags)}
+            setattr(monster, f'{field}_bits', sum(bits.get(flag, 0) for flag in set(_flags(getattr(monster, field)))))
+        monster.save(update_fields=[f'{field}_bits' for field in FIELDS])
+
+
+def from_bitmask(apps, schema_editor):
+    Monster = apps.get_model('dnd5e', 'Monster')
+
+    for monster in Monster.objects.all():
+        for field, flags in FIELDS.items():
+            bits = getattr(monster, f'{field}_bits')
+            setattr(monster, field, [value for num, (value, _) in enumerate(flags) if bits & 1 << num] or None)
+        monster.save(update_fields=list(FIELDS))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dnd5e', '0087_party_knowledge'),
+    ]
+
+    operations = [
+        *(
+            migrations.AddField(model_name='monster', name=f'{field}_bits', field=models.PositiveIntegerField(default=0))
+            for field in FIELDS
+        ),
+        migrations.RunPython(to_bitmask, from_bitmask),
+        *(migrations.RemoveField(model_name='monster', name=field) for field in FIELDS),
+        *(migrations.RenameField(model_name='monster', old_name=f'{field}_bits', new_name=field) for field in FIELDS),
+        migrations.AlterField(
+            model_name='monster',
+            name='condition_immunity',
+            field=dnd5e.model_fields.BitmaskField(blank=True, default=list, flags=CONDITIONS, verbose_name='Иммунитет к состоянию'),
+        ),
+        migrations.AlterField(
+            model_name='monster',
+            name='damage_immunity',
+            field=dnd5e.model_fields.BitmaskField(blank=True, default=list, flags=DAMAGE_TYPES, verbose_name='Иммунитет к урону'),
+        ),
+        migrations.AlterField(
+            model_name='monster',
+            name='damage_vuln',
+            field=dnd5e.model_fields.BitmaskField(blank=True, default=list, flags=DAMAGE_TYPES, verbose_name='Уязвимость к урону'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:46
+
+from django.core.exceptions import ValidationError
+from django.db import migrations, models
+
+
+def fill_cost_copper(apps, schema_editor):
+    for model_name in ('Item', 'Stuff', 'Tool', 'Weapon'):
+        model = apps.get_model('dnd5e', model_name)
+        objects = []
+
+        for obj in model.objects.exclude(cost__isnull=True).exclude(cost='').only('id', 'cost'):
+            try:
+                obj.cost_copper = model._meta.get_field('cost').to_python(obj.cost).in_copper
+            except ValidationError:
+                continue
+            objects.append(obj)
+
+        model.objects.bulk_update(objects, ['cost_copper'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dnd5e', '0088_monster_immunity_bitmask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='cost_copper',
+            field=models.PositiveIntegerField(db_index=True, default=None, editable=False, null=True, verbose_name='Стоимость в медных монетах'),
+        ),
+        migrations.AddField(
+            model_name='stuff',
+            name='cost_copper',
+            field=models.PositiveIntegerField(db_index=True, default=None, editable=False, null=True, verbose_name='Стоимость в медных монетах'),
+        ),
+        migrations.AddField(
+            model_name='tool',
+            name='cost_copper',
+            field=models.PositiveIntegerField(db_index=True, default=None, editable=False, null=True, verbose_name='Стоимость в медных монетах'),
+        ),
+        migrations.AddField(
+            model_name='weapon',
+            name='cost_copper',
+            field=models.PositiveIntegerField(db_index=True, default=None, editable=False, null=True, verbose_name='Стоимость в медных монетах'),
+        ),
+        migrations.RunPython(fill_cost_copper, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:05
+
+from django.core.exceptions import ValidationError
+from django.db import migrations, models
+
+import dnd5e.model_fields
+
+FIELDS = (('class', 'hit_dice'), ('weapon', 'dmg_dice'), ('characterdice', 'dice'), ('monster', 'hit_dice'))
+# Required fields are nullable while converted, so migration can be reversed
+REQUIRED = {'class': {}, 'weapon': {'verbose_name': 'Урон'}, 'characterdice': {}}
+
+
+def to_packed(apps, schema_editor):
+    dice_field = dnd5e.model_fields.DiceField()
+
+    for model_name, field in FIELDS:
+        model = apps.get_model('dnd5e', model_name)
+        objects = []
+
+        for obj_id, value in model.objects.exclude(**{f'{field}__isnull': True}).values_list('id', field):
+            if value == '' and model_name not in REQUIRED:
+                continue  # Blank optional dice becomes NULL
+
+            try:
+                packed = dice_field.get_prep_value(value)
+            except ValidationError as exc:
+                raise ValueError(f'{model_name} {obj_id}: invalid {field} {value!r} ({exc.message}), fix it and rerun')
+            objects.append(model(id=obj_id, **{f'{field}_packed': packed}))
+
+        model.objects.bulk_update(objects, [f'{field}_packed'], batch_size=500)
+
+
+def from_packed(apps, schema_editor):
+    for model_name, field in FIELDS:
+        model = apps.get_model('dnd5e', model_name)
+
+        for obj in model.objects.exclude(**{f'{field}_packed__isnull': True}):
+            setattr(obj, field, dnd5e.model_fields.Dice.unpack(getattr(obj, f'{field}_packed')))
+            obj.save(update_fields=[field])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dnd5e', '0089_cost_copper'),
+    ]
+
+    operations = [
+        *(
+            migrations.AlterField(
+                model_name=model_name, name=field, field=dnd5e.model_fields.DiceField(null=True, **REQUIRED[model_name])
+            )
+            for model_name, field in FIELDS if model_name in REQUIRED
+        ),
+        *(
+            migrations.AddField(
+                model_name=model_name, name=f'{field}_packed', field=models.PositiveIntegerField(null=True)
+            )
+            for model_name, field in FIELDS
+        ),
+        migrations.RunPython(to_packed, from_packed),
+        *(migrations.RemoveField(model_name=model_name, name=field) for model_name, field in FIELDS),
+        *(
+            migrations.RenameField(model_name=model_name, old_name=f'{field}_packed', new_name=field)
+            for model_name, field in FIELDS
+        ),
+        migrations.AlterField(
+            model_name='class',
+            name='hit_dice',
+            field=dnd5e.model_fields.DiceField(),
+        ),
+        migrations.AlterField(
+            model_name='weapon',
+            name='dmg_dice',
+            field=dnd5e.model_fields.DiceField(verbose_name='Урон'),
+        ),
+        migrations.AlterField(
+            model_name='characterdice',
+            name='dice',
+            field=dnd5e.model_fields.DiceField(),
+        ),
+        migrations.AlterField(
+            model_name='monster',
+            name='hit_dice',
+            field=dnd5e.model_fields.DiceField(blank=True, default=None, null=True, verbose_name='Кости здоровья'),
+        ),
+    ]
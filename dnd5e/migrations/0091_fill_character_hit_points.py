@@ -0,0 +1,50 @@
+from math import floor
+
+from django.db import migrations
+
+
+def max_hit_points(class_dice, constitution):
+    """ Copy of dnd.max_hit_points at the time of migration """
+    mod = floor((constitution - 10) / 2)
+    hit_points = 0
+
+    for num, (dice, level) in enumerate(class_dice):
+        for lvl in range(level):
+            gain = dice if num == 0 and lvl == 0 else dice // 2 + 1
+            hit_points += max(gain + mod, 1)
+
+    return hit_points
+
+
+def fill_hit_points(apps, schema_editor):
+    Character = apps.get_model('dnd5e', 'Character')
+    CharacterAbilities = apps.get_model('dnd5e', 'CharacterAbilities')
+    CharacterClass = apps.get_model('dnd5e', 'CharacterClass')
+
+    constitutions = dict(
+        CharacterAbilities.objects.filter(ability__orig_name='Constitution').values_list('character_id', 'value')
+    )
+
+    class_dice = {}  # {character id: [(hit dice sides, level)] in order classes were taken}
+    for char_id, sides, level in CharacterClass.objects.order_by('id').values_list(
+        'character_id', 'klass__hit_dice__sides', 'level'
+    ):
+        class_dice.setdefault(char_id, []).append((sides, level))
+
+    characters = []
+    for char in Character.objects.only('id', 'hit_points'):
+        char.hit_points = max_hit_points(class_dice.get(char.id, []), constitutions.get(char.id, 10))
+        characters.append(char)
+
+    Character.objects.bulk_update(characters, ['hit_points'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dnd5e', '0090_packed_dice'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_hit_points, migrations.RunPython.noop),
+    ]
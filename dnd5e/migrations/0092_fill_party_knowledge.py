@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def fill_party_knowledge(apps, schema_editor):
+    """ Knowledges known before per party reveals are known to every party of adventure """
+    Knowledge = apps.get_model('dnd5e', 'Knowledge')
+    Party = apps.get_model('dnd5e', 'Party')
+    PartyKnowledge = apps.get_model('dnd5e', 'PartyKnowledge')
+
+    parties = {}  # {adventure id: [party id]}
+    for party_id, adventure_id in Party.objects.values_list('id', 'adventure_id'):
+        parties.setdefault(adventure_id, []).append(party_id)
+
+    PartyKnowledge.objects.bulk_create(
+        [
+            PartyKnowledge(party_id=party_id, knowledge_id=knowledge_id)
+            for knowledge_id, adventure_id in Knowledge.objects.filter(known=True).values_list('id', 'adventure_id')
+            for party_id in parties.get(adventure_id, [])
+        ],
+        batch_size=500, ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dnd5e', '0091_fill_character_hit_points'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_party_knowledge, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,28 @@
+import random
 import re
-from django.db.models import CharField
+from functools import total_ordering
+
+from django import forms
+from django.db.models import CharField, FloatField, IntegerField, Lookup, PositiveIntegerField, Transform
+from django.db.models.query_utils import DeferredAttribute
 from django.core.exceptions import ValidationError
 
 
 DICE_RE = re.compile(
-    r'^(?P<count>\d{1,})d(?P<dice>4|6|8|10|12|20|100)($|\ (?P<sign>[+-]?)\ *(?P<mod>\d{1,})\ *$)', re.IGNORECASE
+    r'^(?P<count>\d{1,})d(?P<dice>4|6|8|10|12|20|100)((\ *(?P<sign>[+-])|\ )\ *(?P<mod>\d{1,}))?\ *$', re.IGNORECASE
 )
 
+# Packed dice layout: count in high bits, then sides, then modifier shifted to be non negative
+DICE_MOD_BITS = 12
+DICE_SIDES_BITS = 7
+DICE_MOD_OFFSET = 1 << (DICE_MOD_BITS - 1)
+DICE_COUNT_LIMIT = 1 << (31 - DICE_MOD_BITS - DICE_SIDES_BITS)
+
+# Integer division unpacks components in SQL, {dice} is packed value
+DICE_COUNT_SQL = f'({{dice}} / {1 << (DICE_MOD_BITS + DICE_SIDES_BITS)})'
+DICE_SIDES_SQL = f'({{dice}} / {1 << DICE_MOD_BITS} - {DICE_COUNT_SQL} * {1 << DICE_SIDES_BITS})'
+DICE_MOD_SQL = f'({{dice}} - {{dice}} / {1 << DICE_MOD_BITS} * {1 << DICE_MOD_BITS} - {DICE_MOD_OFFSET})'
+
 
 class Dice:
     def __init__(self, dice_string):
@@ -19,14 +35,44 @@ class Dice:
 
         self.count = int(groups['count'])
         self.dice = int(groups['dice'])
-        self.mod = groups.get('mod')
+        self.mod = int('{}{}'.format(groups['sign'] or '', groups['mod'])) if groups['mod'] else None
+
+    @classmethod
+    def from_parts(cls, count, dice, mod=None):
+        obj = cls.__new__(cls)
+        obj.count, obj.dice, obj.mod = count, dice, mod or None
+
+        return obj
+
+    @classmethod
+    def unpack(cls, packed):
+        count, rest = divmod(packed, 1 << (DICE_MOD_BITS + DICE_SIDES_BITS))
+        dice, mod = divmod(rest, 1 << DICE_MOD_BITS)
 
+        return cls.from_parts(count, dice, mod - DICE_MOD_OFFSET)
+
+    @property
+    def packed(self):
+        mod = self.mod or 0
+        if self.count >= DICE_COUNT_LIMIT or not -DICE_MOD_OFFSET <= mod < DICE_MOD_OFFSET:
+            raise ValidationError('Dice value is out of range')
+
+        return (self.count << (DICE_MOD_BITS + DICE_SIDES_BITS)) | (self.dice << DICE_MOD_BITS) | (mod + DICE_MOD_OFFSET)
+
+    @property
+    def value(self):
         if self.mod:
-            self.mod = int('{}{}'.format(groups['sign'], groups['mod']))
-            self.sign = groups['sign']
-            self.value = f'{self.count}d{self.dice} {self.sign} {abs(self.mod)}'
-        else:
-            self.value = f'{self.count}d{self.dice}'
+            return f'{self.count}d{self.dice} {"-" if self.mod < 0 else "+"} {abs(self.mod)}'
+
+        return f'{self.count}d{self.dice}'
+
+    @property
+    def average(self):
+        return self.count * (self.dice + 1) / 2 + (self.mod or 0)
+
+    @property
+    def maximum(self):
+        return self.count * self.dice + (self.mod or 0)
 
     def __len__(self):
         return len(self.value)
@@ -34,30 +80,124 @@ class Dice:
     def __str__(self):
         return self.value
 
+    def __repr__(self):
+        return f'[{self.__class__.__name__}]: {self.value}'
 
-class DiceField(CharField):
-    description = 'Dice'
+    def __eq__(self, other):
+        if not isinstance(other, Dice):
+            return NotImplemented
 
-    def __init__(self, *args, **kwargs):
-        kwargs['max_length'] = 12
-        super().__init__(*args, **kwargs)
+        return (self.count, self.dice, self.mod) == (other.count, other.dice, other.mod)
 
-    def deconstruct(self):
-        name, path, args, kwargs = super().deconstruct()
-        del kwargs["max_length"]
-        return name, path, args, kwargs
+    def __hash__(self):
+        return hash((self.count, self.dice, self.mod))
+
+    def roll(self, rng=random):
+        return sum(rng.randint(1, self.dice) for _ in range(self.count)) + (self.mod or 0)
+
+
+class DiceDescriptor(DeferredAttribute):
+    """ Packed value is kept as loaded from database, Dice is built on first access """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+
+        value = super().__get__(instance, cls)
+        if value is not None and not isinstance(value, Dice):
+            value = instance.__dict__[self.field.attname] = self.field.to_python(value)
+
+        return value
+
+    def __set__(self, instance, value):
+        # Data descriptor, otherwise instance attribute would shadow __get__
+        instance.__dict__[self.field.attname] = value
+
+
+class DiceField(PositiveIntegerField):
+    """ Dice packed to integer, components are available in queries as count, sides, mod, average and maximum """
+    description = 'Dice'
+    descriptor_class = DiceDescriptor
 
     def to_python(self, value):
         if isinstance(value, Dice) or value is None:
             return value
 
+        if isinstance(value, int) or value.isdigit():
+            return Dice.unpack(int(value))
+
         return Dice(value)
 
     def get_prep_value(self, value):
-        return str(value)
+        if value is None or isinstance(value, int):
+            return value
+
+        return self.to_python(value).packed
+
+    def value_to_string(self, obj):
+        return str(self.value_from_object(obj) or '')
+
+    def validate(self, value, model_instance):
+        super().validate(self.get_prep_value(value), model_instance)
+
+    def run_validators(self, value):
+        super().run_validators(self.get_prep_value(value))
+
+    def formfield(self, **kwargs):
+        return forms.CharField(
+            max_length=16, required=not self.blank, label=self.verbose_name, help_text=self.help_text, **kwargs
+        )
+
+
+class DiceTransform(Transform):
+    """ SQL expression over packed dice, {dice} in template is replaced with packed value """
+    output_field = IntegerField()
+
+    def as_sql(self, compiler, connection):
+        lhs, params = compiler.compile(self.lhs)
+
+        return self.sql_template.replace('{dice}', lhs), params * self.sql_template.count('{dice}')
+
+
+@DiceField.register_lookup
+class DiceCount(DiceTransform):
+    lookup_name = 'count'
+    sql_template = DICE_COUNT_SQL
+
 
+@DiceField.register_lookup
+class DiceSides(DiceTransform):
+    lookup_name = 'sides'
+    sql_template = DICE_SIDES_SQL
 
+
+@DiceField.register_lookup
+class DiceModifier(DiceTransform):
+    lookup_name = 'mod'
+    sql_template = DICE_MOD_SQL
+
+
+@DiceField.register_lookup
+class DiceAverage(DiceTransform):
+    lookup_name = 'average'
+    sql_template = f'({DICE_COUNT_SQL} * ({DICE_SIDES_SQL} + 1) / 2.0 + {DICE_MOD_SQL})'
+    output_field = FloatField()
+
+
+@DiceField.register_lookup
+class DiceMaximum(DiceTransform):
+    lookup_name = 'maximum'
+    sql_template = f'({DICE_COUNT_SQL} * {DICE_SIDES_SQL} + {DICE_MOD_SQL})'
+
+
+@total_ordering
 class Coins:
+    DENOMINATIONS = ('copper', 'silver', 'elecrum', 'gold', 'platinum')
+    # Value of one coin in copper pieces
+    RATES = {'copper': 1, 'silver': 10, 'elecrum': 50, 'gold': 100, 'platinum': 1000}
+    # Electrum is rare in change, it's skipped on normalisation unless asked
+    CHANGE = ('platinum', 'gold', 'silver', 'copper')
+
     def __init__(self, copper=0, silver=0, elecrum=0, gold=0, platinum=0):
         self.copper = copper
         self.silver = silver
@@ -74,12 +214,84 @@ class Coins:
         except (ValueError, TypeError):
             raise ValidationError('Invalid coins value')
 
+    @classmethod
+    def from_copper(cls, copper, denominations=CHANGE):
+        """ Fewest coins of given denominations worth given amount of copper """
+        if copper < 0:
+            raise ValueError('Coins value can\'t be negative')
+
+        coins = cls()
+        for name in sorted(denominations, key=cls.RATES.get, reverse=True):
+            count, copper = divmod(copper, cls.RATES[name])
+            setattr(coins, name, count)
+
+        coins.copper += copper
+
+        return coins
+
+    @property
+    def in_copper(self):
+        return sum(getattr(self, name) * rate for name, rate in self.RATES.items())
+
+    def convert(self, denomination):
+        """ Value in given coins, e.g. 150 copper is 1.5 gold """
+        return self.in_copper / self.RATES[denomination]
+
+    def normalized(self, denominations=CHANGE):
+        return self.from_copper(self.in_copper, denominations)
+
+    def __add__(self, other):
+        if not isinstance(other, Coins):
+            return NotImplemented
+
+        return Coins(*(getattr(self, name) + getattr(other, name) for name in self.DENOMINATIONS))
+
+    def __radd__(self, other):
+        # sum() starts with 0
+        if other == 0:
+            return self
+
+        return self.__add__(other)
+
+    def __sub__(self, other):
+        """ Difference is paid with change, so result is normalized """
+        if not isinstance(other, Coins):
+            return NotImplemented
+
+        return self.from_copper(self.in_copper - other.in_copper)
+
+    def __mul__(self, other):
+        if not isinstance(other, int):
+            return NotImplemented
+
+        return Coins(*(getattr(self, name) * other for name in self.DENOMINATIONS))
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other):
+        if not isinstance(other, Coins):
+            return NotImplemented
+
+        return self.in_copper == other.in_copper
+
+    def __lt__(self, other):
+        if not isinstance(other, Coins):
+            return NotImplemented
+
+        return self.in_copper < other.in_copper
+
+    def __hash__(self):
+        return hash(self.in_copper)
+
     def __bool__(self):
         return any([self.copper, self.silver, self.elecrum, self.gold, self.platinum])
 
     def __len__(self):
         return 1
 
+    def __repr__(self):
+        return f'[{self.__class__.__name__}]: {self.copper},{self.silver},{self.elecrum},{self.gold},{self.platinum}'
+
     def __str__(self):
         ret = []
 
@@ -131,3 +343,94 @@ class CostField(CharField):
 
     def value_to_string(self, obj):
         return self.get_prep_value(self.value_from_object(obj))
+
+
+class BitmaskField(PositiveIntegerField):
+    """ Set of choices stored as integer, choice number in declaration order is its bit. Value is list of choices """
+    description = 'Bitmask'
+
+    def __init__(self, *args, flags=(), **kwargs):
+        self.flags = tuple(flags)
+        self.bits = {value: 1 << num for num, (value, _) in enumerate(self.flags)}
+        kwargs.setdefault('default', list)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['flags'] = self.flags
+
+        return name, path, args, kwargs
+
+    def to_bits(self, value):
+        if value is None or isinstance(value, int):
+            return value
+
+        if isinstance(value, str):
+            # Serialized bits (dumpdata) or comma separated flags (legacy multiselect)
+            if value.isdigit():
+                return int(value)
+            value = [flag.strip() for flag in value.split(',') if flag.strip()]
+
+        try:
+            return sum(self.bits[flag] for flag in set(value))
+        except KeyError as exc:
+            raise ValidationError(f'Unknown flag {exc}')
+
+    def to_flags(self, bits):
+        return [value for value, _ in self.flags if bits & self.bits[value]]
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+
+        return self.to_flags(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, list):
+            return value
+
+        if isinstance(value, int):
+            return self.to_flags(value)
+
+        return self.to_flags(self.to_bits(value))
+
+    def get_prep_value(self, value):
+        return super().get_prep_value(self.to_bits(value))
+
+    def value_to_string(self, obj):
+        return str(self.get_prep_value(self.value_from_object(obj)))
+
+    def validate(self, value, model_instance):
+        super().validate(self.to_bits(value), model_instance)
+
+    def run_validators(self, value):
+        super().run_validators(self.to_bits(value))
+
+    def formfield(self, **kwargs):
+        return forms.TypedMultipleChoiceField(
+            choices=self.flags, required=not self.blank, label=self.verbose_name, help_text=self.help_text, **kwargs
+        )
+
+
+@BitmaskField.register_lookup
+class HasAny(Lookup):
+    """ Any of given flags is set """
+    lookup_name = 'has_any'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+
+        return f'({lhs} & {rhs}) != 0', lhs_params + rhs_params
+
+
+@BitmaskField.register_lookup
+class HasAll(Lookup):
+    """ All given flags are set """
+    lookup_name = 'has_all'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+
+        return f'({lhs} & {rhs}) = {rhs}', lhs_params + rhs_params + rhs_params
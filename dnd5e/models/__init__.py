@@ -4,17 +4,18 @@
 from dnd5e.model_fields import CostField, DiceField
 
 from .adventure import (
-    NPC, Adventure, AdventureMap, AdventureMonster, Knowledge, MoneyAmount,
-    NPCRelation, Party, Place, Quest, Stage, Trap, Treasure, Zone
+    NPC, Adventure, AdventureChange, AdventureMap, AdventureMonster, Knowledge, KnowledgeReveal, MapSession,
+    MapToken, MoneyAmount, NPCRelation, Party, PartyKnowledge, Place, Quest, Stage, Trap, Treasure, Zone
 )
 from .base import (
     Ability, AdvancmentChoice, ArmorCategory, Background, BackgroundPath, Bond, Class, ClassArmorProficiency,
     ClassLevelAdvance, ClassLevels, Feature, Flaw, Ideal, Item, Language, Maneuver, Monster, MonsterAction,
-    MonsterSense, MonsterSkill, MonsterTrait, MonsterType, MultiClassProficiency, PersonalityTrait, Race,
-    RuleBook, Sense, Skill, Spell, SpellSchool, Stuff, Subclass, Subrace, Tool, Weapon, WeaponCategory
+    MonsterSense, MonsterSkill, MonsterTrait, MonsterType, MultiClassProficiency, PersonalityTrait, Race, RuleBook,
+    RulesVersion, Sense, Skill, Spell, SpellSchool, Stuff, Subclass, Subrace, Tool, Weapon, WeaponCategory
 )
 from .character import (
     Character, CharacterAbilities, CharacterAdvancmentChoice, CharacterBackground, CharacterClass,
     CharacterDice, CharacterFeature, CharacterSkill, CharacterSpellSlot, CharacterToolProficiency
 )
 from .choices import ALIGNMENT_CHOICES, ARMOR_CLASSES, CONDITIONS, DAMAGE_TYPES, GENDER_CHOICES, SIZE_CHOICES
+from .job import Job
@@ -4,12 +4,10 @@ from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
-from django.utils.safestring import mark_safe
 
 from markdownx.models import MarkdownxField
-from markdownx.utils import markdownify
 
-from dnd5e import dnd
+from dnd5e import dnd, markdown
 from dnd5e.model_fields import CostField
 
 from .choices import GENDER_CHOICES
@@ -25,6 +23,7 @@ class Adventure(models.Model):
     name = models.CharField(max_length=256, db_index=True, verbose_name='Название')
     created = models.DateTimeField(verbose_name='Дата создания', auto_now_add=True)
     monsters = models.ManyToManyField('Monster', related_name='in_adventures', editable=False)
+    change_seq = models.PositiveBigIntegerField(default=0, editable=False)  # Last AdventureChange sequence
 
     class Meta:
         ordering = ['name']
@@ -61,6 +60,14 @@ class Party(models.Model):
         return f'[{self.__class__.__name__}]: {self.id}'
 
 
+class AdventureMapQuerySet(models.QuerySet):
+    def of_master(self, user):
+        """ Maps of stages and places of adventures run by user """
+        return self.filter(
+            models.Q(stage__adventure__master=user) | models.Q(place__stage__adventure__master=user)
+        )
+
+
 class AdventureMap(models.Model):
     content_type = models.ForeignKey(
         ContentType, on_delete=models.CASCADE,
@@ -74,6 +81,14 @@ class AdventureMap(models.Model):
     width = models.PositiveSmallIntegerField(editable=False)
     height = models.PositiveSmallIntegerField(editable=False)
     name = models.CharField(max_length=32, verbose_name='Название')
+    thumbnail = models.ImageField(
+        upload_to='adventures/maps/thumbs/', null=True, blank=True, default=None, editable=False,
+        verbose_name='Миниатюра'
+    )
+    # Version of generated thumbnail and deep zoom tiles, empty until the image is processed
+    tiles_version = models.CharField(max_length=12, blank=True, default='', editable=False)
+
+    objects = AdventureMapQuerySet.as_manager()
 
     class Meta:
         ordering = ['name', 'image']
@@ -81,6 +96,10 @@ class AdventureMap(models.Model):
         verbose_name = 'Карта'
         verbose_name_plural = 'Карты'
 
+    @property
+    def tiles_ready(self):
+        return bool(self.tiles_version)
+
     def __repr__(self):
         return f'[{self.__class__.__name__}]: {self.id}'
 
@@ -88,6 +107,62 @@ class AdventureMap(models.Model):
         return f'{self.name}'
 
 
+class MapSession(models.Model):
+    adv_map = models.OneToOneField(
+        AdventureMap, on_delete=models.CASCADE, related_name='session', verbose_name='Карта'
+    )
+    grid_size = models.PositiveSmallIntegerField(default=70, verbose_name='Размер клетки (px)')
+    # Fog of war bitset, one bit per grid cell in row-major order, set bit means revealed cell
+    fog = models.BinaryField(default=b'', editable=False)
+    version = models.PositiveIntegerField(default=0, editable=False)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        default_permissions = ()
+        verbose_name = 'Игровая сессия карты'
+        verbose_name_plural = 'Игровые сессии карт'
+
+    @property
+    def cols(self):
+        return -(-self.adv_map.width // self.grid_size)
+
+    @property
+    def rows(self):
+        return -(-self.adv_map.height // self.grid_size)
+
+    def __repr__(self):
+        return f'[{self.__class__.__name__}]: {self.id}'
+
+    def __str__(self):
+        return f'{self.adv_map}'
+
+
+class MapToken(models.Model):
+    session = models.ForeignKey(
+        MapSession, on_delete=models.CASCADE, related_name='tokens', related_query_name='token'
+    )
+    content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, related_name='+',
+        limit_choices_to={'app_label': 'dnd5e', 'model__in': ['adventuremonster', 'character']}
+    )
+    object_id = models.PositiveIntegerField()
+    obj = GenericForeignKey()
+    x = models.PositiveSmallIntegerField()
+    y = models.PositiveSmallIntegerField()
+
+    class Meta:
+        default_permissions = ()
+        unique_together = ('session', 'content_type', 'object_id')
+        verbose_name = 'Фишка на карте'
+        verbose_name_plural = 'Фишки на карте'
+
+    def __repr__(self):
+        return f'[{self.__class__.__name__}]: {self.id}'
+
+    def __str__(self):
+        return f'{self.obj} ({self.x}, {self.y})'
+
+
 class Knowledge(models.Model):
     KTYPE_CHOICES = (
         (0, ''),
@@ -126,18 +201,52 @@ class Knowledge(models.Model):
         return f'{self.get_ktype_display()} -> {self.title}'
 
 
+class PartyKnowledge(models.Model):
+    """ Knowledge revealed to party """
+    party = models.ForeignKey(Party, on_delete=models.CASCADE, related_name='+')
+    knowledge = models.ForeignKey(Knowledge, on_delete=models.CASCADE, related_name='+')
+    revealed = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['party', 'knowledge']
+        default_permissions = ()
+        unique_together = ('party', 'knowledge')
+        verbose_name = 'Известное отряду знание'
+        verbose_name_plural = 'Известные отрядам знания'
+
+    def __repr__(self):
+        return f'[{self.__class__.__name__}]: {self.id}'
+
+
+class KnowledgeReveal(models.Model):
+    """ Audit log of knowledge reveals and hides """
+    party = models.ForeignKey(Party, on_delete=models.CASCADE, related_name='+')
+    knowledge = models.ForeignKey(Knowledge, on_delete=models.CASCADE, related_name='+')
+    revealed = models.BooleanField(default=True)  # False when knowledge was hidden back
+    user = models.ForeignKey(USER_MODEL, on_delete=models.SET_NULL, null=True, default=None, related_name='+')
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['party', '-created']
+        default_permissions = ()
+        indexes = [models.Index(fields=['party', '-created'], name='dnd5e_knowreveal_party')]
+        verbose_name = 'Раскрытие знания'
+        verbose_name_plural = 'Раскрытия знаний'
+
+    def __repr__(self):
+        return f'[{self.__class__.__name__}]: {self.id}'
+
+    def as_dict(self):
+        return {
+            'party': self.party_id, 'knowledge': self.knowledge_id, 'revealed': self.revealed,
+            'user': self.user_id, 'created': self.created.isoformat(),
+        }
+
+
 class StageQuerySet(models.QuerySet):
     def prefetch_detail(self):
         return self.select_related('adventure').prefetch_related('knowledges', 'places__zones')
 
-    def annotate_detail(self):
-        return self.annotate(
-            knowledges__count=models.Count('knowledges'),
-            has_knowledges=models.Case(
-                models.When(knowledges__count__gt=0, then=True), output_field=models.BooleanField(), default=False
-            )
-        )
-
 
 class Stage(models.Model):
     adventure = models.ForeignKey(
@@ -149,7 +258,7 @@ class Stage(models.Model):
     knowledges = models.ManyToManyField(
         Knowledge, related_name='stages', related_query_name='stage', verbose_name='Знания', blank=True
     )
-    maps = GenericRelation(AdventureMap)
+    maps = GenericRelation(AdventureMap, related_query_name='stage')
 
     objects = StageQuerySet.as_manager()
 
@@ -162,7 +271,7 @@ class Stage(models.Model):
 
     @property
     def get_description(self):
-        return mark_safe(markdownify(self.description))
+        return markdown.render(self.description)
 
     def __repr__(self):
         return f'[{self.__class__.__name__}]: {self.id}'
@@ -193,7 +302,7 @@ class Place(models.Model):
     traps = models.ManyToManyField(
         'Trap', related_name='places', related_query_name='place', verbose_name='Ловушки', blank=True
     )
-    maps = GenericRelation(AdventureMap)
+    maps = GenericRelation(AdventureMap, related_query_name='place')
 
     objects = PlaceQuerySet.as_manager()
 
@@ -205,7 +314,7 @@ class Place(models.Model):
 
     @property
     def get_description(self):
-        return mark_safe(markdownify(self.description))
+        return markdown.render(self.description)
 
     def __repr__(self):
         return f'[{self.__class__.__name__}]: {self.id}'
@@ -241,7 +350,7 @@ class Zone(models.Model):
 
     @property
     def get_description(self):
-        return mark_safe(markdownify(self.description))
+        return markdown.render(self.description)
 
     def __repr__(self):
         return f'[{self.__class__.__name__}]: {self.id}'
@@ -286,8 +395,13 @@ class Treasure(models.Model):
     def __repr__(self):
         return f'[{self.__class__.__name__}]: {self.id}'
 
+    @property
+    def is_money(self):
+        # Content types are cached by manager, comparing ids doesn't load what_ct
+        return self.what_ct_id == ContentType.objects.get_for_model(MoneyAmount).id
+
     def __str__(self):
-        if self.quantity != 1 and self.what_ct != ContentType.objects.get_for_model(MoneyAmount):
+        if self.quantity != 1 and not self.is_money:
             return f'{self.quantity} \u00D7 {self.what}'
         return f'{self.what}'
 
@@ -323,7 +437,7 @@ class Quest(models.Model):
 
     @property
     def get_description(self):
-        return mark_safe(markdownify(self.description))
+        return markdown.render(self.description)
 
     def __repr__(self):
         return f'[{self.__class__.__name__}]: {self.id}'
@@ -361,7 +475,7 @@ class NPC(models.Model):
 
     @property
     def get_description(self):
-        return mark_safe(markdownify(self.description))
+        return markdown.render(self.description)
 
     def __repr__(self):
         return f'[{self.__class__.__name__}]: {self.name}'
@@ -453,3 +567,28 @@ class AdventureMonster(models.Model):
 
     def __repr__(self):
         return f'[{self.__class__.__name__}]: {self.id}'
+
+
+class AdventureChange(models.Model):
+    """ Change log entry of adventure state synced to GM clients """
+    adventure = models.ForeignKey(Adventure, on_delete=models.CASCADE, related_name='+')
+    seq = models.PositiveBigIntegerField()
+    entity = models.CharField(max_length=32)
+    object_id = models.PositiveIntegerField()
+    fields = models.JSONField(default=list)  # Changed fields
+    data = models.JSONField(null=True, default=None)  # Synced fields state after change, null for deleted object
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['adventure', 'seq']
+        default_permissions = ()
+        unique_together = ('adventure', 'seq')
+        indexes = [models.Index(fields=['adventure', 'entity', 'object_id', 'seq'], name='dnd5e_advchange_object')]
+        verbose_name = 'Изменение приключения'
+        verbose_name_plural = 'Изменения приключений'
+
+    def __repr__(self):
+        return f'[{self.__class__.__name__}]: {self.id}'
+
+    def as_dict(self):
+        return {'seq': self.seq, 'entity': self.entity, 'id': self.object_id, 'fields': self.fields, 'data': self.data}
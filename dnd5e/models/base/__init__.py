@@ -3,7 +3,7 @@
 from .ability import Ability, Skill
 from .background import Background, BackgroundPath, Bond, Flaw, Ideal, PersonalityTrait
 from .classes import Class, ClassArmorProficiency, ClassLevelAdvance, ClassLevels, MultiClassProficiency, Subclass
-from .common import Language, RuleBook, Sense, Spell, SpellSchool
+from .common import Language, RuleBook, RulesVersion, Sense, Spell, SpellSchool
 from .feature import AdvancmentChoice, Feature, Maneuver
 from .item import ArmorCategory, Item, Stuff, Tool, Weapon, WeaponCategory
 from .monster import Monster, MonsterAction, MonsterSense, MonsterSkill, MonsterTrait, MonsterType
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class RuleBook(models.Model):
@@ -93,3 +94,37 @@ class Spell(models.Model):
 
     def __str__(self):
         return f'{self.name} ({self.orig_name})'
+
+
+class RulesVersion(models.Model):
+    """ Single row, bumped on every change of rules data. Clients revalidate cached catalogue with it """
+    MODELS = (
+        'Ability', 'Background', 'Class', 'Feature', 'Language', 'Maneuver', 'Monster', 'MonsterType', 'Race',
+        'RuleBook', 'Skill', 'Spell', 'SpellSchool', 'Subclass', 'Subrace', 'Tool',
+    )
+    # Many-to-many fields serialized by catalogue API
+    RELATIONS = (
+        ('Background', 'skills_proficiency'), ('Background', 'tools_proficiency'), ('Class', 'saving_trows'),
+        ('Class', 'skills_proficiency'), ('Monster', 'language'), ('Race', 'languages'), ('Spell', 'classes'),
+    )
+
+    version = models.PositiveIntegerField(default=1)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        default_permissions = ()
+        verbose_name = 'Версия правил'
+        verbose_name_plural = 'Версии правил'
+
+    def __str__(self):
+        return f'v{self.version}'
+
+    @classmethod
+    def current(cls):
+        obj, _ = cls.objects.get_or_create(id=1)
+        return obj
+
+    @classmethod
+    def bump(cls):
+        if not cls.objects.filter(id=1).update(version=models.F('version') + 1, updated=timezone.now()):
+            cls.objects.get_or_create(id=1)
\ No newline at end of file
@@ -1,14 +1,41 @@
 from django.contrib.contenttypes.fields import GenericRelation
 from django.db import models
-from django.utils.safestring import mark_safe
 
 from markdownx.models import MarkdownxField
-from markdownx.utils import markdownify
 
-from dnd5e.model_fields import CostField, DiceField
+from dnd5e import markdown
+from dnd5e.model_fields import Coins, CostField, DiceField
 from dnd5e.models.choices import DAMAGE_TYPES
 
 
+class PricedQuerySet(models.QuerySet):
+    """ Price queries use indexed cost in copper, cost strings are not parsed """
+
+    @staticmethod
+    def _copper(value):
+        return value.in_copper if isinstance(value, Coins) else value
+
+    def price_between(self, minimum=None, maximum=None):
+        """ Bounds are Coins or copper amounts, objects without cost are excluded by any bound """
+        queryset = self
+        if minimum is not None:
+            queryset = queryset.filter(cost_copper__gte=self._copper(minimum))
+        if maximum is not None:
+            queryset = queryset.filter(cost_copper__lte=self._copper(maximum))
+
+        return queryset
+
+    def by_price(self, descending=False):
+        price = models.F('cost_copper')
+        return self.order_by(price.desc(nulls_last=True) if descending else price.asc(nulls_last=True), 'name')
+
+
+def cost_copper_field():
+    return models.PositiveIntegerField(
+        null=True, default=None, editable=False, db_index=True, verbose_name='Стоимость в медных монетах'
+    )
+
+
 class Tool(models.Model):
     CAT_REGULAR = 0
     CAT_ARTISANS = 5
@@ -27,8 +54,11 @@ class Tool(models.Model):
     name = models.CharField(max_length=64)
     category = models.PositiveSmallIntegerField(default=CAT_REGULAR, choices=CATEGORIES)
     cost = CostField(verbose_name='Стоимость')
+    cost_copper = cost_copper_field()
     description = models.TextField(verbose_name='Описание', blank=True)
 
+    objects = PricedQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
         default_permissions = ()
@@ -116,9 +146,12 @@ class Weapon(models.Model):
     dmg_type = models.CharField(max_length=12, verbose_name='Тип урона', choices=DAMAGE_TYPES)
     dmg_dice = DiceField(verbose_name='Урон')
     cost = CostField(blank=True)
+    cost_copper = cost_copper_field()
     weight = models.PositiveSmallIntegerField(null=True, default=None)
     # TODO Add weapon tag
 
+    objects = PricedQuerySet.as_manager()
+
     class Meta:
         default_permissions = ()
         ordering = ['name']
@@ -155,6 +188,7 @@ class Item(models.Model):
     rarity = models.PositiveSmallIntegerField(choices=RARITY_CHOICES)
     need_attunement = models.BooleanField(verbose_name='Требуется подстройка', default=False)
     cost = CostField(verbose_name='Стоимость', default=None, null=True, blank=True)
+    cost_copper = cost_copper_field()
 
     source = models.ForeignKey(
         'RuleBook', verbose_name='Источник', on_delete=models.CASCADE,
@@ -164,6 +198,8 @@ class Item(models.Model):
         'Adventure', verbose_name='Приключение', on_delete=models.CASCADE, null=True, blank=True, related_name='+'
     )
 
+    objects = PricedQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
         default_permissions = ()
@@ -172,7 +208,7 @@ class Item(models.Model):
 
     @property
     def get_description(self):
-        return mark_safe(markdownify(self.description))
+        return markdown.render(self.description)
 
     def __repr__(self):
         return f'[{self.__class__.__name__}]: {self.name}'
@@ -187,8 +223,11 @@ class Item(models.Model):
 class Stuff(models.Model):
     name = models.CharField(max_length=64)
     cost = CostField(verbose_name='Стоимость')
+    cost_copper = cost_copper_field()
     treasure = GenericRelation('Treasure', object_id_field='what_id', content_type_field='what_ct')
 
+    objects = PricedQuerySet.as_manager()
+
     class Meta:
         default_permissions = ()
         verbose_name = 'Вещь'
@@ -1,7 +1,6 @@
 from django.db import models
 
-from multiselectfield import MultiSelectField
-
+from dnd5e.model_fields import BitmaskField, DiceField
 from dnd5e.models.choices import ALIGNMENT_CHOICES, CONDITIONS, DAMAGE_TYPES, SIZE_CHOICES
 
 from .common import Language, RuleBook, Sense
@@ -25,6 +24,12 @@ class MonsterType(models.Model):
         return f'{self.name} ({self.orig_name})'
 
 
+class MonsterQuerySet(models.QuerySet):
+    def wrong_hit_points(self):
+        """ Monsters with hit points different from average of their hit dice, compared in database """
+        return self.filter(hit_dice__isnull=False).exclude(hit_points=models.functions.Floor('hit_dice__average'))
+
+
 class Monster(models.Model):
     CHALENGE_CHOICES = (
         (10, '0'),
@@ -65,7 +70,7 @@ class Monster(models.Model):
     )
     armor_class = models.PositiveSmallIntegerField(verbose_name='Класс брони')
     hit_points = models.PositiveIntegerField(verbose_name='Очки здоровья')
-    hit_dice = models.CharField(null=True, default=None, max_length=8)
+    hit_dice = DiceField(null=True, default=None, blank=True, verbose_name='Кости здоровья')
     speed = models.PositiveSmallIntegerField(verbose_name='Скорость')
     strength = models.PositiveSmallIntegerField(verbose_name='Сила')
     dexterity = models.PositiveSmallIntegerField(verbose_name='Ловкость')
@@ -78,15 +83,11 @@ class Monster(models.Model):
     challenge = models.PositiveIntegerField(verbose_name='Опастность', choices=CHALENGE_CHOICES)
     description = models.TextField(blank=True, verbose_name='Описание')
 
-    damage_immunity = MultiSelectField(
-        verbose_name='Иммунитет к урону', blank=True, null=True, default=None, choices=DAMAGE_TYPES, max_length=56
-    )
-    damage_vuln = MultiSelectField(
-        verbose_name='Уязвимость к урону', blank=True, null=True, default=None, choices=DAMAGE_TYPES, max_length=56
-    )
-    condition_immunity = MultiSelectField(
-        verbose_name='Иммунитет к состоянию', blank=True, null=True, default=None, choices=CONDITIONS, max_length=56
-    )
+    damage_immunity = BitmaskField(verbose_name='Иммунитет к урону', blank=True, flags=DAMAGE_TYPES)
+    damage_vuln = BitmaskField(verbose_name='Уязвимость к урону', blank=True, flags=DAMAGE_TYPES)
+    condition_immunity = BitmaskField(verbose_name='Иммунитет к состоянию', blank=True, flags=CONDITIONS)
+
+    objects = MonsterQuerySet.as_manager()
 
     class Meta:
         default_permissions = ()
@@ -1,10 +1,11 @@
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models.functions import Cast, RowNumber
 
 from gm2m import GM2MField
 
-from dnd5e import dnd
+from dnd5e import dnd, spellcasting
 from dnd5e.model_fields import DiceField
 from dnd5e.models.adventure import Adventure, Party
 from dnd5e.models.base import (
@@ -42,6 +43,9 @@ class Character(models.Model):
         Background, on_delete=models.CASCADE, related_name='+', verbose_name='Предыстория'
     )
     dead = models.BooleanField(verbose_name='Мертв', default=False, editable=False)
+    armor_class = models.PositiveSmallIntegerField(verbose_name='Класс доспеха', default=10)
+    hit_points = models.PositiveSmallIntegerField(verbose_name='Максимум хитов', default=0)
+    current_hp = models.SmallIntegerField(verbose_name='Текущие хиты', null=True, blank=True, default=None)
     languages = models.ManyToManyField('Language', related_name='+', verbose_name='Владение языками', editable=False)
     armor_proficiency = models.ManyToManyField(
         ArmorCategory, related_name='+', verbose_name='Владение доспехами', blank=True
@@ -136,8 +140,10 @@ class Character(models.Model):
         # Create dices
         CharacterDice.objects.create(character=self, dice=klass.hit_dice)
 
+        self.hit_points = self.compute_hit_points()
+
         self.spellcasting_rules = klass.codename
-        self.save(update_fields=['spellcasting_rules'])  # FIXME seems dont need this field
+        self.save(update_fields=['spellcasting_rules', 'hit_points'])  # FIXME seems dont need this field
 
     def init_new_multiclass(self, klass):  # TODO transaction???
         char_class = CharacterClass.objects.create(
@@ -160,6 +166,18 @@ class Character(models.Model):
         for choice in profs.filter(content_type__app_label='dnd5e', content_type__model='advancmentchoice'):
             CharacterAdvancmentChoice.objects.create(character=self, choice=choice.proficiency)
 
+    def compute_hit_points(self):
+        """ Maximum hit points of all class levels, first taken class gives maximum of its die at 1st level """
+        class_dice = self.classes.order_by('id').values_list('klass__hit_dice__sides', 'level')
+        constitution = self.abilities.filter(ability__orig_name='Constitution').values_list('value', flat=True).first()
+
+        return dnd.max_hit_points(class_dice, constitution or 10)
+
+    def update_hit_points(self):
+        """ Call after class levels or constitution change """
+        self.hit_points = self.compute_hit_points()
+        self.save(update_fields=['hit_points'])
+
     def get_all_abilities(self):
         return self.abilities.values(
             'value', name=models.functions.Lower(models.F('ability__orig_name'))
@@ -223,8 +241,14 @@ class CharacterClass(models.Model):
 
     @property
     def spellcasting(self):
-        spellcasting = dnd.SPELLCASTING.get(self.subclass.codename) if self.subclass_id else None
-        return spellcasting or dnd.SPELLCASTING.get(self.klass.orig_name.lower())
+        """ Compiled spellcasting progression, resolved once per instance """
+        key = (self.klass_id, self.subclass_id)
+        if getattr(self, '_spellcasting', (None, ))[0] != key:
+            self._spellcasting = (key, spellcasting.progression(
+                self.klass.orig_name, self.subclass.codename if self.subclass_id else None
+            ))
+
+        return self._spellcasting[1]
 
     @property
     def current_spellcasting(self):
@@ -232,19 +256,30 @@ class CharacterClass(models.Model):
             return self.spellcasting[self.level]
 
     def update_spellslots(self, level):
-        spellslots = self.spellcasting[level]['slots']
+        """ Create missing slots of character with this class at given level, multiclass slots table included """
+        others = CharacterClass.objects.filter(character_id=self.character_id).exclude(id=self.id).values_list(
+            'klass__orig_name', 'subclass__codename', 'level'
+        )
+        classes = [(spellcasting.progression(name, codename), lvl) for name, codename, lvl in others]
+        spellslots = spellcasting.compute(classes + [(self.spellcasting, level)]).slots
 
-        aggregations = {}
-        for level, _ in enumerate(spellslots, 1):
-            aggregations[f'spellslot_{level}'] = models.Count('id', filter=models.Q(level=level))
-        char_spellslots = CharacterSpellSlot.objects.filter(character_id=self.character_id).aggregate(**aggregations)
+        char_spellslots = dict(
+            CharacterSpellSlot.objects.filter(character_id=self.character_id).order_by().values('level').annotate(
+                count=models.Count('id')
+            ).values_list('level', 'count')
+        )
 
         to_create = []
-        spellcasting = [(lvl, slots - char_spellslots[f'spellslot_{lvl}']) for lvl, slots in enumerate(spellslots, 1)]
-        for lvl, count in spellcasting:
+        for lvl, slots in enumerate(spellslots, 1):
+            count = slots - char_spellslots.get(lvl, 0)
             to_create.extend([CharacterSpellSlot(character_id=self.character_id, level=lvl) for _ in range(count)])
 
-        _ = CharacterSpellSlot.objects.bulk_create(to_create)
+        created = CharacterSpellSlot.objects.bulk_create(to_create)
+
+        # Bulk create doesn't send signals
+        from dnd5e import sync
+
+        sync.record(self.character.adventure_id, 'characterspellslot', created)
 
     def level_up(self):
         self._apply_class_advantages(self.level + 1)
@@ -257,16 +292,15 @@ class CharacterClass(models.Model):
         if self.spellcasting:
             self.update_spellslots(self.level + 1)
 
-            # Add new spells and cantrips, if need
-            current_cantrips = self.current_spellcasting.get('cantrips')
-            if current_cantrips and current_cantrips < self.spellcasting[self.level + 1]['cantrips']:
+            # Add new spells and cantrips, if need. Class taken by multiclass starts from level 0 without spells
+            current, upcoming = self.current_spellcasting, self.spellcasting[self.level + 1]
+            if current['cantrips'] < upcoming['cantrips']:
                 CharacterAdvancmentChoice.objects.create(
                     character_id=self.character_id, reason=self,
                     choice=AdvancmentChoice.objects.get(code='CHAR_CANTRIPS_APPEND')
                 )
 
-            current_spells = self.current_spellcasting.get('spells')
-            if current_spells and current_spells < self.spellcasting[self.level + 1]['spells']:
+            if current.get('spells', 0) < upcoming.get('spells', 0):
                 CharacterAdvancmentChoice.objects.create(
                     character_id=self.character_id, reason=self,
                     choice=AdvancmentChoice.objects.get(code='CHAR_SPELLS_APPEND')
@@ -283,6 +317,8 @@ class CharacterClass(models.Model):
         self.level = models.F('level') + 1
         self.save(update_fields=['level'])
 
+        self.character.update_hit_points()
+
     def __repr__(self):
         return f'[{self.__class__.__name__}]: {self.id}'
 
@@ -349,26 +385,9 @@ class CharacterAbilities(models.Model):
         return f'[{self.__class__.__name__}]: {self.id}'
 
 
-class CharacterSkillQueryset(models.QuerySet):
-    def annotate_mod(self):
-        abilities_queryset = CharacterAbilities.objects.filter(
-            character_id=models.OuterRef('character_id'), ability_id=models.OuterRef('skill__ability_id')
-        )
-        mod_expression = models.functions.Floor((models.F('raw_value') - 10) / 2.0)
-        return self.annotate(
-            raw_value=models.Subquery(abilities_queryset.values('value')[:1], output_field=models.SmallIntegerField()),
-            mod=models.Case(
-                models.When(proficiency=True, competence=True, then=mod_expression + models.F('character__proficiency') * 2),
-                models.When(proficiency=True, then=mod_expression + models.F('character__proficiency')),
-                default=mod_expression,
-                output_field=models.SmallIntegerField()
-            ),
-        )
-
-
 class CharacterSkillManager(models.Manager):
     def get_queryset(self):
-        return CharacterSkillQueryset(self.model, using=self._db, hints=self._hints).select_related('skill')
+        return super().get_queryset().select_related('skill')
 
 
 class CharacterSkill(models.Model):
@@ -415,11 +434,29 @@ class CharacterFeature(models.Model):
 
 
 class CharacterAdvancmentChoiceQueryset(models.QuerySet):
-    def aggregate_blocking_choices(self):
-        return self.aggregate(
-            blocking_choices=models.Count('id', filter=models.Q(choice__important=True)),
-            total_choices=models.Count('id'),
+    def pending(self):
+        """ Choices in resolution order, with per character position and blocking flag computed by window functions """
+        by_character = [models.F('character_id')]
+
+        return self.select_related('choice').annotate(
+            has_important=models.Window(
+                models.Max(Cast('important', output_field=models.IntegerField())), partition_by=by_character
+            ),
+            position=models.Window(
+                RowNumber(), partition_by=by_character, order_by=[models.F('important').desc(), 'choice__name', 'id']
+            ),
+        ).order_by('character_id', '-important', 'choice__name', 'id')
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """ pre_save is not sent for bulk created objects, so importance is copied from choices here """
+        objs = list(objs)
+        importance = dict(
+            AdvancmentChoice.objects.filter(id__in={obj.choice_id for obj in objs}).values_list('id', 'important')
         )
+        for obj in objs:
+            obj.important = importance.get(obj.choice_id, False)
+
+        return super().bulk_create(objs, *args, **kwargs)
 
 
 class CharacterAdvancmentChoice(models.Model):
@@ -435,11 +472,13 @@ class CharacterAdvancmentChoice(models.Model):
     )
     reason_object_id = models.PositiveIntegerField(editable=False, null=True, default=None)
     reason = GenericForeignKey('reason_content_type', 'reason_object_id')
+    important = models.BooleanField(default=False, editable=False)  # Copy of choice.important
 
     objects = CharacterAdvancmentChoiceQueryset.as_manager()
 
     class Meta:
-        ordering = ['character', '-choice__important', 'choice__name']
+        ordering = ['character', '-important', 'choice__name']
+        indexes = [models.Index(fields=['character', 'important'], name='dnd5e_charchoice_important')]
         default_permissions = ()
         verbose_name = 'Выбор персонажа'
         verbose_name_plural = 'Выборы персонажа'
@@ -447,6 +486,24 @@ class CharacterAdvancmentChoice(models.Model):
     def __repr__(self):
         return f'[{self.__class__.__name__}]: {self.id}'
 
+    @property
+    def blocked(self):
+        """ Not important choice can't be made while character has important ones. Needs pending() queryset """
+        return not self.important and bool(self.has_important)
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'character': self.character_id,
+            'code': self.choice.code,
+            'name': self.choice.name,
+            'text': self.choice.text,
+            'important': self.important,
+            'rejectable': self.choice.rejectable,
+            'position': self.position,
+            'blocked': self.blocked,
+        }
+
     def __str__(self):
         return f'Выбор персонажа #{self.character_id}'
 
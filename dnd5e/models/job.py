@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+from django.utils import timezone
+
+USER_MODEL = get_user_model()
+
+
+class Job(models.Model):
+    STATUS_QUEUED = 0
+    STATUS_RUNNING = 10
+    STATUS_DONE = 20
+    STATUS_FAILED = 30
+
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Выполнено'),
+        (STATUS_FAILED, 'Ошибка'),
+    )
+
+    QUEUE_INTERACTIVE = 'interactive'
+    QUEUE_BULK = 'bulk'
+
+    QUEUE_CHOICES = (
+        (QUEUE_INTERACTIVE, 'Интерактивные'),
+        (QUEUE_BULK, 'Массовые'),
+    )
+
+    name = models.CharField(max_length=64, verbose_name='Задача')
+    kwargs = models.JSONField(default=dict, blank=True)
+    queue = models.CharField(max_length=16, choices=QUEUE_CHOICES, default=QUEUE_INTERACTIVE)
+    status = models.PositiveSmallIntegerField(choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    owner = models.ForeignKey(
+        USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, default=None, related_name='+'
+    )
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    progress = models.PositiveIntegerField(default=0)
+    progress_total = models.PositiveIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True, default=None)
+    error = models.TextField(blank=True)
+
+    worker = models.CharField(max_length=64, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    started = models.DateTimeField(null=True, blank=True, default=None)
+    finished = models.DateTimeField(null=True, blank=True, default=None)
+
+    class Meta:
+        ordering = ['-created']
+        default_permissions = ()
+        indexes = [models.Index(fields=['status', 'queue', 'run_after'], name='dnd5e_job_pending_idx')]
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    def as_dict(self):
+        return {
+            'id': self.id, 'name': self.name, 'status': self.get_status_display(), 'finished': self.is_finished,
+            'failed': self.status == self.STATUS_FAILED, 'progress': self.progress, 'total': self.progress_total,
+            'attempts': self.attempts, 'result': self.result,
+        }
+
+    def __repr__(self):
+        return f'[{self.__class__.__name__}]: {self.id}'
+
+    def __str__(self):
+        return f'{self.name} #{self.id}'
\ No newline at end of file
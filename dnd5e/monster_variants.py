@@ -0,0 +1,182 @@
+from array import array
+from math import floor
+
+from django.db import models, transaction
+from django.utils.text import slugify
+
+from dnd5e import dnd, lookup
+from dnd5e.model_fields import Dice
+from dnd5e.models import Monster, MonsterAction, MonsterSense, MonsterSkill, MonsterTrait
+from dnd5e.signals import bump_rules_version
+
+ABILITIES = ('strength', 'dexterity', 'constitution', 'intelligence', 'wisdom', 'charisma')
+STATS = ('armor_class', 'hit_points', 'passive_perception', 'challenge') + ABILITIES
+
+CHALLENGES = [xp for xp, _ in Monster.CHALENGE_CHOICES]
+CHALLENGE_LABELS = dict(Monster.CHALENGE_CHOICES)
+
+MAX_ABILITY = 30
+
+# Copied as is to variants, stats and identity are set separately
+SKIPPED_FIELDS = frozenset(('id', 'name', 'orig_name', 'slug', 'adventure_only', 'hit_dice') + STATS)
+
+# Related rows copied to variants with bulk inserts
+RELATED_MODELS = (MonsterTrait, MonsterAction, MonsterSense, MonsterSkill)
+
+
+def _column(values):
+    return array('i', values)
+
+
+class StatBlocks:
+    """ Stat blocks of many monsters as columns, every scaling rule is one pass over whole columns """
+
+    def __init__(self, ids, columns, hit_dice, sizes, proficiency=None, changed=None):
+        self.ids = ids
+        self.columns = columns  # {stat: array of values in order of ids}
+        self.hit_dice = hit_dice  # [Dice or None]
+        self.sizes = sizes
+        self.proficiency = proficiency  # Change of proficiency bonus by scaling
+        self.changed = changed  # Challenge is changed, it's not if scaled beyond known challenges
+
+    @classmethod
+    def from_monsters(cls, monsters):
+        return cls(
+            [monster.id for monster in monsters],
+            {stat: _column(getattr(monster, stat) for monster in monsters) for stat in STATS},
+            [monster.hit_dice for monster in monsters], [monster.size for monster in monsters],
+        )
+
+    def _hit_dice(self, hit_points, constitution):
+        """ Dice of monster size (or of source hit dice) with average closest to hit points """
+        dice = []
+        for hp, con, source, size in zip(hit_points, constitution, self.hit_dice, self.sizes):
+            sides = source.dice if source else dnd.HIT_DICE_BY_SIZE[size]
+            mod = dnd.dnd_mod(con)
+            count = max(1, round(hp / max(1, (sides + 1) / 2 + mod)))
+            dice.append(Dice.from_parts(count, sides, count * mod))
+
+        return dice
+
+    def scaled(self, shift):
+        """ Stat blocks moved by given number of challenge rows, clamped to known challenges """
+        columns = self.columns
+        source = [CHALLENGES.index(xp) for xp in columns['challenge']]
+        target = [min(max(num + shift, 0), len(CHALLENGES) - 1) for num in source]
+
+        old_stats = [dnd.MONSTER_STATS[CHALLENGES[num]] for num in source]
+        new_stats = [dnd.MONSTER_STATS[CHALLENGES[num]] for num in target]
+        proficiency = [new[0] - old[0] for old, new in zip(old_stats, new_stats)]
+
+        scaled = {'challenge': _column(CHALLENGES[num] for num in target)}
+        for ability in ABILITIES:
+            scaled[ability] = _column(
+                min(max(value + 2 * delta, 1), MAX_ABILITY) for value, delta in zip(columns[ability], proficiency)
+            )
+
+        scaled['armor_class'] = _column(
+            max(value + new[1] - old[1], 1) for value, old, new in zip(columns['armor_class'], old_stats, new_stats)
+        )
+        scaled['passive_perception'] = _column(
+            max(value + dnd.dnd_mod(new) - dnd.dnd_mod(old), 1)
+            for value, old, new in zip(columns['passive_perception'], columns['wisdom'], scaled['wisdom'])
+        )
+
+        # Hit points keep their place inside challenge hit points range, then are rounded to whole hit dice
+        wanted = [
+            round(hp * (new[2] + new[3]) / (old[2] + old[3]))
+            for hp, old, new in zip(columns['hit_points'], old_stats, new_stats)
+        ]
+        hit_dice = self._hit_dice(wanted, scaled['constitution'])
+        scaled['hit_points'] = _column(max(floor(dice.average), 1) for dice in hit_dice)
+
+        return StatBlocks(
+            self.ids, scaled, hit_dice, self.sizes, proficiency, [old != new for old, new in zip(source, target)]
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _variant_names(monster, challenge):
+    label = CHALLENGE_LABELS[challenge]
+
+    return f'{monster.name} (ОП {label})'[:60], f'{monster.orig_name} (CR {label})'[:60]
+
+
+def create_variants(monster_ids, adventure, steps=(1, )):
+    """ Adventure only copies of monsters for every challenge shift in steps, created with bulk queries """
+    monsters = list(Monster.objects.filter(id__in=monster_ids).order_by('id'))
+    blocks = StatBlocks.from_monsters(monsters)
+    fields = [field for field in Monster._meta.concrete_fields if field.name not in SKIPPED_FIELDS]
+    suffix = f' #{adventure.id}'
+
+    planned = []  # [(source monster, scaled stat blocks, position in blocks, name, orig name)]
+    for shift in steps:
+        scaled = blocks.scaled(shift)
+        planned.extend(
+            (monster, scaled, num, *_variant_names(monster, scaled.columns['challenge'][num]))
+            for num, monster in enumerate(monsters) if scaled.changed[num]
+        )
+
+    # Names are unique, variants already made for adventure are skipped, names used elsewhere get adventure suffix
+    existing = Monster.objects.filter(
+        models.Q(name__in=[plan[3] for plan in planned]) | models.Q(orig_name__in=[plan[4] for plan in planned])
+    ).values_list('name', 'orig_name', 'adventure_only')
+    own = {name.removesuffix(suffix) for name, _, owner in existing if owner == adventure.id}
+    taken = {value for name, orig_name, owner in existing if owner != adventure.id for value in (name, orig_name)}
+
+    variants = []
+    sources = []
+    for monster, scaled, num, name, orig_name in planned:
+        if name in own:
+            continue
+        own.add(name)
+
+        if name in taken or orig_name in taken:
+            name, orig_name = name + suffix, orig_name + suffix
+
+        variants.append(Monster(
+            name=name, orig_name=orig_name, slug=slugify(orig_name), adventure_only=adventure,
+            hit_dice=scaled.hit_dice[num], **{field.attname: getattr(monster, field.attname) for field in fields},
+            **{stat: scaled.columns[stat][num] for stat in STATS},
+        ))
+        sources.append((monster.id, scaled.proficiency[num]))
+
+    with transaction.atomic():
+        Monster.objects.bulk_create(variants)
+        _copy_related(variants, sources)
+
+        # Bulk create doesn't send signals
+        bump_rules_version(Monster)
+        lookup.invalidate('monster')
+
+    return variants
+
+
+def _copy_related(variants, sources):
+    copies = {}  # {source id: [(variant id, proficiency change)]}
+    for variant, (source_id, proficiency) in zip(variants, sources):
+        copies.setdefault(source_id, []).append((variant.id, proficiency))
+
+    for model in RELATED_MODELS:
+        attnames = [field.attname for field in model._meta.concrete_fields if not field.primary_key]
+        rows = model.objects.filter(monster_id__in=copies).order_by().values(*attnames)
+
+        objects = []
+        for row in rows:
+            for variant_id, proficiency in copies[row['monster_id']]:
+                obj = model(**dict(row, monster_id=variant_id))
+                if model is MonsterSkill:
+                    obj.value += proficiency
+                objects.append(obj)
+        model.objects.bulk_create(objects)
+
+    through = Monster.language.through
+    through.objects.bulk_create([
+        through(monster_id=variant_id, language_id=language_id)
+        for source_id, language_id in through.objects.filter(monster_id__in=copies).values_list(
+            'monster_id', 'language_id'
+        )
+        for variant_id, _ in copies[source_id]
+    ])
\ No newline at end of file
@@ -0,0 +1,151 @@
+import math
+from collections import defaultdict, deque
+
+from django.core.cache import cache
+from django.db import transaction
+
+CACHE_PREFIX = 'dnd5e:npc:graph'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+# Changes of these models invalidate adventure graph
+GRAPH_MODELS = ('NPC', 'NPCRelation')
+
+# Spouses, parents, children and siblings
+FAMILY_RELATIONS = frozenset((2, 3, 4, 5, 6, 7, 12, 13))
+
+DIAGRAM_SIZE = 600
+DIAGRAM_RING = 120
+
+
+def _key(adventure_id):
+    return f'{CACHE_PREFIX}:{adventure_id}'
+
+
+class NPCGraph:
+    """ Relations of adventure NPCs as adjacency lists, walked in both directions """
+
+    def __init__(self, names, edges):
+        self.names = names  # {npc id: name} of NPCs having relations
+        self.edges = edges  # {npc id: [(other id, relation, outgoing)]}
+
+    @classmethod
+    def build(cls, adventure_id):
+        from dnd5e.models import NPCRelation
+
+        names = {}
+        edges = defaultdict(list)
+        relations = NPCRelation.objects.filter(npc__adventure_id=adventure_id).order_by('id').values_list(
+            'npc_id', 'other_id', 'relation', 'npc__name', 'other__name'
+        )
+        for npc_id, other_id, relation, npc_name, other_name in relations:
+            names[npc_id], names[other_id] = npc_name, other_name
+            edges[npc_id].append((other_id, relation, True))
+            edges[other_id].append((npc_id, relation, False))
+
+        return cls(names, dict(edges))
+
+    def _walk(self, npc_id, depth=None, relations=None):
+        """ BFS from NPC, yields (npc id, distance, (parent id, relation, outgoing) or None for start NPC) """
+        parents = {npc_id: None}
+        queue = deque([(npc_id, 0)])
+
+        while queue:
+            current, distance = queue.popleft()
+            yield current, distance, parents[current]
+
+            if depth is not None and distance >= depth:
+                continue
+
+            for other_id, relation, outgoing in self.edges.get(current, ()):
+                if other_id in parents or (relations is not None and relation not in relations):
+                    continue
+                parents[other_id] = (current, relation, outgoing)
+                queue.append((other_id, distance + 1))
+
+    def neighbours(self, npc_id, depth=1, relations=None):
+        """ NPCs connected to given one within depth hops: {npc id: distance} """
+        return {other_id: distance for other_id, distance, _ in self._walk(npc_id, depth, relations) if distance}
+
+    def family(self, npc_id):
+        return self.neighbours(npc_id, depth=None, relations=FAMILY_RELATIONS)
+
+    def path(self, source, target):
+        """ Shortest chain of relations between two NPCs: [(npc id, relation, outgoing)], None if not connected """
+        parents = {}
+        for npc_id, _, parent in self._walk(source):
+            parents[npc_id] = parent
+            if npc_id == target:
+                break
+        else:
+            return None
+
+        chain = []
+        while parents[target] is not None:
+            parent_id, relation, outgoing = parents[target]
+            chain.append((target, relation, outgoing))
+            target = parent_id
+
+        return chain[::-1]
+
+    def diagram(self, npc_id, depth=2):
+        """ Radial layout of NPC neighbourhood: ring per distance, children placed near their parent """
+        from dnd5e.models import NPCRelation
+
+        labels = dict(NPCRelation.REL_CHOICES)
+        center = DIAGRAM_SIZE / 2
+        positions = {npc_id: (center, center)}
+        angles = {npc_id: 0}
+        rings = defaultdict(list)
+
+        for other_id, distance, parent in self._walk(npc_id, depth):
+            if distance:
+                rings[distance].append((parent[0], other_id))
+
+        # Parents are one ring closer, so their angles are already known when ring is sorted
+        for distance, ring in sorted(rings.items()):
+            ring.sort(key=lambda item: (angles[item[0]], item[1]))
+            for num, (_, other_id) in enumerate(ring):
+                angle = 2 * math.pi * num / len(ring)
+                angles[other_id] = angle
+                positions[other_id] = (
+                    round(center + DIAGRAM_RING * distance * math.cos(angle), 1),
+                    round(center + DIAGRAM_RING * distance * math.sin(angle), 1),
+                )
+
+        nodes = [
+            {
+                'id': node_id, 'name': self.names.get(node_id, ''), 'x': x, 'y': y, 'text_y': y + 22,
+                'center': node_id == npc_id,
+            }
+            for node_id, (x, y) in positions.items()
+        ]
+        edges = [
+            {
+                'x1': positions[source][0], 'y1': positions[source][1],
+                'x2': positions[other_id][0], 'y2': positions[other_id][1],
+                'label': labels.get(relation, ''),
+                'lx': (positions[source][0] + positions[other_id][0]) / 2,
+                'ly': (positions[source][1] + positions[other_id][1]) / 2,
+            }
+            for source in positions
+            for other_id, relation, outgoing in self.edges.get(source, ())
+            if outgoing and other_id in positions
+        ]
+
+        return {'size': DIAGRAM_SIZE, 'nodes': nodes, 'edges': edges}
+
+
+def get_graph(adventure_id):
+    key = _key(adventure_id)
+    graph = cache.get(key)
+
+    if graph is None:
+        graph = NPCGraph.build(adventure_id)
+        cache.set(key, graph, CACHE_TIMEOUT)
+
+    return graph
+
+
+def invalidate(adventure_id):
+    key = _key(adventure_id)
+    transaction.on_commit(lambda: cache.delete(key))
\ No newline at end of file
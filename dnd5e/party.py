@@ -0,0 +1,106 @@
+from django.core.cache import cache
+from django.db import models, transaction
+
+from dnd5e.model_fields import Dice
+
+CACHE_PREFIX = 'dnd5e:party:member'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+# Changes of these models invalidate character snapshot
+SNAPSHOT_MODELS = (
+    'Character', 'CharacterAbilities', 'CharacterClass', 'CharacterDice', 'CharacterSkill', 'CharacterSpellSlot'
+)
+
+
+def _key(char_id):
+    return f'{CACHE_PREFIX}:{char_id}'
+
+
+def build_snapshots(character_ids):
+    """ Derived stats of many characters with a fixed number of queries, regardless of party size """
+    from dnd5e import spellcasting, stats
+    from dnd5e.models import Character, CharacterClass, CharacterDice, CharacterSpellSlot
+
+    snapshots = {
+        char['id']: dict(char, classes=[], dices=[], spell_slots=[])
+        for char in Character.objects.filter(id__in=character_ids).values(
+            'id', 'name', 'level', 'proficiency', 'armor_class', 'hit_points', 'current_hp', 'dead', 'party_id'
+        )
+    }
+
+    for char_id, char_spellcasting in spellcasting.for_characters(list(snapshots)).items():
+        snapshots[char_id]['caster_level'] = char_spellcasting.caster_level
+
+    for char_id, char_stats in stats.for_characters(list(snapshots)).items():
+        snapshots[char_id].update(
+            passives=char_stats.passives,
+            saving_trows=[
+                {'name': ability.name, 'mod': ability.saving_trow_mod, 'proficiency': ability.saving_trow_proficiency}
+                for ability in char_stats.abilities
+            ],
+        )
+
+    classes = CharacterClass.objects.filter(character_id__in=snapshots).order_by('-level').values_list(
+        'character_id', 'klass__name', 'subclass__name', 'level'
+    )
+    for char_id, klass, subclass, level in classes:
+        snapshots[char_id]['classes'].append({'name': klass, 'subclass': subclass, 'level': level})
+
+    dices = CharacterDice.objects.filter(character_id__in=snapshots).order_by('dtype', 'dice').values_list(
+        'character_id', 'dtype', 'dice', 'count', 'maximum'
+    )
+    for char_id, dtype, dice, count, maximum in dices:
+        snapshots[char_id]['dices'].append({
+            'dtype': dtype, 'dice': str(Dice.unpack(dice)), 'count': count, 'maximum': maximum
+        })
+
+    slots = CharacterSpellSlot.objects.filter(character_id__in=snapshots).order_by().values(
+        'character_id', 'level'
+    ).annotate(
+        total=models.Count('id'), available=models.Count('id', filter=models.Q(spent=False))
+    ).order_by('character_id', 'level')
+    for slot in slots:
+        snapshots[slot.pop('character_id')]['spell_slots'].append(slot)
+
+    for snapshot in snapshots.values():
+        snapshot['current_hp'] = _current_hp(snapshot)
+
+    return snapshots
+
+
+def get_snapshots(character_ids):
+    """ Cached member snapshots, only missing or invalidated ones are rebuilt """
+    character_ids = list(character_ids)
+    cached = cache.get_many([_key(char_id) for char_id in character_ids])
+    snapshots = {char_id: cached[_key(char_id)] for char_id in character_ids if _key(char_id) in cached}
+
+    missing = [char_id for char_id in character_ids if char_id not in snapshots]
+    if missing:
+        built = build_snapshots(missing)
+        cache.set_many({_key(char_id): snapshot for char_id, snapshot in built.items()}, CACHE_TIMEOUT)
+        snapshots.update(built)
+
+    return [snapshots[char_id] for char_id in character_ids if char_id in snapshots]
+
+
+def invalidate(character_ids):
+    """ Drop snapshots after commit, so concurrent request can't cache uncommitted state """
+    keys = [_key(char_id) for char_id in character_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _current_hp(member):
+    """ Not set current hit points mean unharmed character """
+    return member['hit_points'] if member['current_hp'] is None else member['current_hp']
+
+
+def party_overview(party):
+    members = get_snapshots(party.members.values_list('id', flat=True))
+
+    return {
+        'id': party.id,
+        'name': party.name,
+        'members': members,
+        'hit_points': sum(member['hit_points'] for member in members),
+        'current_hp': sum(_current_hp(member) for member in members),
+    }
\ No newline at end of file
@@ -1,11 +1,151 @@
+from django.core.exceptions import ValidationError
 from django.utils.text import slugify
 
+from dnd5e import encounters, facets, knowledge, lookup, maps, markdown, npc_graph, party, spell_index
+
+# Models with cost copied to indexed copper column for price queries
+COST_MODELS = ('Item', 'Stuff', 'Tool', 'Weapon')
+
 
 def update_slug(sender, instance, **kwargs):
     if instance.orig_name:
         instance.slug = slugify(instance.orig_name)
 
 
+def update_cost_copper(sender, instance, **kwargs):
+    if instance.cost in (None, ''):
+        instance.cost_copper = None
+        return
+
+    try:
+        instance.cost_copper = instance._meta.get_field('cost').to_python(instance.cost).in_copper
+    except ValidationError:
+        instance.cost_copper = None
+
+
 def set_monster_hp(sender, instance, **kwargs):
     if instance.current_hp is None:
-        instance.current_hp = instance.monster.hit_points
\ No newline at end of file
+        instance.current_hp = instance.monster.hit_points
+
+
+def set_choice_importance(sender, instance, **kwargs):
+    instance.important = instance.choice.important
+
+
+def sync_choice_importance(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+
+    from dnd5e.models import CharacterAdvancmentChoice
+
+    CharacterAdvancmentChoice.objects.filter(choice=instance).exclude(important=instance.important).update(
+        important=instance.important
+    )
+
+
+def render_description(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    markdown.render(instance.description)
+
+
+def process_map_image(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+
+    if instance.tiles_version != maps.map_version(instance):
+        maps.schedule_processing(instance)
+
+
+def invalidate_party_member(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    party.invalidate([instance.id if sender._meta.model_name == 'character' else instance.character_id])
+
+
+def bump_rules_version(sender, raw=False, action=None, **kwargs):
+    # m2m_changed is sent before and after every change
+    if raw or (action is not None and action.startswith('pre_')):
+        return
+
+    from dnd5e.models import RulesVersion
+
+    RulesVersion.bump()
+    spell_index.invalidate()
+    facets.invalidate()
+    encounters.invalidate_pool()
+
+
+def record_adventure_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+
+    from dnd5e import sync
+
+    sync.record_instance(instance, update_fields)
+
+
+def record_adventure_delete(sender, instance, origin=None, **kwargs):
+    from dnd5e import sync
+    from dnd5e.models import Adventure
+
+    # Objects deleted with their adventure: change log is deleted too, so there is nothing to record
+    if isinstance(origin, Adventure) or getattr(origin, 'model', None) is Adventure:
+        return
+
+    sync.record_instance(instance, deleted=True)
+
+
+def invalidate_knowledge_index(sender, instance, raw=False, **kwargs):
+    # Only new objects change the index, post_delete has no created argument
+    if raw or kwargs.get('created') is False:
+        return
+
+    knowledge.invalidate_index(instance.adventure_id)
+
+
+def knowledge_links_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        knowledge.invalidate_index(instance.adventure_id)
+
+
+def invalidate_npc_graph(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    if sender._meta.model_name == 'npc':
+        npc_graph.invalidate(instance.adventure_id)
+        return
+
+    from dnd5e.models import NPC
+
+    adventure_id = NPC.objects.filter(id=instance.npc_id).values_list('adventure_id', flat=True).first()
+    if adventure_id is not None:
+        npc_graph.invalidate(adventure_id)
+
+
+def invalidate_encounters(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    for adventure_id in encounters.adventure_ids(instance):
+        encounters.invalidate(adventure_id)
+
+
+def encounter_traps_changed(sender, instance, action, **kwargs):
+    # Trap loses link to location on remove, so its adventures are found before that
+    if action in ('post_add', 'pre_remove', 'pre_clear'):
+        invalidate_encounters(sender, instance)
+
+
+def update_name_lookup(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    lookup.update(instance)
+
+
+def remove_name_lookup(sender, instance, **kwargs):
+    lookup.update(instance, deleted=True)
\ No newline at end of file
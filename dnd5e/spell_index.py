@@ -0,0 +1,69 @@
+import heapq
+from array import array
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import router, transaction
+
+CACHE_KEY = 'dnd5e:spells:index'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class SpellIndex:
+    """ Spells available to every class as arrays of ids per spell level, ordered by spell name """
+
+    def __init__(self, spells, by_class):
+        self.spells = spells  # {spell id: (name, orig name, level)}
+        self.rank = {spell_id: num for num, spell_id in enumerate(spells)}
+        # {(class id, spell level): array of spell ids}
+        self.by_class = {key: array('I', sorted(ids, key=self.rank.get)) for key, ids in by_class.items()}
+
+    @classmethod
+    def build(cls):
+        from dnd5e.models import Spell
+
+        spells = {
+            spell_id: (name, orig_name, level)
+            for spell_id, name, orig_name, level in Spell.objects.values_list('id', 'name', 'orig_name', 'level')
+        }
+
+        by_class = defaultdict(list)
+        for class_id, spell_id in Spell.classes.through.objects.values_list('class_id', 'spell_id'):
+            by_class[(class_id, spells[spell_id][2])].append(spell_id)
+
+        return cls(spells, by_class)
+
+    def available(self, class_id, levels, exclude=()):
+        """ Ids of class spells of given levels, minus excluded (e.g. known) ones, ordered by name """
+        merged = heapq.merge(*(self.by_class.get((class_id, level), ()) for level in levels), key=self.rank.get)
+
+        return [spell_id for spell_id in merged if spell_id not in exclude]
+
+    def ordered(self, spell_ids):
+        return sorted(spell_ids, key=self.rank.get)
+
+    def label(self, spell_id):
+        name, orig_name, _ = self.spells[spell_id]
+        return f'{name} ({orig_name})'
+
+    def spell(self, spell_id):
+        """ Spell with id and names loaded, other fields deferred. Enough to render it and to link it to character """
+        from dnd5e.models import Spell
+
+        return Spell.from_db(router.db_for_read(Spell), ['id', 'name', 'orig_name', 'level'], (
+            spell_id, *self.spells[spell_id]
+        ))
+
+
+def get_index():
+    index = cache.get(CACHE_KEY)
+
+    if index is None:
+        index = SpellIndex.build()
+        cache.set(CACHE_KEY, index, CACHE_TIMEOUT)
+
+    return index
+
+
+def invalidate():
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY))
\ No newline at end of file
@@ -0,0 +1,100 @@
+from collections import defaultdict, namedtuple
+
+from dnd5e import dnd
+
+MAX_LEVEL = 20
+SLOT_LEVELS = 9
+NO_SLOTS = (0, ) * SLOT_LEVELS
+
+# Class levels per one multiclass caster level
+CASTER_LEVEL_DIVISORS = {'full': 1, 'half': 2, 'third': 3}
+
+Spellcasting = namedtuple('Spellcasting', ['caster_level', 'slots', 'classes'])
+
+
+def _pad(slots):
+    return tuple(slots) + (0, ) * (SLOT_LEVELS - len(slots))
+
+
+class Progression:
+    """ dnd.SPELLCASTING table compiled to arrays indexed by class level, level 0 is a class not taken yet """
+
+    def __init__(self, name, table):
+        self.name = name
+        self.kind = dnd.CASTER_PROGRESSION.get(name, 'full')
+        self.replace = table.get('replace')
+        self.has_spells = any('spells' in row for level, row in table.items() if level != 'replace')
+
+        empty = {'cantrips': 0, 'spells': 0, 'slots': ()}
+        rows = [table.get(level, empty) for level in range(MAX_LEVEL + 1)]
+        self.cantrips = [row.get('cantrips', 0) for row in rows]
+        self.spells = [row.get('spells', 0) for row in rows]
+        self.slots = [_pad(row['slots']) for row in rows]
+        self.max_spell_level = [len(row['slots']) for row in rows]
+
+    def __getitem__(self, level):
+        """ Row in dnd.SPELLCASTING format, so progression can be used in place of raw table """
+        if level == 'replace':
+            if self.replace is None:
+                raise KeyError(level)
+            return self.replace
+
+        row = {'cantrips': self.cantrips[level], 'slots': self.slots[level][:self.max_spell_level[level]]}
+        if self.has_spells:
+            row['spells'] = self.spells[level]
+
+        return row
+
+    def get(self, key, default=None):
+        return self.replace if key == 'replace' and self.replace else default
+
+    def caster_level(self, level):
+        divisor = CASTER_LEVEL_DIVISORS.get(self.kind)
+        return level // divisor if divisor else 0
+
+    def __repr__(self):
+        return f'[{self.__class__.__name__}]: {self.name}'
+
+
+PROGRESSIONS = {name: Progression(name, table) for name, table in dnd.SPELLCASTING.items()}
+
+MULTICLASS_SLOTS = [NO_SLOTS] + [_pad(dnd.MULTICLASS_SLOTS[level]) for level in range(1, MAX_LEVEL + 1)]
+
+
+def progression(class_name, subclass_codename=None):
+    """ Subclass rules (e.g. arcane trickster) take precedence over class rules """
+    if subclass_codename and subclass_codename in PROGRESSIONS:
+        return PROGRESSIONS[subclass_codename]
+
+    return PROGRESSIONS.get(class_name.lower())
+
+
+def compute(classes):
+    """ Caster level and slots of character from [(progression or None, class level)] """
+    casters = [(rules, level) for rules, level in classes if rules is not None and level and rules.kind != 'pact']
+    caster_level = sum(rules.caster_level(level) for rules, level in casters)
+
+    if not casters:
+        slots = NO_SLOTS
+    elif len(casters) == 1:
+        # Single class uses its own table, e.g. paladin has slots from 2nd level
+        rules, level = casters[0]
+        slots = rules.slots[level]
+    else:
+        slots = MULTICLASS_SLOTS[min(caster_level, MAX_LEVEL)]
+
+    return Spellcasting(caster_level, slots, [(rules.name, level) for rules, level in casters])
+
+
+def for_characters(character_ids):
+    """ Spellcasting of many characters with a single query """
+    from dnd5e.models import CharacterClass
+
+    classes = defaultdict(list)
+    rows = CharacterClass.objects.filter(character_id__in=character_ids).order_by().values_list(
+        'character_id', 'klass__orig_name', 'subclass__codename', 'level'
+    )
+    for char_id, class_name, subclass_codename, level in rows:
+        classes[char_id].append((progression(class_name, subclass_codename), level))
+
+    return {char_id: compute(classes[char_id]) for char_id in character_ids}
\ No newline at end of file
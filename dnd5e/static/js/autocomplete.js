@@ -0,0 +1,42 @@
+"use strict";
+
+jQuery(function () {
+    const search_delay = 200;
+
+    function load_options (select, term) {
+        let params = {'q': term};
+        ['character', 'category'].forEach(function (name) {
+            const value = select.data('autocomplete-' + name);
+            if (value) { params[name] = value }
+        });
+
+        jQuery.getJSON(select.data('autocomplete-url'), params, function (data) {
+            // Keep selected options, they are sent with form
+            select.find('option:not(:selected)').remove();
+            const selected = new Set(select.find('option').map(function () { return this.value }).get());
+
+            data.results.forEach(function (item) {
+                if (!selected.has(String(item.id))) {
+                    select.append(jQuery('<option>').val(item.id).text(item.text));
+                }
+            });
+
+            if (select.hasClass('selectpicker')) { select.selectpicker('refresh') }
+        });
+    }
+
+    function init_autocomplete (select) {
+        const search = jQuery('<input type="search" class="form-control mb-1" placeholder="поиск">');
+        let timer = null;
+
+        search.on('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () { load_options(select, search.val()) }, search_delay);
+        });
+
+        select.before(search);
+        load_options(select, '');
+    }
+
+    jQuery('select[data-autocomplete-url]').each(function () { init_autocomplete(jQuery(this)) });
+});
\ No newline at end of file
@@ -0,0 +1,103 @@
+from collections import namedtuple
+
+from dnd5e import dnd
+from dnd5e.models import CharacterAbilities, CharacterSkill
+
+PASSIVE_BASE = 10
+PASSIVE_SKILLS = ('Perception', 'Insight', 'Investigation')
+
+AbilityScore = namedtuple(
+    'AbilityScore', ['ability_id', 'name', 'orig_name', 'value', 'mod', 'saving_trow_proficiency', 'saving_trow_mod']
+)
+SkillScore = namedtuple('SkillScore', ['skill_id', 'name', 'orig_name', 'ability_id', 'proficiency', 'competence', 'mod'])
+
+
+class CharacterStats:
+    def __init__(self, character_id, proficiency):
+        self.character_id = character_id
+        self.proficiency = proficiency
+        self.abilities = []
+        self.skills = []
+
+    def ability(self, orig_name):
+        for ability in self.abilities:
+            if ability.orig_name == orig_name:
+                return ability
+
+    def skill(self, orig_name):
+        for skill in self.skills:
+            if skill.orig_name == orig_name:
+                return skill
+
+    def passive(self, orig_name):
+        skill = self.skill(orig_name)
+        return PASSIVE_BASE + skill.mod if skill else None
+
+    @property
+    def passives(self):
+        return {name: self.passive(name) for name in PASSIVE_SKILLS}
+
+    @property
+    def passive_skills(self):
+        """ (skill, passive score) pairs for display """
+        return [(skill, PASSIVE_BASE + skill.mod) for skill in self.skills if skill.orig_name in PASSIVE_SKILLS]
+
+    def as_dict(self):
+        return {
+            'proficiency': self.proficiency,
+            'abilities': [ability._asdict() for ability in self.abilities],
+            'skills': [skill._asdict() for skill in self.skills],
+            'passives': self.passives,
+        }
+
+
+def skill_mod(ability_mod, proficiency_bonus, proficiency, competence):
+    if proficiency and competence:
+        return ability_mod + proficiency_bonus * 2
+
+    if proficiency:
+        return ability_mod + proficiency_bonus
+
+    return ability_mod
+
+
+def for_characters(character_ids):
+    """ Abilities and skills tables for many characters. Two flat queries, modifiers are computed in python """
+    stats = {}
+    ability_mods = {}
+
+    abilities = CharacterAbilities.objects.filter(character_id__in=character_ids).order_by(
+        'character_id', 'ability__name'
+    ).values_list(
+        'character_id', 'character__proficiency', 'ability_id', 'ability__name', 'ability__orig_name', 'value',
+        'saving_trow_proficiency'
+    )
+
+    for char_id, proficiency, ability_id, name, orig_name, value, saving_trow in abilities:
+        char_stats = stats.setdefault(char_id, CharacterStats(char_id, proficiency))
+        mod = dnd.dnd_mod(value)
+        ability_mods[(char_id, ability_id)] = mod
+
+        char_stats.abilities.append(
+            AbilityScore(ability_id, name, orig_name, value, mod, saving_trow, mod + proficiency if saving_trow else mod)
+        )
+
+    skills = CharacterSkill.objects.filter(character_id__in=character_ids).order_by(
+        'character_id', 'skill__ability__name', 'skill__name'
+    ).values_list(
+        'character_id', 'skill_id', 'skill__name', 'skill__orig_name', 'skill__ability_id', 'proficiency', 'competence'
+    )
+
+    for char_id, skill_id, name, orig_name, ability_id, proficiency, competence in skills:
+        char_stats = stats.get(char_id)
+        if char_stats is None:
+            continue
+
+        mod = skill_mod(ability_mods.get((char_id, ability_id), 0), char_stats.proficiency, proficiency, competence)
+        char_stats.skills.append(SkillScore(skill_id, name, orig_name, ability_id, proficiency, competence, mod))
+
+    return stats
+
+
+def for_character(character):
+    return for_characters([character.id]).get(character.id, CharacterStats(character.id, character.proficiency))
\ No newline at end of file
@@ -0,0 +1,182 @@
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.utils import timezone
+
+from dnd5e.models import Adventure, AdventureChange, AdventureMonster, Character, CharacterSpellSlot, Knowledge
+
+RETENTION = timedelta(days=7)  # Older changes are pruned, clients behind them get full snapshot
+MAX_CHANGES = 1000
+MAX_DELTAS = 500
+
+
+class Entity:
+    def __init__(self, model, fields, adventure_lookup='adventure_id', writable=None):
+        self.model = model
+        self.fields = fields
+        self.adventure_lookup = adventure_lookup
+        self.writable = writable if writable is not None else fields
+
+    def queryset(self, adventure_id):
+        return self.model.objects.filter(**{self.adventure_lookup: adventure_id})
+
+    def data(self, obj):
+        return {name: getattr(obj, name) for name in self.fields}
+
+
+ENTITIES = {
+    'adventuremonster': Entity(AdventureMonster, ['name', 'status', 'current_hp']),
+    # Known to any party flag, derived from PartyKnowledge. Knowledges are revealed to parties with knowledge.reveal
+    'knowledge': Entity(Knowledge, ['known'], writable=[]),
+    'character': Entity(
+        Character, ['armor_class', 'hit_points', 'current_hp', 'dead'], writable=['armor_class', 'current_hp']
+    ),
+    'characterspellslot': Entity(CharacterSpellSlot, ['level', 'spent'], 'character__adventure_id', ['spent']),
+}
+
+
+def _allocate(adventure_id, count):
+    """ Reserve sequence numbers. Adventure row stays locked until commit, so changes are committed in seq order """
+    Adventure.objects.filter(id=adventure_id).update(change_seq=models.F('change_seq') + count)
+    last = Adventure.objects.filter(id=adventure_id).values_list('change_seq', flat=True).first()
+
+    if last is None:  # Adventure is being deleted
+        return range(0)
+
+    return range(last - count + 1, last + 1)
+
+
+def record(adventure_id, entity, objects, fields=None, deleted=False):
+    objects = list(objects)
+    if not objects:
+        return
+
+    entity_spec = ENTITIES[entity]
+    fields = [name for name in (entity_spec.fields if fields is None else fields) if name in entity_spec.fields]
+    if not fields:  # Only fields clients don't see were saved
+        return
+
+    with transaction.atomic():
+        changes = [
+            AdventureChange(
+                adventure_id=adventure_id, seq=seq, entity=entity, object_id=obj.id, fields=fields,
+                data=None if deleted else entity_spec.data(obj)
+            )
+            for seq, obj in zip(_allocate(adventure_id, len(objects)), objects)
+        ]
+        AdventureChange.objects.bulk_create(changes)
+
+
+def record_instance(instance, update_fields=None, deleted=False):
+    entity = instance._meta.model_name
+
+    if entity == 'characterspellslot':
+        adventure_id = Character.objects.filter(id=instance.character_id).values_list('adventure_id', flat=True).first()
+    else:
+        adventure_id = instance.adventure_id
+
+    if adventure_id is not None:
+        record(adventure_id, entity, [instance], update_fields, deleted)
+
+
+def snapshot(adventure):
+    return {
+        'seq': adventure.change_seq,
+        'reset': True,
+        'entities': {
+            name: [dict(entity.data(obj), id=obj.id) for obj in entity.queryset(adventure.id).order_by('id')]
+            for name, entity in ENTITIES.items()
+        },
+    }
+
+
+def changes_since(adventure, since):
+    """ Changes after since, only the last change of every object. Clients behind retained log get snapshot """
+    oldest = AdventureChange.objects.filter(adventure=adventure).aggregate(oldest=models.Min('seq'))['oldest']
+
+    if since < adventure.change_seq and (oldest is None or since + 1 < oldest):
+        return snapshot(adventure)
+
+    latest = {}
+    changes = list(AdventureChange.objects.filter(adventure=adventure, seq__gt=since).order_by('seq')[:MAX_CHANGES])
+    for change in changes:
+        previous = latest.pop((change.entity, change.object_id), None)
+        if previous is not None:
+            change.fields = sorted(set(previous.fields) | set(change.fields))
+        latest[(change.entity, change.object_id)] = change
+
+    seq = changes[-1].seq if changes else since
+
+    return {
+        'seq': seq,
+        'more': seq < adventure.change_seq,
+        'changes': [change.as_dict() for change in latest.values()],
+    }
+
+
+def _clean_delta(adventure, delta):
+    try:
+        entity = ENTITIES[delta['entity']]
+        obj_id = int(delta['id'])
+        base_seq = int(delta.get('base_seq', 0))
+        data = dict(delta['data'])
+    except (KeyError, TypeError, ValueError):
+        raise ValidationError('Delta must have entity, id, base_seq and data')
+
+    unknown = set(data) - set(entity.writable)
+    if unknown:
+        raise ValidationError(f'Fields are not writable: {", ".join(sorted(unknown))}')
+
+    try:
+        obj = entity.queryset(adventure.id).get(id=obj_id)
+    except entity.model.DoesNotExist:
+        raise ValidationError(f'{delta["entity"]} {obj_id} not found')
+
+    for name, value in data.items():
+        setattr(obj, name, obj._meta.get_field(name).clean(value, obj))
+
+    return delta['entity'], obj, base_seq, list(data)
+
+
+def push(adventure, deltas):
+    """ Apply client deltas. Delta conflicts if server changed any of its fields after delta base_seq """
+    if not isinstance(deltas, list) or len(deltas) > MAX_DELTAS:
+        raise ValidationError(f'deltas must be a list of at most {MAX_DELTAS} items')
+
+    results = []
+
+    with transaction.atomic():
+        # Lock adventure sequence first, so nobody can change state between conflicts check and write
+        Adventure.objects.select_for_update().filter(id=adventure.id).values_list('id').get()
+
+        for index, delta in enumerate(deltas):
+            try:
+                entity, obj, base_seq, fields = _clean_delta(adventure, delta)
+            except ValidationError as exc:
+                results.append({'index': index, 'status': 'error', 'errors': exc.messages})
+                continue
+
+            server_changes = AdventureChange.objects.filter(
+                adventure=adventure, entity=entity, object_id=obj.id, seq__gt=base_seq
+            ).values_list('seq', 'fields')
+            conflict_seq = max((seq for seq, changed in server_changes if set(changed) & set(fields)), default=None)
+
+            if conflict_seq is not None:
+                server_obj = ENTITIES[entity].queryset(adventure.id).get(id=obj.id)
+                results.append({
+                    'index': index, 'status': 'conflict', 'seq': conflict_seq,
+                    'server': ENTITIES[entity].data(server_obj),
+                })
+                continue
+
+            obj.save(update_fields=fields)  # Change is recorded by post_save signal
+            results.append({'index': index, 'status': 'applied'})
+
+    adventure.refresh_from_db(fields=['change_seq'])
+
+    return {'seq': adventure.change_seq, 'results': results}
+
+
+def prune(retention=RETENTION):
+    return AdventureChange.objects.filter(created__lt=timezone.now() - retention).delete()[0]
\ No newline at end of file
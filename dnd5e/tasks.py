@@ -0,0 +1,28 @@
+from django.db import transaction
+
+from dnd5e import maps, party
+from dnd5e.jobs import task
+from dnd5e.models import Character, Job
+
+
+@task('level_up')
+def level_up(ctx, char_id, class_id, level=None):
+    """ Raise character to given level. Rerun of already applied job (worker died before finishing it) does nothing """
+    # Progress is written outside of transaction, so job status shows it without waiting for commit
+    ctx.set_progress(0, 1)
+
+    with transaction.atomic():
+        char = Character.objects.select_for_update().get(id=char_id)
+        if level is None or char.level < level:
+            char.level_up()
+            char.classes.get(id=class_id).level_up()
+            party.invalidate([char_id])
+
+    ctx.set_progress(1)
+
+    return {'char_id': char_id}
+
+
+@task('process_map', queue=Job.QUEUE_BULK)
+def process_map(ctx, map_id):
+    maps.process_map(map_id)
@@ -1,3 +1,281 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
 
-# Create your tests here.
+from dnd5e import sync
+from dnd5e.batch import MONSTER_KILLED, CharacterBatch
+from dnd5e.model_fields import Coins, Dice
+from dnd5e.models import (
+    Adventure, AdventureChange, AdventureMonster, Background,
+    Character, Knowledge, Monster, MonsterType, Race, RuleBook
+)
+
+
+def create_monster(**kwargs):
+    return Monster.objects.create(
+        name=kwargs.pop('name', 'Монстр'), orig_name=kwargs.pop('orig_name', 'Monster'), size='M', armor_class=12,
+        hit_points=kwargs.pop('hit_points', 13), speed=30, strength=10, dexterity=10, constitution=10,
+        intelligence=10, wisdom=10, charisma=10, passive_perception=10, challenge=10, description='',
+        mtype=MonsterType.objects.get_or_create(name='Тип', orig_name='Type')[0],
+        source=RuleBook.objects.get_or_create(name='Книга', code='TB')[0], **kwargs
+    )
+
+
+class PackingMigrationsTest(TransactionTestCase):
+    before = [('dnd5e', '0087_party_knowledge')]
+    after = [('dnd5e', '0090_packed_dice')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def raw_update(self, model, field, obj_id, value):
+        # Dice columns are strings before packing, current DiceField would pack value on save
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {model._meta.db_table} SET {field} = %s WHERE id = %s', [value, obj_id])
+
+    def raw_value(self, model, field, obj_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT {field} FROM {model._meta.db_table} WHERE id = %s', [obj_id])
+            return cursor.fetchone()[0]
+
+    def test_round_trip(self):
+        apps = self.migrate(self.before)
+        Monster, Tool = apps.get_model('dnd5e', 'Monster'), apps.get_model('dnd5e', 'Tool')
+        monster = Monster.objects.create(
+            name='Монстр', orig_name='Monster', slug='monster', size='M', armor_class=12, hit_points=13, speed=30,
+            strength=10, dexterity=10, constitution=10, intelligence=10, wisdom=10, charisma=10,
+            passive_perception=10, challenge=10, description='',
+            mtype=apps.get_model('dnd5e', 'MonsterType').objects.create(name='Тип', orig_name='Type'),
+            source=apps.get_model('dnd5e', 'RuleBook').objects.create(name='Книга', code='TB'),
+            damage_immunity=['Fire', 'Cold'], condition_immunity=['Poison'],
+        )
+        self.raw_update(Monster, 'hit_dice', monster.id, '3d8 + 1')
+        tool = Tool.objects.create(name='Инструмент', cost='5,0,0,2,0', description='')
+
+        apps = self.migrate(self.after)
+        monster = apps.get_model('dnd5e', 'Monster').objects.get(id=monster.id)
+        self.assertEqual(monster.damage_immunity, ['Cold', 'Fire'])
+        self.assertEqual(monster.damage_vuln, [])
+        self.assertEqual(monster.condition_immunity, ['Poison'])
+        self.assertEqual(monster.hit_dice, Dice('3d8 + 1'))
+        self.assertEqual(apps.get_model('dnd5e', 'Tool').objects.get(id=tool.id).cost_copper, 205)
+
+        apps = self.migrate(self.before)
+        Monster = apps.get_model('dnd5e', 'Monster')
+        monster = Monster.objects.get(id=monster.id)
+        self.assertEqual(sorted(monster.damage_immunity), ['Cold', 'Fire'])
+        self.assertEqual(list(monster.condition_immunity), ['Poison'])
+        self.assertEqual(self.raw_value(Monster, 'hit_dice', monster.id), '3d8 + 1')
+
+
+class BitmaskLookupsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fire = create_monster(name='Огненный', orig_name='Fire', damage_immunity=['Fire'])
+        cls.both = create_monster(name='Двойной', orig_name='Both', damage_immunity=['Fire', 'Cold'])
+        cls.none = create_monster(name='Обычный', orig_name='Plain')
+
+    def ids(self, **filters):
+        return set(Monster.objects.filter(**filters).values_list('id', flat=True))
+
+    def test_has_any(self):
+        self.assertEqual(self.ids(damage_immunity__has_any=['Fire', 'Acid']), {self.fire.id, self.both.id})
+        self.assertEqual(self.ids(damage_immunity__has_any=['Cold']), {self.both.id})
+        self.assertEqual(self.ids(damage_immunity__has_any=['Acid']), set())
+
+    def test_has_all(self):
+        self.assertEqual(self.ids(damage_immunity__has_all=['Fire']), {self.fire.id, self.both.id})
+        self.assertEqual(self.ids(damage_immunity__has_all=['Fire', 'Cold']), {self.both.id})
+        self.assertEqual(self.ids(damage_immunity__has_all=['Fire', 'Acid']), set())
+
+    def test_value_is_list_of_flags(self):
+        self.assertEqual(Monster.objects.get(id=self.both.id).damage_immunity, ['Cold', 'Fire'])
+        self.assertEqual(Monster.objects.get(id=self.none.id).damage_immunity, [])
+
+
+class DiceTest(TestCase):
+    def test_pack_unpack(self):
+        for value in ('1d4', '2d6 + 3', '3d8 - 2', '10d100', '4d10 5'):
+            dice = Dice(value)
+            self.assertEqual(Dice.unpack(dice.packed), dice)
+
+    def test_out_of_range(self):
+        with self.assertRaises(ValidationError):
+            Dice('1d6 + 5000').packed
+
+    def test_invalid(self):
+        for value in ('d6', '1d7', '1d6 +', ''):
+            with self.assertRaises(ValidationError):
+                Dice(value)
+
+    def test_average_maximum(self):
+        self.assertEqual(Dice('2d6 + 3').average, 10)
+        self.assertEqual(Dice('2d6 + 3').maximum, 15)
+        self.assertEqual(Dice('1d8 - 1').average, 3.5)
+        self.assertEqual(Dice('1d8 - 1').maximum, 7)
+
+    def test_sql_transforms(self):
+        monster = create_monster(hit_dice='2d8 + 2')
+        values = Monster.objects.filter(id=monster.id).values_list(
+            'hit_dice__count', 'hit_dice__sides', 'hit_dice__mod', 'hit_dice__average', 'hit_dice__maximum'
+        ).get()
+        self.assertEqual(values, (2, 8, 2, 11, 18))
+        self.assertEqual(Monster.objects.get(id=monster.id).hit_dice, Dice('2d8 + 2'))
+
+
+class CoinsTest(TestCase):
+    def test_parse(self):
+        coins = Coins.parse_coins('1,2,0,3,0')
+        self.assertEqual((coins.copper, coins.silver, coins.gold), (1, 2, 3))
+        self.assertEqual(coins.in_copper, 321)
+
+    def test_add(self):
+        self.assertEqual(Coins(gold=1) + Coins(silver=5), Coins(copper=150))
+        self.assertEqual(sum([Coins(copper=1), Coins(copper=2)]), Coins(copper=3))
+
+    def test_sub_gives_change(self):
+        change = Coins(gold=1) - Coins(copper=1)
+        self.assertEqual((change.gold, change.silver, change.copper), (0, 9, 9))
+        with self.assertRaises(ValueError):
+            Coins(copper=1) - Coins(gold=1)
+
+    def test_mul(self):
+        self.assertEqual(Coins(silver=3) * 2, Coins(silver=6))
+        self.assertEqual(2 * Coins(silver=3), Coins(silver=6))
+
+    def test_compare_and_normalize(self):
+        self.assertLess(Coins(silver=9), Coins(gold=1))
+        self.assertEqual(Coins(copper=1234).normalized().platinum, 1)
+        self.assertEqual(Coins(gold=3).convert('silver'), 30)
+        self.assertFalse(Coins())
+
+
+class AdventureTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.adventure = Adventure.objects.create(name='Test', master=User.objects.create_user('gm'))
+        cls.character = Character.objects.create(
+            adventure=cls.adventure, name='Test', age=20, gender=1, alignment=1, hit_points=12,
+            race=Race.objects.create(name='Race', size='M'),
+            background=Background.objects.create(name='Background', description='')
+        )
+
+
+class BatchValidationTest(AdventureTestCase):
+    def errors(self, *ops):
+        batch = CharacterBatch(self.adventure, list(ops))
+        self.assertFalse(batch.validate())
+
+        return [result['errors'] for result in batch.results()]
+
+    def test_ops_must_be_list(self):
+        with self.assertRaises(ValidationError):
+            CharacterBatch(self.adventure, {'op': 'damage'})
+
+    def test_field_types(self):
+        target = f'character:{self.character.id}'
+        self.assertEqual(self.errors(
+            {'op': 'spend_dice', 'character': self.character.id, 'dtype': ['hit']},
+            {'op': 'damage', 'target': [target], 'amount': 1},
+            {'op': 'damage', 'target': target, 'amount': 1.5},
+            {'op': 'heal', 'target': target, 'amount': True},
+            {'op': ['damage']},
+        ), [
+            ['dtype must be string'], ['target must be string'], ['amount must be integer'],
+            ['amount must be integer'], ['Unknown operation'],
+        ])
+
+    def test_unknown_objects(self):
+        self.assertEqual(self.errors(
+            {'op': 'damage', 'target': 'character:0', 'amount': 1},
+            {'op': 'damage', 'target': 'npc:1', 'amount': 1},
+            {'op': 'restore_slots', 'character': 0},
+        ), [['Character 0 not found in adventure'], ['Invalid target npc:1'], ['Character 0 not found in adventure']])
+
+    def test_heal_killed_monster(self):
+        monster = AdventureMonster.objects.create(
+            adventure=self.adventure, monster=create_monster(), status=MONSTER_KILLED, current_hp=0,
+            location_ct=ContentType.objects.get_by_natural_key('dnd5e', 'place'), location_id=1
+        )
+        self.assertEqual(
+            self.errors({'op': 'heal', 'target': f'adventuremonster:{monster.id}', 'amount': 5}),
+            [[f'Monster {monster.id} is killed']]
+        )
+
+    def test_invalid_batch_writes_nothing(self):
+        target = f'character:{self.character.id}'
+        self.errors({'op': 'damage', 'target': target, 'amount': 5}, {'op': 'unknown'})
+
+        self.character.refresh_from_db()
+        self.assertIsNone(self.character.current_hp)
+
+    def test_valid_batch(self):
+        target = f'character:{self.character.id}'
+        batch = CharacterBatch(self.adventure, [
+            {'op': 'damage', 'target': target, 'amount': 5}, {'op': 'heal', 'target': target, 'amount': 2},
+        ])
+        self.assertTrue(batch.validate())
+        batch.commit()
+
+        self.character.refresh_from_db()
+        self.assertEqual(self.character.current_hp, 9)
+
+
+class SyncValidationTest(AdventureTestCase):
+    def push(self, *deltas):
+        return [result for result in sync.push(self.adventure, list(deltas))['results']]
+
+    def test_deltas_must_be_list(self):
+        with self.assertRaises(ValidationError):
+            sync.push(self.adventure, {'entity': 'character'})
+
+    def test_invalid_deltas(self):
+        knowledge = Knowledge.objects.create(adventure=self.adventure, ktype=7, title='Знание')
+        results = self.push(
+            {'entity': 'character', 'id': self.character.id, 'data': {'hit_points': 100}},
+            {'entity': 'knowledge', 'id': knowledge.id, 'data': {'known': True}},
+            {'entity': 'character', 'id': 0, 'data': {'current_hp': 1}},
+            {'entity': 'npc', 'id': 1, 'data': {}},
+            {'entity': 'character', 'id': self.character.id, 'data': {'current_hp': 'many'}},
+        )
+
+        self.assertEqual([result['status'] for result in results], ['error'] * 5)
+        self.assertEqual(results[0]['errors'], ['Fields are not writable: hit_points'])
+        self.assertEqual(results[1]['errors'], ['Fields are not writable: known'])
+        self.assertEqual(results[2]['errors'], ['character 0 not found'])
+        self.assertEqual(results[3]['errors'], ['Delta must have entity, id, base_seq and data'])
+
+    def test_conflict(self):
+        seq = sync.push(self.adventure, [])['seq']
+        self.push({'entity': 'character', 'id': self.character.id, 'base_seq': seq, 'data': {'current_hp': 5}})
+
+        result, = self.push({'entity': 'character', 'id': self.character.id, 'base_seq': seq, 'data': {'current_hp': 7}})
+        self.assertEqual(result['status'], 'conflict')
+        self.assertEqual(result['server']['current_hp'], 5)
+
+
+class AdventureDeleteTest(AdventureTestCase):
+    def test_delete_with_synced_children(self):
+        self.assertTrue(AdventureChange.objects.filter(adventure=self.adventure).exists())
+
+        self.adventure.delete()
+
+        self.assertFalse(Adventure.objects.filter(id=self.adventure.id).exists())
+        self.assertFalse(AdventureChange.objects.filter(adventure_id=self.adventure.id).exists())
+
+    def test_delete_character_is_recorded(self):
+        char_id = self.character.id
+        self.character.delete()
+
+        change = AdventureChange.objects.filter(adventure=self.adventure).order_by('seq').last()
+        self.assertEqual((change.entity, change.object_id, change.data), ('character', char_id, None))
@@ -1,6 +1,6 @@
 from django.urls import include, path
 
-from . import views
+from . import api, views
 from .alice import alice_api
 
 app_name = 'dnd5e'
@@ -11,6 +11,7 @@ character_patterns = ([
     path('<int:char_id>/spellcasting-tab', views.character_detail, name='detail_spellcasting', kwargs={'tab': 'spellcasting'}),
     path('<int:char_id>/info-tab', views.character_detail, name='detail_info', kwargs={'tab': 'info'}),
     path('<int:char_id>/set-stats', views.set_character_stats, name='set_stats'),
+    path('<int:char_id>/choices', views.character_choices, name='choices'),
     path('<int:char_id>/resolve-choice/<int:choice_id>', views.resolve_char_choice, name='resolve_choice'),
     path('<int:char_id>/resolve-choice/<int:choice_id>/reject', views.resolve_char_choice, name='reject_choice', kwargs={'reject': True}),
     path('<int:char_id>/levelup', views.level_up, name='level_up'),
@@ -22,10 +23,24 @@ adventure_patterns = ([
     path('<int:adv_id>/character/create', views.create_character, name='create_character'),
     path('<int:adv_id>/character/<int:char_id>/set-stats', views.set_character_stats, name='set_character_stats'),
     path('<int:adv_id>', views.adventure_detail, name='detail'),
+    path('<int:adv_id>/choices', views.adventure_choices, name='choices'),
+    path('<int:adv_id>/party/<int:party_id>', views.party_detail, name='party_detail'),
+    path('<int:adv_id>/party/<int:party_id>.json', views.party_detail_json, name='party_detail_json'),
+    path('<int:adv_id>/party/<int:party_id>/reveal', views.reveal_knowledges, name='reveal_knowledges'),
+    path('<int:adv_id>/choices.json', views.adventure_choices_json, name='choices_json'),
     path('stage/<int:stage_id>', views.stage_detail, name='stage_detail'),
     path('place/<int:place_id>', views.place_detail, name='place_detail'),
     path('npc/<int:npc_id>', views.npc_detail, name='npc_detail'),
+    path('npc/<int:npc_id>/graph.json', views.npc_graph_json, name='npc_graph'),
+    path('map/<int:map_id>', views.map_detail, name='map_detail'),
+    path('map/<int:map_id>/<str:version>.dzi', views.map_dzi, name='map_dzi'),
+    path(
+        'map/<int:map_id>/<str:version>_files/<int:level>/<int:col>_<int:row>.jpg', views.map_tile, name='map_tile'
+    ),
+    path('map/<int:map_id>/session', views.map_session_state, name='map_session'),
+    path('map/<int:map_id>/session/delta', views.map_session_delta, name='map_session_delta'),
     path('monsters-interaction/<int:location_ct>/<int:location_id>', views.monsters_interaction, name='monsters_interaction'),
+    path('encounter/<str:location>/<int:location_id>', views.encounter_generator, name='encounter_generator'),
     path('<int:adv_id>/character/', include(character_patterns, namespace='character')),
     path('', views.list_adventures, name='list'),
 ], app_name)
@@ -33,9 +48,29 @@ adventure_patterns = ([
 urlpatterns = [
     path('monsters/', views.monsters_list, name='monsters'),
     path('spells/', views.spells_list, name='spells'),
+    path('equipment/', views.equipment_list, name='equipment'),
+    path('equipment/<str:kind>/', views.equipment_list, name='equipment'),
     path('levels/', views.level_tables, name='levels'),
     path('levels/<int:subklass_id>', views.level_table_detail, name='level_table'),
     path('adventures/', include(adventure_patterns, namespace='adventure')),
+    path('jobs/<int:job_id>', views.job_detail, name='job_detail'),
+    path('jobs/<int:job_id>/status', views.job_status, name='job_status'),
     path('alice/', alice_api, name='alice_api'),
+    path('api/catalogue/', api.catalogue_index, name='catalogue'),
+    path('api/catalogue/<str:resource>/', api.catalogue_list, name='catalogue_list'),
+    path('api/catalogue/<str:resource>/<int:obj_id>', api.catalogue_detail, name='catalogue_detail'),
+    path('api/autocomplete/<str:kind>/', api.autocomplete, name='autocomplete'),
+    path('api/adventures/<int:adv_id>/batch', api.character_batch, name='character_batch'),
+    path('api/adventures/<int:adv_id>/sync', api.sync_pull, name='sync_pull'),
+    path('api/adventures/<int:adv_id>/sync/push', api.sync_push, name='sync_push'),
+    path('api/adventures/<int:adv_id>/party/<int:party_id>/knowledges', api.party_knowledges, name='party_knowledges'),
+    path(
+        'api/adventures/<int:adv_id>/party/<int:party_id>/knowledges/reveal', api.party_knowledges_reveal,
+        name='party_knowledges_reveal'
+    ),
+    path(
+        'api/adventures/<int:adv_id>/party/<int:party_id>/choices/resolve', api.party_choices_resolve,
+        name='party_choices_resolve'
+    ),
     path('', views.index, name='index'),
 ]
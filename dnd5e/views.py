@@ -1,19 +1,43 @@
+import json
+
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
 from django.db import transaction
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render, reverse
+from django.utils.cache import patch_cache_control
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
+
+from django_filters.filterset import filterset_factory
 
-from dnd5e import dnd
+from dnd5e import (
+    choice_engine, dnd, encounters, facets, jobs, knowledge, loot,
+    map_session, maps, npc_graph, party, spellcasting, stats
+)
 
 from .choices import ALL_CHOICES
-from .filters import MonsterFilter, SpellFilter
-from .forms import CharacterForm, CharacterStatsFormset
+from .filters import EquipmentFilter, MonsterFilter, SpellFilter, WeaponFilter
+from .forms import CharacterArmorClassForm, CharacterForm, CharacterStatsFormset, EncounterGeneratorForm
 from .models import (
-    NPC, Adventure, AdventureMonster, Character, CharacterAbilities, CharacterAdvancmentChoice,
-    CharacterClass, Class, ClassLevels, Monster, Place, Spell, Stage, Subclass, Zone
+    NPC, Adventure, AdventureMap, AdventureMonster, Character, CharacterAbilities,
+    CharacterAdvancmentChoice, CharacterClass, Class, ClassLevels, Item, Job,
+    MapSession, Monster, Party, Place, Spell, Stage, Stuff, Subclass, Tool, Weapon, Zone
 )
 
+# Encounter locations: {model name: (model, lookup of adventure)}
+ENCOUNTER_LOCATIONS = {'place': (Place, 'stage__adventure'), 'zone': (Zone, 'place__stage__adventure')}
+
+EQUIPMENT_KINDS = {
+    'tools': ('Инструменты', Tool, EquipmentFilter),
+    'weapons': ('Оружие', Weapon, WeaponFilter),
+    'items': ('Предметы', Item, EquipmentFilter),
+    'stuff': ('Снаряжение', Stuff, EquipmentFilter),
+}
+
 
 def index(request):
     context = {}
@@ -34,7 +58,7 @@ def list_adventures(request):
 
 @login_required
 def adventure_detail(request, adv_id):
-    adventure_qs = Adventure.objects.prefetch_related('monsters', 'stages')
+    adventure_qs = Adventure.objects.prefetch_related('monsters', 'stages', 'parties')
     adventure = get_object_or_404(adventure_qs, id=adv_id)
 
     context = {
@@ -44,20 +68,62 @@ def adventure_detail(request, adv_id):
     return render(request, 'dnd5e/adventures/detail.html', context)
 
 
+@login_required
+def party_detail(request, adv_id, party_id):
+    party_obj = get_object_or_404(Party, id=party_id, adventure_id=adv_id, adventure__master=request.user)
+
+    context = {'adventure': party_obj.adventure, 'party': party.party_overview(party_obj)}
+
+    return render(request, 'dnd5e/adventures/party_detail.html', context)
+
+
+@login_required
+def party_detail_json(request, adv_id, party_id):
+    party_obj = get_object_or_404(Party, id=party_id, adventure_id=adv_id, adventure__master=request.user)
+
+    return JsonResponse(party.party_overview(party_obj))
+
+
+@login_required
+@require_POST
+def reveal_knowledges(request, adv_id, party_id):
+    party_obj = get_object_or_404(Party, id=party_id, adventure_id=adv_id, adventure__master=request.user)
+
+    try:
+        knowledge.reveal(
+            party_obj, [int(obj_id) for obj_id in request.POST.getlist('knowledge')], user=request.user,
+            hide=bool(request.POST.get('hide'))
+        )
+    except ValueError:
+        messages.error(request, 'Неверный идентификатор знания')
+    except ValidationError as exc:
+        messages.error(request, ' '.join(exc.messages))
+
+    next_url = request.POST.get('next')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        next_url = reverse('dnd5e:adventure:party_detail', kwargs={'adv_id': adv_id, 'party_id': party_id})
+
+    return redirect(next_url)
+
+
 @login_required
 def character_detail(request, adv_id, char_id, tab=None):
     # TODO select related
     char = get_object_or_404(Character, id=char_id)
     adventure = get_object_or_404(Adventure, id=adv_id)
-    choices = char.choices.select_related('choice')
+    choices = list(char.choices.pending())
 
-    context = {'char': char, 'adventure': adventure, 'choices': choices}
-    context.update(choices.aggregate_blocking_choices())
+    context = {
+        'char': char, 'adventure': adventure, 'choices': choices,
+        'blocking_choices': sum(choice.important for choice in choices), 'total_choices': len(choices),
+    }
 
     if tab == 'info':
+        context['stats'] = stats.for_character(char)
         return render(request, 'dnd5e/adventures/char/tabs/info.html', context)
 
     if tab == 'spellcasting':
+        context['spellcasting'] = spellcasting.for_characters([char.id])[char.id]
         char.known_cantrips = char.known_spells.filter(level=0)
         char.known_spells_only = char.known_spells.exclude(level=0)
         return render(request, 'dnd5e/adventures/char/tabs/spellcasting.html', context)
@@ -65,6 +131,42 @@ def character_detail(request, adv_id, char_id, tab=None):
     return render(request, 'dnd5e/adventures/char/detail.html', context)
 
 
+@login_required
+def character_choices(request, adv_id, char_id):
+    char = get_object_or_404(Character, id=char_id, adventure_id=adv_id, adventure__master=request.user)
+
+    return JsonResponse({'choices': [choice.as_dict() for choice in char.choices.pending()]})
+
+
+def _adventure_pending_choices(request, adventure):
+    choices = CharacterAdvancmentChoice.objects.filter(character__adventure=adventure)
+
+    party_id = request.GET.get('party')
+    if party_id and party_id.isdigit():
+        choices = choices.filter(character__party_id=party_id)
+
+    return choices.pending().select_related('character')
+
+
+@login_required
+def adventure_choices(request, adv_id):
+    adventure = get_object_or_404(Adventure, id=adv_id, master=request.user)
+
+    context = {
+        'adventure': adventure, 'choices': _adventure_pending_choices(request, adventure),
+        'parties': adventure.parties.all(), 'party_id': request.GET.get('party'),
+    }
+
+    return render(request, 'dnd5e/adventures/choices.html', context)
+
+
+@login_required
+def adventure_choices_json(request, adv_id):
+    adventure = get_object_or_404(Adventure, id=adv_id, master=request.user)
+
+    return JsonResponse({'choices': [choice.as_dict() for choice in _adventure_pending_choices(request, adventure)]})
+
+
 @login_required
 def create_character(request, adv_id):
     adventure = get_object_or_404(Adventure, id=adv_id)
@@ -98,12 +200,16 @@ def set_character_stats(request, adv_id, char_id):
         files=request.FILES or None,
         queryset=CharacterAbilities.objects.filter(character=char),
     )
-    if charstats_formset.is_valid():
-        charstats_formset.save()
+    armor_form = CharacterArmorClassForm(request.POST or None, instance=char)
+    if charstats_formset.is_valid() and armor_form.is_valid():
+        with transaction.atomic():
+            charstats_formset.save()
+            armor_form.save()
+            char.update_hit_points()
 
         return redirect('dnd5e:adventure:character:detail', adv_id=adventure.id, char_id=char.id)
 
-    context = {'char': char, 'adventure': adventure, 'formset': charstats_formset}
+    context = {'char': char, 'adventure': adventure, 'formset': charstats_formset, 'armor_form': armor_form}
 
     return render(request, 'dnd5e/adventures/char/set_stats.html', context)
 
@@ -114,12 +220,13 @@ def level_up(request, adv_id, char_id, class_id=None):
     adventure = get_object_or_404(Adventure, id=adv_id)
 
     if class_id is not None:
-        with transaction.atomic():
-            char.level_up()
-            klass = CharacterClass.objects.get(id=class_id)
-            klass.level_up()
+        char_class = get_object_or_404(CharacterClass, id=class_id, character=char)
+        job = jobs.enqueue(
+            'level_up', owner=request.user, char_id=char.id, class_id=char_class.id, level=char.level + 1
+        )
+        next_url = reverse('dnd5e:adventure:character:detail', kwargs={'adv_id': adventure.id, 'char_id': char.id})
 
-        return redirect('dnd5e:adventure:character:detail', adventure.id, char.id)
+        return redirect(f"{reverse('dnd5e:job_detail', kwargs={'job_id': job.id})}?next={next_url}")
 
     context = {'char': char, 'adventure': adventure, 'classes': char.classes.all()}
 
@@ -165,23 +272,25 @@ def level_up_multiclass(request, adv_id, char_id):
 def resolve_char_choice(request, adv_id, char_id, choice_id, reject=False):
     adventure = get_object_or_404(Adventure, id=adv_id)
     char = get_object_or_404(Character, id=char_id, adventure=adventure)
-    choice = get_object_or_404(CharacterAdvancmentChoice.objects.select_related('choice'), id=choice_id)  # TODO Add char_id fileter
+    # Blocking is computed over all choices of character, so the queue is not filtered by choice id in SQL
+    choice = next((choice for choice in char.choices.pending() if choice.id == choice_id), None)
+    if choice is None:
+        raise Http404('Choice not found')
 
     if reject and request.method == 'POST' and choice.choice.rejectable:
         choice.delete()
         return redirect(reverse('dnd5e:adventure:character:detail', kwargs={'adv_id': adventure.id, 'char_id': char.id}))
 
-    if not choice.choice.important and char.choices.filter(choice__important=True).exists():
+    if choice.blocked:
         # Can't make choice if more important choice exists for this char
         messages.info(request, 'Для этого персонажа нужно сделать более важный выбор')
         return redirect(reverse('dnd5e:adventure:character:detail', kwargs={'adv_id': adventure.id, 'char_id': char.id}))
 
     selector = ALL_CHOICES.get(choice.choice.code, char, choice=choice)
-    form = selector.get_form(request)
+    form = selector.get_form(request.POST)
 
     if form.is_valid():
-        selector.apply_data(form.cleaned_data)
-        choice.delete()
+        choice_engine.resolve_batch([(choice, form.cleaned_data)])
 
         return redirect(reverse('dnd5e:adventure:character:detail', kwargs={'adv_id': adventure.id, 'char_id': char.id}))
 
@@ -194,9 +303,17 @@ def resolve_char_choice(request, adv_id, char_id, choice_id, reject=False):
 
 
 def stage_detail(request, stage_id):
-    stage = get_object_or_404(Stage.objects.prefetch_detail().annotate_detail(), id=stage_id)
+    stage = get_object_or_404(Stage.objects.prefetch_detail(), id=stage_id)
+    parties = list(stage.adventure.parties.all())
+    budget = encounters.get_budget(stage.adventure_id)
+    places = list(stage.places.with_related_data())
+    for place in places:
+        place.encounter = budget.place(place.id, with_zones=True)
 
-    context = {'stage': stage, 'adventure': stage.adventure}
+    context = {
+        'stage': stage, 'adventure': stage.adventure, 'places': places, 'encounter': budget.stage(stage.id),
+        'knowledges': knowledge.with_parties(stage.knowledges.all(), parties), 'parties': parties,
+    }
 
     return render(request, 'dnd5e/adventures/stage_detail.html', context)
 
@@ -204,10 +321,19 @@ def stage_detail(request, stage_id):
 @login_required
 def place_detail(request, place_id):
     place = get_object_or_404(Place, id=place_id)
-    stage = get_object_or_404(Stage.objects.prefetch_detail().annotate_detail(), id=place.stage_id)
+    stage = get_object_or_404(Stage.objects.prefetch_detail(), id=place.stage_id)
+    parties = list(stage.adventure.parties.all())
+    zones = list(place.zones.all())
+    zones_loot = loot.for_zones([zone.id for zone in zones])
+    budget = encounters.get_budget(stage.adventure_id)
+    for zone in zones:
+        zone.loot = zones_loot.get(zone.id)
+        zone.encounter = budget.location('zone', zone.id)
 
     context = {
         'place': place, 'stage': stage, 'adventure': place.stage.adventure,
+        'knowledges': knowledge.with_parties(stage.knowledges.all(), parties), 'parties': parties,
+        'zones': zones, 'loot': sum(zones_loot.values(), loot.Loot()), 'encounter': budget.place(place.id),
         'place_ct': ContentType.objects.get_for_model(Place),
         'zone_ct': ContentType.objects.get_for_model(Zone),
     }
@@ -216,15 +342,116 @@ def place_detail(request, place_id):
 
 @login_required
 def npc_detail(request, npc_id):
-    npc = get_object_or_404(NPC, id=npc_id)
+    npc = get_object_or_404(
+        NPC.objects.select_related('adventure').prefetch_related('knows', 'relations__other'), id=npc_id
+    )
+    parties = list(npc.adventure.parties.all())
+    graph = npc_graph.get_graph(npc.adventure_id)
 
     context = {
-        'npc': npc
+        'npc': npc,
+        'knowledges': knowledge.with_parties(npc.knows.all(), parties), 'parties': parties,
+        'diagram': graph.diagram(npc.id),
+        'family': [graph.names[npc_id] for npc_id in sorted(graph.family(npc.id), key=graph.names.get)],
     }
 
     return render(request, 'dnd5e/adventures/npc_detail.html', context)
 
 
+@login_required
+def npc_graph_json(request, npc_id):
+    """ NPCs connected within depth hops and, if requested, shortest chain of relations to other NPC """
+    npc = get_object_or_404(NPC, id=npc_id)
+    graph = npc_graph.get_graph(npc.adventure_id)
+
+    try:
+        depth = min(max(int(request.GET.get('depth', 2)), 1), 10)
+        target = request.GET.get('to')
+        target = None if target is None else int(target)
+    except ValueError:
+        return JsonResponse({'error': 'depth and to must be integers'}, status=400)
+
+    data = {
+        'id': npc.id,
+        'neighbours': [
+            {'id': npc_id, 'name': graph.names.get(npc_id), 'distance': distance}
+            for npc_id, distance in sorted(graph.neighbours(npc.id, depth).items(), key=lambda item: item[1])
+        ],
+    }
+
+    if target is not None:
+        chain = graph.path(npc.id, target)
+        data['path'] = None if chain is None else [
+            {'id': npc_id, 'name': graph.names.get(npc_id), 'relation': relation, 'outgoing': outgoing}
+            for npc_id, relation, outgoing in chain
+        ]
+
+    return JsonResponse(data)
+
+
+@login_required
+def map_detail(request, map_id):
+    adv_map = get_object_or_404(AdventureMap, id=map_id)
+
+    context = {'map': adv_map, 'location': adv_map.location}
+
+    return render(request, 'dnd5e/adventures/map_detail.html', context)
+
+
+@login_required
+def map_dzi(request, map_id, version):
+    adv_map = get_object_or_404(AdventureMap, id=map_id, tiles_version=version)
+
+    response = HttpResponse(maps.dzi_descriptor(adv_map), content_type='application/xml')
+    patch_cache_control(response, private=True, max_age=maps.TILES_MAX_AGE, immutable=True)
+
+    return response
+
+
+@login_required
+def map_tile(request, map_id, version, level, col, row):
+    path = maps.tile_path(map_id, version, level, col, row)
+
+    try:
+        tile = default_storage.open(path, 'rb')
+    except FileNotFoundError:
+        raise Http404('Tile not found')
+
+    response = FileResponse(tile, content_type='image/jpeg')
+    patch_cache_control(response, private=True, max_age=maps.TILES_MAX_AGE, immutable=True)
+
+    return response
+
+
+@login_required
+def map_session_state(request, map_id):
+    adv_map = get_object_or_404(AdventureMap.objects.of_master(request.user), id=map_id)
+    session, _ = MapSession.objects.select_related('adv_map').get_or_create(adv_map=adv_map)
+    state = map_session.load_state(session)
+
+    if request.GET.get('since') == str(state.version):
+        return JsonResponse({'version': state.version})
+
+    return JsonResponse(state.as_dict())
+
+
+@login_required
+@require_POST
+def map_session_delta(request, map_id):
+    adv_map = get_object_or_404(AdventureMap.objects.of_master(request.user), id=map_id)
+    session, _ = MapSession.objects.select_related('adv_map').get_or_create(adv_map=adv_map)
+
+    try:
+        ops = json.loads(request.body)['ops']
+        state = map_session.apply_delta(session, ops)
+    except (ValueError, TypeError, KeyError) as exc:
+        return JsonResponse({'error': f'Invalid delta: {exc}'}, status=400)
+    except ValidationError as exc:
+        return JsonResponse({'error': exc.messages}, status=400)
+
+    return JsonResponse({'version': state.version})
+
+
 @login_required
 def monsters_interaction(request, location_ct, location_id):
     monsters = AdventureMonster.objects.filter(
@@ -237,6 +464,97 @@ def monsters_interaction(request, location_ct, location_id):
     return render(request, 'dnd5e/adventures/monsters_interaction.html', context)
 
 
+def _parse_group(value):
+    """ Monster group from "monster id:count,..." string """
+    try:
+        group = [tuple(map(int, item.split(':'))) for item in value.split(',')]
+    except ValueError:
+        return None
+
+    if not group or any(len(item) != 2 or not 0 < item[1] <= encounters.MAX_GROUP_SIZE for item in group):
+        return None
+
+    return group
+
+
+@login_required
+def encounter_generator(request, location, location_id):
+    if location not in ENCOUNTER_LOCATIONS:
+        raise Http404
+
+    model, adventure_lookup = ENCOUNTER_LOCATIONS[location]
+    obj = get_object_or_404(
+        model.objects.select_related(adventure_lookup), id=location_id, **{f'{adventure_lookup}__master': request.user}
+    )
+    adventure = obj.stage.adventure if location == 'place' else obj.place.stage.adventure
+    place_url = reverse('dnd5e:adventure:place_detail', args=[obj.id if location == 'place' else obj.place_id])
+    pool = encounters.get_pool()
+
+    if request.method == 'POST':
+        group = _parse_group(request.POST.get('monsters', ''))
+        available = {monster_id for ids in pool.available(adventure.id).values() for monster_id in ids}
+
+        if group is None or any(monster_id not in available for monster_id, _ in group):
+            messages.error(request, 'Неверный состав группы')
+            return redirect(request.get_full_path())
+
+        created = encounters.place_monsters(adventure.id, obj, group)
+        messages.success(request, f'Добавлено монстров: {len(created)}')
+
+        return redirect(place_url if location == 'place' else f'{place_url}#zone-{obj.num}')
+
+    form = EncounterGeneratorForm(request.GET or None, adventure=adventure)
+    groups = []
+
+    if form.is_valid():
+        selection = form.facet_selection()
+        allowed = None
+        if any(selection.values()):
+            index = facets.get_index('monster')
+            allowed = index.members(index.select(selection))
+
+        levels = list(Character.objects.filter(party=form.cleaned_data['party'], dead=False).values_list(
+            'level', flat=True
+        ))
+        groups = pool.generate(levels, form.cleaned_data['difficulty'], adventure.id, allowed)
+
+        names = Monster.objects.in_bulk({monster_id for group in groups for monster_id, _ in group.monsters})
+        groups = [
+            {
+                'monsters': [(names[monster_id], count) for monster_id, count in group.monsters],
+                'value': ','.join(f'{monster_id}:{count}' for monster_id, count in group.monsters),
+                'xp': group.xp, 'adjusted': group.adjusted,
+            }
+            for group in groups
+        ]
+
+    context = {
+        'adventure': adventure, 'location': obj, 'place_url': place_url, 'form': form, 'groups': groups,
+    }
+
+    return render(request, 'dnd5e/adventures/encounter_generator.html', context)
+
+
+@login_required
+def job_detail(request, job_id):
+    job = get_object_or_404(Job, id=job_id, owner=request.user)
+
+    next_url = request.GET.get('next')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        next_url = None
+
+    context = {'job': job, 'next': next_url}
+
+    return render(request, 'dnd5e/job_detail.html', context)
+
+
+@login_required
+def job_status(request, job_id):
+    job = get_object_or_404(Job, id=job_id, owner=request.user)
+
+    return JsonResponse(job.as_dict())
+
+
 def spells_list(request):
     spells = Spell.objects.all().prefetch_related('classes').select_related('school')
 
@@ -253,6 +571,25 @@ def monsters_list(request):
     return render(request, 'dnd5e/monsters_list.html', context)
 
 
+def equipment_list(request, kind='tools'):
+    if kind not in EQUIPMENT_KINDS:
+        raise Http404
+
+    title, model, filterset = EQUIPMENT_KINDS[kind]
+    queryset = model.objects.by_price()
+    if model is Item:
+        queryset = queryset.filter(adventure__isnull=True)
+
+    filterset = filterset_factory(model, filterset=filterset, fields=[])
+
+    context = {
+        'efilter': filterset(request.GET, queryset=queryset), 'kind': kind, 'title': title,
+        'kinds': [(name, label) for name, (label, *_) in EQUIPMENT_KINDS.items()],
+    }
+
+    return render(request, 'dnd5e/equipment_list.html', context)
+
+
 def level_tables(request):
     context = {'klasses': Class.objects.prefetch_related('subclass_set').all()}
     return render(request, 'dnd5e/level_tables.html', context)
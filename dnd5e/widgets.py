@@ -1,4 +1,5 @@
 import django.forms.widgets as widgets
+from django.urls import reverse_lazy
 
 
 class AbilityListBoxSelect(widgets.SelectMultiple):
@@ -7,4 +8,33 @@ class AbilityListBoxSelect(widgets.SelectMultiple):
 
     class Media:
         css = {'all': ('css/ability_listbox.css',)}
-        js = ('js/ability_listbox.js',)
\ No newline at end of file
+        js = ('js/ability_listbox.js',)
+
+
+class AutocompleteMixin:
+    """ Renders only selected options, others are loaded on demand from autocomplete API by js """
+
+    def __init__(self, kind, attrs=None, **kwargs):
+        attrs = {'data-autocomplete-url': reverse_lazy('dnd5e:autocomplete', args=[kind]), **(attrs or {})}
+        super().__init__(attrs, **kwargs)
+
+    def optgroups(self, name, value, attrs=None):
+        choices = self.choices
+        selected = [obj_id for obj_id in value if str(obj_id).isdigit()]
+        self.choices = [choices.choice(obj) for obj in choices.queryset.filter(pk__in=selected)] if selected else []
+
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = choices
+
+    class Media:
+        js = ('js/autocomplete.js',)
+
+
+class AutocompleteSelect(AutocompleteMixin, widgets.Select):
+    pass
+
+
+class AutocompleteSelectMultiple(AutocompleteMixin, widgets.SelectMultiple):
+    pass
\ No newline at end of file
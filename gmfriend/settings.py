@@ -54,6 +54,17 @@ DATABASES = {
     }
 }
 
+# Rendered markdown, indexes and snapshots are shared by all workers and management commands,
+# so cache must not be process local (LocMemCache). Everything in it can be rebuilt from DB.
+# Culling drops random keys, so maximum must fit all markdown descriptions of catalogue and adventures
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -96,6 +107,10 @@ MARKDOWNX_MARKDOWN_EXTENSIONS = [
     'markdown.extensions.extra',
 ]
 
+# Background jobs (level up, map tiles) run in request process unless run_jobs workers are started,
+# set to False in local_settings when `manage.py run_jobs` runs as a service
+JOBS_RUN_INLINE = True
+
 ENABLE_DEBUG_TOOLBAR = False
 
 from .local_settings import *